@@ -1,16 +1,25 @@
 """FastAPI route definitions."""
 
 import io
+import json
+import math
 import os
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor, as_completed
+from contextlib import contextmanager
+from functools import partial
 from pathlib import Path
 
+import anyio
 import numpy as np
 import pandas as pd
-from fastapi import APIRouter, HTTPException, UploadFile, File
+from fastapi import APIRouter, Depends, HTTPException, Request, UploadFile, File
 from fastapi.responses import StreamingResponse
 
 import re
 
+from ..core.admission import AdmissionRejected, admission, estimate_instance
 from ..core.data_loader import (
     app_data,
     BASE_DIR,
@@ -18,21 +27,41 @@ from ..core.data_loader import (
     CMS_SCENARIOS_DIR,
     BUILTIN_SCENARIO_IDS,
 )
+from ..core.jobs import JobCancelled, JobQueueFull, job_manager
 from ..core.optimizer import (
     build_region_instance,
     build_cms_region_instance,
+    combine_simulations,
+    demand_frames,
     nb_sigma_from_mean,
-    run_simulation,
-    run_planning,
+    pack_instance,
+    summarize_simulation,
+)
+from ..core.result_cache import request_key, result_cache
+from ..core.singleflight import FlightAbandoned, flights
+from ..core.solver_pool import plan, simulate, solver_pool, sweep
+from ..core.telemetry import GROUP_COLUMNS, telemetry
+from .auth_routes import require_admin
+from .schemas import (
+    NationalRequest,
+    OptimizationRequest,
+    OptimizationResult,
+    PlanningRequest,
+    SweepRequest,
 )
-from .schemas import OptimizationRequest, OptimizationResult, PlanningRequest
 
 router = APIRouter(prefix="/api")
 
 
 @router.get("/health")
 def health_check():
-    return {"status": "ok", "data_loaded": app_data.loaded}
+    return {
+        "status": "ok",
+        "data_loaded": app_data.loaded,
+        "solver": admission.stats(),
+        "solver_pool": solver_pool.stats(),
+        "jobs": job_manager.stats(),
+    }
 
 
 @router.get("/summary")
@@ -129,6 +158,7 @@ def add_cms_product(body: dict):
     _save_cms()
     for name in getattr(app_data, "custom_scenarios", []):
         _save_scenario(name)
+    app_data.bump_version()
     return {"status": "ok", "product_code": code, "total_products": len(app_data.cms_active)}
 
 
@@ -149,6 +179,7 @@ def remove_cms_product(body: dict):
     _save_cms()
     for name in getattr(app_data, "custom_scenarios", []):
         _save_scenario(name)
+    app_data.bump_version()
     return {"status": "ok", "removed": code, "description": desc, "total_products": len(app_data.cms_active)}
 
 
@@ -188,6 +219,7 @@ def add_cms_scenario(body: dict):
     app_data.cms_active[f"biweekly_{name}"] = app_data.cms_active[f"biweekly_{copy_from}"].copy()
     app_data.custom_scenarios.append(name)
     _save_scenario(name)
+    app_data.bump_version()
     return {"status": "ok", "scenarios": app_data.list_scenarios()}
 
 
@@ -211,6 +243,7 @@ def update_cms_scenario(body: dict):
             except (TypeError, ValueError):
                 continue
     _save_scenario(name)
+    app_data.bump_version()
     return {"status": "ok", "updated": updated, "scenarios": app_data.list_scenarios()}
 
 
@@ -228,6 +261,7 @@ def remove_cms_scenario(body: dict):
     path = CMS_SCENARIOS_DIR / f"{name}.csv"
     if path.exists():
         path.unlink()
+    app_data.bump_version()
     return {"status": "ok", "removed": name, "scenarios": app_data.list_scenarios()}
 
 
@@ -255,8 +289,9 @@ def _save_cms():
 
 
 def _save_matrices():
-    app_data.dist_matrix_df.to_csv(DIST_CSV)
-    app_data.time_matrix_df.to_csv(DUR_CSV)
+    dist_df, time_df = app_data.matrix_frames()
+    dist_df.to_csv(DIST_CSV)
+    time_df.to_csv(DUR_CSV)
 
 
 OSRM_PORT = int(os.environ.get("OSRM_PORT", "5001"))
@@ -358,7 +393,7 @@ def add_facility(body: dict):
     app_data.fac = pd.concat([app_data.fac, pd.DataFrame([new_row])], ignore_index=True)
 
     # Gather coordinates for existing nodes
-    existing_nodes = list(app_data.dist_matrix_df.index)
+    existing_nodes = set(app_data.matrix_nodes)
     fac_coords = {}
     for _, row in app_data.fac.iterrows():
         fn = str(row.get("Facility Name", "")).strip()
@@ -396,23 +431,13 @@ def add_facility(body: dict):
             new_dists[node] = float("inf")
             new_times[node] = float("inf")
 
-    # Expand distance matrix
-    dm = app_data.dist_matrix_df
-    dm.loc[name] = pd.Series({n: new_dists.get(n, float("inf")) for n in dm.columns})
-    dm[name] = pd.Series({n: new_dists.get(n, float("inf")) for n in dm.index})
-    dm.loc[name, name] = 0.0
-    app_data.dist_matrix_df = dm
-
-    # Expand time matrix
-    tm = app_data.time_matrix_df
-    tm.loc[name] = pd.Series({n: new_times.get(n, float("inf")) for n in tm.columns})
-    tm[name] = pd.Series({n: new_times.get(n, float("inf")) for n in tm.index})
-    tm.loc[name, name] = 0.0
-    app_data.time_matrix_df = tm
+    # Expand distance/time matrices (nodes not routed stay unreachable)
+    app_data.update_matrix_node(name, new_dists, new_times)
 
     computed = sum(1 for v in new_dists.values() if v != float("inf"))
     _save_facilities()
     _save_matrices()
+    app_data.bump_version()
     return {
         "status": "ok",
         "facility": name,
@@ -488,14 +513,11 @@ def remove_facility(body: dict):
     app_data.fac = fac[fac["Facility Name"].astype(str).str.strip() != name].reset_index(drop=True)
 
     # Remove from distance/time matrices
-    for matrix in (app_data.dist_matrix_df, app_data.time_matrix_df):
-        if name in matrix.index:
-            matrix.drop(index=name, inplace=True)
-        if name in matrix.columns:
-            matrix.drop(columns=name, inplace=True)
+    app_data.remove_matrix_node(name)
 
     _save_facilities()
     _save_matrices()
+    app_data.bump_version()
     return {
         "status": "ok",
         "removed": name,
@@ -537,7 +559,7 @@ def relocate_facility(body: dict):
         raise HTTPException(503, "OSRM not available; cannot recompute distances.")
 
     # Gather coordinates for all other nodes in the distance matrix
-    existing_nodes = [n for n in app_data.dist_matrix_df.index if n != name]
+    existing_nodes = {n for n in app_data.matrix_nodes if n != name}
     fac_coords = {}
     for _, row in app_data.fac.iterrows():
         fn = str(row.get("Facility Name", "")).strip()
@@ -566,29 +588,13 @@ def relocate_facility(body: dict):
             new_dists[node] = float("inf")
             new_times[node] = float("inf")
 
-    # Update distance matrix
-    dm = app_data.dist_matrix_df
-    if name not in dm.index:
-        dm.loc[name] = float("inf")
-        dm[name] = float("inf")
-    for node, dist in new_dists.items():
-        dm.loc[name, node] = dist
-        dm.loc[node, name] = dist
-    dm.loc[name, name] = 0.0
-
-    # Update time matrix
-    tm = app_data.time_matrix_df
-    if name not in tm.index:
-        tm.loc[name] = float("inf")
-        tm[name] = float("inf")
-    for node, t in new_times.items():
-        tm.loc[name, node] = t
-        tm.loc[node, name] = t
-    tm.loc[name, name] = 0.0
+    # Update distance/time matrices in place
+    app_data.update_matrix_node(name, new_dists, new_times)
 
     computed = sum(1 for v in new_dists.values() if v != float("inf"))
     _save_facilities()
     _save_matrices()
+    app_data.bump_version()
     return {
         "status": "ok",
         "facility": name,
@@ -612,7 +618,7 @@ def get_region_demand(region: str, scenario: str = "2526", use_cms: bool = True)
     except ValueError as e:
         raise HTTPException(400, str(e))
 
-    mu_mat = instance["mu_mat"]
+    mu_mat, _ = demand_frames(instance)
     demand_dict = {}
     for fac in mu_mat.index:
         row = mu_mat.loc[fac]
@@ -628,8 +634,8 @@ def get_region_demand(region: str, scenario: str = "2526", use_cms: bool = True)
     }
 
 
-@router.post("/optimize", response_model=OptimizationResult)
-def run_optimization(req: OptimizationRequest):
+def _optimization_instance(req: OptimizationRequest) -> dict:
+    """Region instance for an /optimize-style request, with demand overrides applied."""
     try:
         if req.use_cms_data:
             instance = build_cms_region_instance(req.region, scenario=req.scenario)
@@ -640,12 +646,17 @@ def run_optimization(req: OptimizationRequest):
 
     # Apply demand multiplier
     if req.demand_multiplier != 1.0:
-        instance["mu_mat"] = instance["mu_mat"] * req.demand_multiplier
-        instance["sigma_mat"] = nb_sigma_from_mean(instance["mu_mat"], kappa=req.kappa)
+        if "demand_factors" in instance:
+            instance["demand_factors"] = {
+                **instance["demand_factors"], "scale": req.demand_multiplier, "kappa": req.kappa,
+            }
+        else:
+            instance["mu_mat"] = instance["mu_mat"] * req.demand_multiplier
+            instance["sigma_mat"] = nb_sigma_from_mean(instance["mu_mat"], kappa=req.kappa)
 
     # Apply custom demand overrides
     if req.custom_demand:
-        mu_mat = instance["mu_mat"].copy()
+        mu_mat = demand_frames(instance)[0].copy()
         for fac_name, drug_demands in req.custom_demand.items():
             if fac_name not in mu_mat.index:
                 continue
@@ -654,63 +665,475 @@ def run_optimization(req: OptimizationRequest):
                     mu_mat.loc[fac_name, drug_class] = float(value)
         instance["mu_mat"] = mu_mat
         instance["sigma_mat"] = nb_sigma_from_mean(mu_mat, kappa=req.kappa)
+        # Cell overrides break the rank-1 structure
+        instance.pop("demand_factors", None)
 
-    # Shortage penalty = multiplier × per-drug procurement cost
-    proc_cost = instance.get("proc_cost", 0.0)
+    return instance
+
+
+def _shortage_penalty(proc_cost, multiplier: float):
+    """Shortage penalty = multiplier × per-drug procurement cost."""
     if np.isscalar(proc_cost):
-        shortage_pen = req.shortage_penalty * float(proc_cost) if proc_cost else 10.0
+        return multiplier * float(proc_cost) if proc_cost else 10.0
+    return pd.Series(proc_cost).clip(lower=1.0) * multiplier
+
+
+def _simulation_args(req: OptimizationRequest, instance: dict) -> dict:
+    """iter_simulation keyword arguments (besides strategy) for an /optimize request."""
+    proc_cost = instance.get("proc_cost", 0.0)
+    return dict(
+        T=req.periods,
+        kappa=req.kappa,
+        Gamma=req.gamma,
+        transport_cost_per_km=req.transport_cost_per_km,
+        shortage_penalty=_shortage_penalty(proc_cost, req.shortage_penalty),
+        holding_cost=req.holding_cost,
+        procurement_cost=proc_cost,
+        supply_multiplier=req.supply_multiplier,
+        seed=req.seed,
+        lookahead=req.lookahead,
+        deadline=time.time() + req.deadline_s if req.deadline_s else None,
+        **_solver_options(req),
+    )
+
+
+def _solver_options(req) -> dict:
+    """iter_simulation / run_planning HiGHS options from a SolverOptions request."""
+    return dict(integer=req.integer_trucks, time_limit_s=req.time_limit_s,
+                mip_gap=req.mip_gap, threads=req.threads)
+
+
+def _simulate_in_pool(req: OptimizationRequest, instance: dict):
+    """Period metrics from a solver process, as they are solved."""
+    job_id = solver_pool.submit(simulate, pack_instance(instance), req.strategy,
+                                _simulation_args(req, instance))
+    return solver_pool.follow(job_id)
+
+
+def _optimization_stream(req: OptimizationRequest, rows, abandoned=None):
+    """
+    Pass period metrics through as they arrive; returns the full /optimize
+    response dict. A run stopped by its deadline ends with status "time_limit";
+    one cancelled as a job, or whose abandoned() turns true, with "cancelled".
+    Either way the response covers the periods finished so far.
+    """
+    periods = []
+    status = "completed"
+    try:
+        while True:
+            try:
+                row = next(rows)
+            except StopIteration as stop:
+                status = stop.value or status
+                break
+            periods.append(row)
+            try:
+                yield row
+            except JobCancelled:
+                status = "cancelled"
+                break
+            if abandoned is not None and abandoned():
+                status = "cancelled"
+                break
+    finally:
+        rows.close()
+    return {
+        "region": req.region,
+        "strategy": req.strategy,
+        "periods": periods,
+        "status": status,
+        "summary": summarize_simulation(pd.DataFrame(periods)) if periods else {},
+    }
+
+
+def _drain(gen):
+    """Run a generator to completion and return its return value."""
+    while True:
+        try:
+            next(gen)
+        except StopIteration as stop:
+            return stop.value
+
+
+# Response statuses of runs stopped early; these are never cached
+PARTIAL = ("cancelled", "time_limit")
+
+
+def _cacheable(result: dict) -> bool:
+    """Whether result is reproducible: not stopped early, no solve cut short by a time limit."""
+    return (result.get("status") not in PARTIAL + ("feasible",)
+            and not any(p.get("status") == "feasible" for p in result.get("periods", ())))
+
+
+def _disconnected(request: Request):
+    """Callable telling a sync handler whether its client has gone away."""
+    return lambda: anyio.from_thread.run(request.is_disconnected)
+
+
+def _cached_result(kind: str, req, solve, disconnected=None) -> tuple[dict, bool]:
+    """
+    (response, cache_hit) for req: from the result cache, otherwise from one
+    solve(req, abandoned) shared by every identical request that arrives while
+    it runs. abandoned() is true once the client has disconnected and no other
+    request is waiting on the same solve. A request that joined a solve which
+    ended early runs its own instead of taking the partial result.
+    """
+    body = req.model_dump(mode="json")
+    # A completed run answers the same request under any deadline
+    key = request_key(kind, {k: v for k, v in body.items() if k != "deadline_s"})
+    cached = result_cache.get(key)
+    if cached is not None:
+        return cached, True
+    flight = request_key(kind, body)
+
+    def abandoned():
+        return (disconnected is not None and flights.waiters(flight) == 0
+                and disconnected())
+
+    def run():
+        # A flight for this key may have finished between the lookup and now
+        cached = result_cache.get(key)
+        if cached is not None:
+            return cached, True
+        result = solve(req, abandoned)
+        if _cacheable(result):
+            result_cache.put(key, kind, result)
+        return result, False
+
+    try:
+        (result, hit), _ = flights.do(
+            flight, run, shareable=lambda r: r[0].get("status") not in PARTIAL,
+            gave_up=disconnected)
+    except FlightAbandoned:
+        raise HTTPException(499, "Client closed request")
+    return result, hit
+
+
+def _too_busy(e: AdmissionRejected) -> HTTPException:
+    retry = math.ceil(e.retry_after)
+    return HTTPException(429, f"{e}; retry in about {retry}s", headers={"Retry-After": str(retry)})
+
+
+@contextmanager
+def _admitted(est, **wait):
+    """Run the block inside the solver memory budget; 429 when it is exhausted."""
+    try:
+        with admission.admit(est, **wait):
+            yield
+    except AdmissionRejected as e:
+        raise _too_busy(e)
+
+
+def _solve_optimization(req: OptimizationRequest, abandoned, instance: dict | None = None,
+                        **wait) -> dict:
+    """One /optimize solve; wait is passed to admission.admit (see _national_region)."""
+    if instance is None:
+        instance = _optimization_instance(req)
+    with _admitted(estimate_instance(instance, req.strategy, req.periods, req.lookahead), **wait):
+        try:
+            return _drain(_optimization_stream(req, _simulate_in_pool(req, instance), abandoned))
+        except Exception as e:
+            raise HTTPException(500, f"Optimization failed: {e}")
+
+
+@router.post("/optimize", response_model=OptimizationResult)
+def run_optimization(req: OptimizationRequest, request: Request):
+    """
+    Simulate the policy over req.periods. The run stops between periods if
+    the client disconnects or req.deadline_s passes; the response then holds
+    the periods finished so far and status "cancelled" or "time_limit".
+    """
+    result, hit = _cached_result("optimize", req, _solve_optimization, _disconnected(request))
+    return OptimizationResult(**result, cache_hit=hit)
+
+
+@router.post("/optimize/stream")
+def stream_optimization(req: OptimizationRequest):
+    """
+    /optimize as newline-delimited JSON: one {"type": "period", ...} line per
+    period as soon as it is solved, then one {"type": "summary", ...} line
+    (or {"type": "error", ...} if the run fails part-way). Disconnecting
+    cancels the run after the period being solved.
+    """
+    instance = _optimization_instance(req)
+    est = estimate_instance(instance, req.strategy, req.periods, req.lookahead)
+    try:
+        admission.check(est)
+    except AdmissionRejected as e:
+        raise _too_busy(e)
+
+    def lines():
+        # The budget is taken inside the body so it is only held while streaming
+        try:
+            with admission.admit(est):
+                yield from period_lines()
+        except AdmissionRejected as e:
+            yield json.dumps({"type": "error", "detail": str(e),
+                              "retry_after": math.ceil(e.retry_after)}) + "\n"
+
+    def period_lines():
+        gen = _optimization_stream(req, _simulate_in_pool(req, instance))
+        try:
+            while True:
+                try:
+                    row = next(gen)
+                except StopIteration as stop:
+                    result = stop.value
+                    yield json.dumps({
+                        "type": "summary",
+                        "region": result["region"],
+                        "strategy": result["strategy"],
+                        "status": result["status"],
+                        "summary": result["summary"],
+                    }) + "\n"
+                    return
+                yield json.dumps({"type": "period", **row}) + "\n"
+        except Exception as e:
+            yield json.dumps({"type": "error", "detail": f"Optimization failed: {e}"}) + "\n"
+        finally:
+            gen.close()
+
+    return StreamingResponse(
+        lines(), media_type="application/x-ndjson",
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"},
+    )
+
+
+def _national_region(req: OptimizationRequest, instance: dict, version: int, stop) -> dict:
+    """
+    One region of /optimize/national: an /optimize solve of a prebuilt instance
+    that queues for the memory budget without the interactive wait limit (up to
+    the remaining deadline, if any) and leaves the queue when the run stops.
+    """
+    solve = partial(_solve_optimization, instance=instance, max_wait_s=req.deadline_s,
+                    cancelled=stop.is_set)
+    if app_data.data_version != version:
+        # Data changed since the snapshot; its results must not be cached as current
+        return {**solve(req, stop.is_set), "cache_hit": False}
+    result, hit = _cached_result("optimize", req, solve, stop.is_set)
+    return {**result, "cache_hit": hit}
+
+
+@router.post("/optimize/national")
+def stream_national(req: NationalRequest):
+    """
+    /optimize for every DHMT (or req.regions) as newline-delimited JSON: one
+    {"type": "region", ...} line per region as it finishes, then a
+    {"type": "national", ...} line with period metrics summed over regions.
+
+    Instances are all built up front from one data version. Regions run
+    largest first (by estimated solve time) on as many threads as the solver
+    pool has processes and as many regions fit in the memory budget at once;
+    each queues for the budget until it fits. deadline_s covers the whole
+    national run; a region still queued when it passes reports "time_limit".
+    """
+    started = time.time()
+    names = req.regions or [r for r in app_data.dhmt_list if r.strip() not in ("", "--")]
+    base = req.model_dump(exclude={"region", "regions"})
+
+    # Build every instance against the same data version
+    for _ in range(3):
+        version = app_data.data_version
+        regions, failed = {}, {}
+        for name in names:
+            region_req = OptimizationRequest(**base, region=name)
+            try:
+                regions[name] = (region_req, _optimization_instance(region_req))
+            except HTTPException as e:
+                failed[name] = e.detail
+        if app_data.data_version == version:
+            break
     else:
-        shortage_pen = pd.Series(proc_cost).clip(lower=1.0) * req.shortage_penalty
+        raise HTTPException(409, "Data kept changing while building region instances")
+
+    estimates = {name: estimate_instance(instance, req.strategy, req.periods, req.lookahead)
+                 for name, (_, instance) in regions.items()}
+    order = sorted(regions, key=lambda name: estimates[name].seconds, reverse=True)
+    stop = threading.Event()
+
+    # Threads beyond the regions that can hold the budget at once would only queue
+    fit, used = 0, 0
+    for mem in sorted(min(e.memory_bytes, admission.budget) for e in estimates.values()):
+        used += mem
+        if used > admission.budget:
+            break
+        fit += 1
+    n_threads = max(1, min(solver_pool.n_workers, fit))
+
+    def time_limited(name):
+        return {"region": name, "strategy": req.strategy, "periods": [],
+                "status": "time_limit", "summary": {}, "cache_hit": False}
+
+    def run_region(name):
+        region_req, instance = regions[name]
+        if req.deadline_s:
+            remaining = req.deadline_s - (time.time() - started)
+            if remaining <= 0:
+                return time_limited(name)
+            region_req = region_req.model_copy(update={"deadline_s": remaining})
+        try:
+            return _national_region(region_req, instance, version, stop)
+        except HTTPException as e:
+            if e.status_code == 429 and req.deadline_s and not stop.is_set():
+                return time_limited(name)   # deadline passed while queued
+            raise
+
+    def lines():
+        results = {}
+        for name, detail in failed.items():
+            yield json.dumps({"type": "region", "region": name, "status": "failed",
+                              "detail": detail}) + "\n"
+        pool = ThreadPoolExecutor(max_workers=n_threads, thread_name_prefix="national")
+        try:
+            futures = {pool.submit(run_region, name): name for name in order}
+            for fut in as_completed(futures):
+                name = futures[fut]
+                try:
+                    result = fut.result()
+                except Exception as e:
+                    detail = getattr(e, "detail", None) or str(e)
+                    yield json.dumps({"type": "region", "region": name, "status": "failed",
+                                      "detail": detail}) + "\n"
+                    continue
+                results[name] = result
+                yield json.dumps({"type": "region", **result}) + "\n"
+        finally:
+            # Reached early when the client disconnects: stop the regions still running
+            stop.set()
+            pool.shutdown(wait=False, cancel_futures=True)
+
+        periods = combine_simulations([results[n]["periods"] for n in order if n in results])
+        complete = not failed and len(results) == len(order) and all(
+            r["status"] == "completed" for r in results.values())
+        yield json.dumps({
+            "type": "national",
+            "strategy": req.strategy,
+            "status": "completed" if complete else "incomplete",
+            "regions": {n: results[n]["status"] if n in results else "failed" for n in names},
+            "periods": periods,
+            "summary": summarize_simulation(pd.DataFrame(periods)) if periods else {},
+            "elapsed_s": round(time.time() - started, 2),
+        }) + "\n"
+
+    return StreamingResponse(
+        lines(), media_type="application/x-ndjson",
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"},
+    )
+
+
+def _optimization_job(req_data: dict, packed: dict, sim_args: dict):
+    """Job body for /jobs/optimize; runs in a job worker process on the instance packed at submit."""
+    req = OptimizationRequest(**req_data)
+    return (yield from _optimization_stream(req, simulate(packed, req.strategy, sim_args)))
+
 
+@router.post("/jobs/optimize", status_code=202)
+def submit_optimization_job(req: OptimizationRequest):
+    """
+    Queue an /optimize run and return its job id straight away. The instance
+    is built here, from the data as of submission, and shipped with the job.
+    """
+    instance = _optimization_instance(req)
     try:
-        metrics_df = run_simulation(
-            instance=instance,
-            strategy=req.strategy,
-            T=req.periods,
-            kappa=req.kappa,
-            Gamma=req.gamma,
-            transport_cost_per_km=req.transport_cost_per_km,
-            shortage_penalty=shortage_pen,
-            holding_cost=req.holding_cost,
-            procurement_cost=proc_cost,
-            supply_multiplier=req.supply_multiplier,
-            seed=req.seed,
+        job_id = job_manager.submit(
+            _optimization_job, req.model_dump(), pack_instance(instance),
+            _simulation_args(req, instance), kind="optimize",
+            meta={"region": req.region, "strategy": req.strategy, "periods_total": req.periods},
         )
-    except Exception as e:
-        raise HTTPException(500, f"Optimization failed: {e}")
-
-    periods = metrics_df.to_dict(orient="records")
-
-    # Compute summary
-    valid = metrics_df[metrics_df["status"] == "optimal"]
-    summary = {}
-    if not valid.empty:
-        summary = {
-            "avg_unmet_pct": round(float(valid["unmet_pct"].mean()), 2),
-            "max_unmet_pct": round(float(valid["unmet_pct"].max()), 2),
-            "total_cost": round(float(valid["objective"].sum()), 2),
-            "total_transport_cost": round(float(valid["transport_cost"].sum()), 2),
-            "total_procurement_cost": round(float(valid["procurement_cost"].sum()), 2),
-            "total_holding_cost": round(float(valid["holding_cost"].sum()), 2),
-            "total_shortage_cost": round(float(valid["shortage_cost"].sum()), 2),
-            "avg_transport_cost": round(float(valid["transport_cost"].mean()), 2),
-            "avg_shortage_cost": round(float(valid["shortage_cost"].mean()), 2),
-            "avg_holding_cost": round(float(valid["holding_cost"].mean()), 2),
-            "avg_procurement_cost": round(float(valid["procurement_cost"].mean()), 2),
-            "periods_solved": len(valid),
-            "periods_failed": len(metrics_df) - len(valid),
-        }
+    except JobQueueFull as e:
+        raise HTTPException(503, f"Job queue is full: {e}", headers={"Retry-After": "30"})
+    return job_manager.get(job_id)
+
+
+@router.get("/jobs/{job_id}")
+def get_job(job_id: str):
+    """Status, per-period progress so far and, once completed, the /optimize result."""
+    job = job_manager.get(job_id)
+    if job is None:
+        raise HTTPException(404, f"Unknown job '{job_id}'")
+    return job
 
-    return OptimizationResult(
-        region=req.region,
-        strategy=req.strategy,
-        periods=periods,
-        summary=summary,
-    )
+
+@router.delete("/jobs/{job_id}")
+def cancel_job(job_id: str):
+    job = job_manager.cancel(job_id)
+    if job is None:
+        raise HTTPException(404, f"Unknown job '{job_id}'")
+    return job
+
+
+@router.get("/admin/telemetry")
+def get_telemetry(region: str | None = None, strategy: str | None = None,
+                  hours: float | None = None, group_by: str | None = None, limit: int = 200,
+                  user: dict = Depends(require_admin)):
+    """
+    Per-solve telemetry: the most recent solves, or with group_by (comma-separated
+    region, strategy, backend, kind, status, day) solve counts and solver-time
+    percentiles per group, slowest first.
+    """
+    groups = [g.strip() for g in group_by.split(",") if g.strip()] if group_by else None
+    unknown = set(groups or ()) - set(GROUP_COLUMNS)
+    if unknown:
+        raise HTTPException(400, f"Cannot group by {sorted(unknown)}; "
+                                 f"choose from {list(GROUP_COLUMNS)}")
+    since = time.time() - hours * 3600 if hours else None
+    return {
+        "enabled": telemetry.enabled,
+        "rows": telemetry.query(region, strategy, since, groups, max(1, min(limit, 10000)))
+        if telemetry.enabled else [],
+    }
+
+
+@router.post("/optimize/sweep")
+def run_sweep(req: SweepRequest):
+    """
+    Evaluate a Gamma × shortage-penalty grid with one instance and one compiled
+    model. `gamma` and `shortage_penalty` from the base request are ignored in
+    favour of the grid lists; everything else applies to every point. With
+    `deadline_s`, points not finished in time are left out (status "time_limit").
+    """
+    instance = _optimization_instance(req)
+    proc_cost = instance.get("proc_cost", 0.0)
+    n_runs = len(req.gammas) * len(req.shortage_penalties)
+    est = estimate_instance(instance, req.strategy, req.periods * n_runs, req.lookahead)
+
+    with _admitted(est):
+        try:
+            points = solver_pool.run(sweep, pack_instance(instance), req.strategy, dict(
+                gammas=req.gammas,
+                penalty_multipliers=req.shortage_penalties,
+                shortage_penalty=_shortage_penalty(proc_cost, 1.0),
+                T=req.periods,
+                kappa=req.kappa,
+                transport_cost_per_km=req.transport_cost_per_km,
+                holding_cost=req.holding_cost,
+                procurement_cost=proc_cost,
+                supply_multiplier=req.supply_multiplier,
+                seed=req.seed,
+                lookahead=req.lookahead,
+                deadline=time.time() + req.deadline_s if req.deadline_s else None,
+                **_solver_options(req),
+            ))
+        except Exception as e:
+            raise HTTPException(500, f"Sweep failed: {e}")
+
+    return {
+        "region": req.region,
+        "strategy": req.strategy,
+        "periods": req.periods,
+        "status": "completed" if len(points) == n_runs else "time_limit",
+        "points": points,
+        "frontier": [p for p in points if p["pareto"]],
+    }
 
 
 @router.post("/plan")
-def run_plan(req: PlanningRequest):
+def run_plan(req: PlanningRequest, request: Request):
+    result, hit = _cached_result("plan", req, _solve_plan, _disconnected(request))
+    return {**result, "cache_hit": hit}
+
+
+def _solve_plan(req: PlanningRequest, abandoned) -> dict:
     try:
         if req.use_cms_data:
             instance = build_cms_region_instance(req.region, scenario=req.scenario)
@@ -730,27 +1153,26 @@ def run_plan(req: PlanningRequest):
             if drug in proc_cost.index:
                 proc_cost[drug] = float(price)
 
-    # Shortage penalty = multiplier × per-drug procurement cost
-    if np.isscalar(proc_cost):
-        shortage_pen = req.shortage_penalty * float(proc_cost) if proc_cost else 10.0
-    else:
-        shortage_pen = pd.Series(proc_cost).clip(lower=1.0) * req.shortage_penalty
+    shortage_pen = _shortage_penalty(proc_cost, req.shortage_penalty)
 
-    try:
-        result = run_planning(
-            instance=instance,
-            strategy=req.strategy,
-            kappa=req.kappa,
-            Gamma=req.gamma,
-            transport_cost_per_km=req.transport_cost_per_km,
-            shortage_penalty=shortage_pen,
-            holding_cost=req.holding_cost,
-            procurement_cost=proc_cost,
-            initial_inventory=req.initial_inventory,
-            last_demand=req.last_demand,
-        )
-    except Exception as e:
-        raise HTTPException(500, f"Planning failed: {e}")
+    with _admitted(estimate_instance(instance, req.strategy)):
+        if abandoned():
+            # The client left while this request waited for solver capacity
+            raise HTTPException(499, "Client closed request")
+        try:
+            result = solver_pool.run(plan, pack_instance(instance), req.strategy, dict(
+                kappa=req.kappa,
+                Gamma=req.gamma,
+                transport_cost_per_km=req.transport_cost_per_km,
+                shortage_penalty=shortage_pen,
+                holding_cost=req.holding_cost,
+                procurement_cost=proc_cost,
+                initial_inventory=req.initial_inventory,
+                last_demand=req.last_demand,
+                **_solver_options(req),
+            ))
+        except Exception as e:
+            raise HTTPException(500, f"Planning failed: {e}")
 
     return {"region": req.region, **result}
 
@@ -766,8 +1188,8 @@ def _build_region_template(region: str) -> io.BytesIO:
     except ValueError as e:
         raise HTTPException(400, str(e))
 
-    facilities = list(instance["mu_mat"].index)
-    drugs = list(instance["mu_mat"].columns)
+    facilities = list(instance["nodes"])
+    drugs = list(instance["classes"])
 
     cms = app_data.cms_active
     desc_lookup = {code: str(cms.loc[code].get("description", "")) for code in drugs if code in cms.index}
@@ -991,8 +1413,8 @@ async def parse_region_template(region: str, file: UploadFile = File(...)):
     except ValueError as e:
         raise HTTPException(400, str(e))
 
-    valid_facilities = set(instance["mu_mat"].index)
-    valid_drugs = list(instance["mu_mat"].columns)
+    valid_facilities = set(instance["nodes"])
+    valid_drugs = list(instance["classes"])
 
     content = await file.read()
     try:
@@ -3,7 +3,22 @@
 from pydantic import BaseModel, Field
 
 
-class OptimizationRequest(BaseModel):
+class SolverOptions(BaseModel):
+    """HiGHS controls shared by the simulation and planning requests."""
+    integer_trucks: bool = Field(
+        False, description="Integer truck counts per arc (a MIP) instead of the LP relaxation",
+    )
+    time_limit_s: float | None = Field(
+        None, gt=0,
+        description="HiGHS time limit per solve; a solve that hits it keeps its best incumbent",
+    )
+    mip_gap: float | None = Field(
+        None, ge=0, le=1, description="Relative MIP gap at which HiGHS stops (integer_trucks)",
+    )
+    threads: int | None = Field(None, ge=1, le=64, description="HiGHS threads per solve")
+
+
+class OptimizationRequest(SolverOptions):
     region: str = Field(..., description="DHMT region name")
     strategy: str = Field("nominal", description="nominal | static_robust | adr")
     scenario: str = Field("2526", description="CMS scenario: 2526 | 2627")
@@ -15,6 +30,10 @@ class OptimizationRequest(BaseModel):
     holding_cost: float = Field(0.1, ge=0)
     supply_multiplier: float = Field(0.0, ge=0)
     seed: int = Field(42)
+    lookahead: int = Field(
+        1, ge=1, le=8,
+        description="Rolling lookahead window in periods; only the first period is committed",
+    )
     use_cms_data: bool = Field(True, description="Use CMS product-level data")
     demand_multiplier: float = Field(
         1.0, ge=0,
@@ -28,6 +47,28 @@ class OptimizationRequest(BaseModel):
             "Facilities not listed keep their computed demand."
         ),
     )
+    deadline_s: float | None = Field(
+        None, gt=0,
+        description="Stop solving after this many seconds and return the periods finished so far",
+    )
+
+
+class SweepRequest(OptimizationRequest):
+    gammas: list[float] = Field(
+        ..., min_length=1, max_length=25,
+        description="Robustness budgets (Gamma) to evaluate",
+    )
+    shortage_penalties: list[float] = Field(
+        ..., min_length=1, max_length=25,
+        description="Shortage penalty multipliers of procurement cost to evaluate",
+    )
+
+
+class NationalRequest(OptimizationRequest):
+    region: str = Field("national", description="Ignored; see regions")
+    regions: list[str] | None = Field(
+        None, description="DHMT regions to include (default: all)",
+    )
 
 
 class OptimizationResult(BaseModel):
@@ -35,9 +76,11 @@ class OptimizationResult(BaseModel):
     strategy: str
     periods: list[dict]
     summary: dict
+    status: str = Field("completed", description="completed | cancelled | time_limit")
+    cache_hit: bool = Field(False, description="Served from the result cache")
 
 
-class PlanningRequest(BaseModel):
+class PlanningRequest(SolverOptions):
     region: str = Field(..., description="DHMT region name")
     strategy: str = Field("static_robust", description="nominal | static_robust | adr")
     scenario: str = Field("2526", description="CMS scenario: 2526 | 2627")
@@ -0,0 +1,203 @@
+"""
+Admission control for solves: a memory budget shared by every running solve.
+
+Each request is sized from its instance (N nodes, m arcs, K classes), its
+strategy and its horizon before any model is built. A solve starts only when
+its estimate fits in what is left of the budget. Otherwise it waits in a FIFO
+queue, or is rejected with an estimated wait when the queue is full or the
+wait would be too long. Time estimates are corrected on the fly by the
+ratio of observed to estimated run time.
+"""
+
+import math
+import os
+import threading
+import time
+from collections import deque
+from contextlib import contextmanager
+from dataclasses import dataclass
+
+
+def _default_budget_mb() -> float:
+    try:
+        total = os.sysconf("SC_PAGE_SIZE") * os.sysconf("SC_PHYS_PAGES")
+        return 0.6 * total / 2**20
+    except (ValueError, OSError, AttributeError):
+        return 8192.0
+
+
+SOLVE_MEMORY_MB = float(os.environ.get("KAELO_SOLVE_MEMORY_MB", "0")) or _default_budget_mb()
+ADMISSION_MAX_QUEUE = int(os.environ.get("KAELO_ADMISSION_MAX_QUEUE", "32"))
+ADMISSION_MAX_WAIT_S = float(os.environ.get("KAELO_ADMISSION_MAX_WAIT_S", "120"))
+
+# Peak resident memory per LP variable while CVXPY canonicalizes and HiGHS
+# solves (measured with cvxpy 1.9 / HiGHS 1.x, also on the national batch
+# regions up to N=91, m=830, K=40), plus a fixed per-solve floor.
+BYTES_PER_VAR = {"nominal": 3 * 1024, "static_robust": 3 * 1024, "adr": 4 * 1024}
+BASE_BYTES = 50 * 2**20
+# Solve seconds per variable per simulated period, before calibration
+SECONDS_PER_VAR = {"nominal": 1e-4, "static_robust": 1e-4, "adr": 4e-4}
+
+
+_DEFAULT = object()
+
+
+class AdmissionRejected(RuntimeError):
+    def __init__(self, message: str, retry_after: float):
+        super().__init__(message)
+        self.retry_after = retry_after
+
+
+@dataclass
+class Estimate:
+    memory_bytes: int
+    seconds: float
+
+
+def lp_variables(N: int, m: int, K: int, strategy: str, horizon: int = 1,
+                 cross_rows: int | None = None) -> int:
+    """
+    Variables in one CompiledProblem; the robust duals dominate for large K.
+    cross_rows is the number of rows of the ADR cross-node duals (one per
+    adaptive arc, or per adaptive pair in the national batch); at most m.
+    """
+    n = m * K + 2 * N * K + K + 2 * m
+    if strategy == "static_robust":
+        n += 6 * N * K
+    elif strategy == "adr":
+        cross_rows = m if cross_rows is None else cross_rows
+        n += 3 * m * K + m + 6 * N * K + 4 * cross_rows * K
+    return n * max(1, horizon)
+
+
+def estimate(N: int, m: int, K: int, strategy: str, periods: int = 1, horizon: int = 1,
+             cross_rows: int | None = None) -> Estimate:
+    n_vars = lp_variables(N, m, K, strategy, horizon, cross_rows)
+    return Estimate(
+        memory_bytes=BASE_BYTES + BYTES_PER_VAR.get(strategy, 4 * 1024) * n_vars,
+        seconds=periods * n_vars * SECONDS_PER_VAR.get(strategy, 4e-4),
+    )
+
+
+def estimate_instance(instance: dict, strategy: str, periods: int = 1, horizon: int = 1) -> Estimate:
+    cross_rows = None
+    if strategy == "adr":
+        from .optimizer import _adaptive_mask_of
+        mask = _adaptive_mask_of(instance)
+        cross_rows = None if mask is None else int((mask == 1.0).sum())
+    return estimate(len(instance["nodes"]), len(instance["arcs"]),
+                    len(instance["classes"]), strategy, periods, horizon, cross_rows)
+
+
+class AdmissionController:
+    def __init__(self, budget_mb: float = SOLVE_MEMORY_MB, max_queue: int = ADMISSION_MAX_QUEUE,
+                 max_wait_s: float = ADMISSION_MAX_WAIT_S):
+        self.budget = int(budget_mb * 2**20)
+        self.max_queue = max_queue
+        self.max_wait_s = max_wait_s
+        self._cond = threading.Condition()
+        self._in_use = 0
+        self._running: dict[int, tuple[int, float, float]] = {}   # ticket -> (bytes, start, est s)
+        self._waiting: deque = deque()
+        self._tickets = 0
+        self._time_scale = 1.0
+
+    def _expected_wait(self, need: int) -> float:
+        """Seconds until `need` bytes are free, assuming running solves end as estimated."""
+        now = time.monotonic()
+        free = self.budget - self._in_use
+        if need <= free:
+            return 0.0
+        ends = sorted(
+            (max(0.0, start + est * self._time_scale - now), mem)
+            for mem, start, est in self._running.values()
+        )
+        for remaining, mem in ends:
+            free += mem
+            if need <= free:
+                return remaining
+        return ends[-1][0] if ends else 0.0
+
+    def _must_wait(self, need: int, max_wait_s: float | None) -> bool:
+        if not (self._waiting or self._in_use + need > self.budget):
+            return False
+        if max_wait_s is None:
+            return True
+        wait = self._expected_wait(need) + sum(
+            est_s * self._time_scale for _, est_s in self._waiting)
+        if len(self._waiting) >= self.max_queue or wait > max_wait_s:
+            raise AdmissionRejected(
+                f"Solver is at capacity ({len(self._running)} running, "
+                f"{len(self._waiting)} queued)", retry_after=max(1.0, wait))
+        return True
+
+    def check(self, est: Estimate):
+        """Raise AdmissionRejected now if admit(est) would be rejected without queueing."""
+        with self._cond:
+            self._must_wait(min(est.memory_bytes, self.budget), self.max_wait_s)
+
+    @contextmanager
+    def admit(self, est: Estimate, max_wait_s=_DEFAULT, cancelled=None):
+        """
+        Hold est.memory_bytes of the budget for the duration of the block.
+
+        max_wait_s defaults to the controller's interactive limit; None queues
+        for as long as it takes, without the queue-length and expected-wait
+        rejections (batch work such as a national run). cancelled() is checked
+        at least once a second while queued and gives up the place when true.
+        """
+        if max_wait_s is _DEFAULT:
+            max_wait_s = self.max_wait_s
+        # A request larger than the whole budget may still run, but only alone
+        need = min(est.memory_bytes, self.budget)
+        with self._cond:
+            self._tickets += 1
+            ticket = self._tickets
+            deadline = None if max_wait_s is None else time.monotonic() + max_wait_s
+            if self._must_wait(need, max_wait_s):
+                self._waiting.append((ticket, est.seconds))
+                try:
+                    while (self._waiting[0][0] != ticket
+                           or self._in_use + need > self.budget):
+                        if cancelled is not None and cancelled():
+                            raise AdmissionRejected("Cancelled while waiting for solver capacity",
+                                                    retry_after=1.0)
+                        timeout = None if cancelled is None else 1.0
+                        if deadline is not None:
+                            remaining = deadline - time.monotonic()
+                            if remaining <= 0:
+                                raise AdmissionRejected(
+                                    "Timed out waiting for solver capacity",
+                                    retry_after=max(1.0, self._expected_wait(need)))
+                            timeout = remaining if timeout is None else min(timeout, remaining)
+                        self._cond.wait(timeout=timeout)
+                finally:
+                    self._waiting.remove(next(w for w in self._waiting if w[0] == ticket))
+                    self._cond.notify_all()
+            self._in_use += need
+            self._running[ticket] = (need, time.monotonic(), est.seconds)
+
+        try:
+            yield
+        finally:
+            with self._cond:
+                mem, start, est_s = self._running.pop(ticket)
+                self._in_use -= mem
+                if est_s > 0:
+                    ratio = (time.monotonic() - start) / est_s
+                    self._time_scale = 0.8 * self._time_scale + 0.2 * min(max(ratio, 0.01), 100.0)
+                self._cond.notify_all()
+
+    def stats(self) -> dict:
+        with self._cond:
+            return {
+                "running": len(self._running),
+                "queued": len(self._waiting),
+                "memory_in_use_mb": round(self._in_use / 2**20, 1),
+                "memory_budget_mb": round(self.budget / 2**20, 1),
+                "estimated_wait_s": math.ceil(
+                    sum(est_s * self._time_scale for _, est_s in self._waiting)),
+            }
+
+
+admission = AdmissionController()
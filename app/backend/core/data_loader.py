@@ -3,7 +3,11 @@ data_loader.py: Load and clean all static datasets once at startup.
 Extracted from national_pipeline/run_cms_two.py and national_pipeline.ipynb.
 """
 
+import hashlib
+import os
 import re
+import threading
+from collections import OrderedDict
 from pathlib import Path
 
 import numpy as np
@@ -22,6 +26,34 @@ BUILTIN_SCENARIOS = [
 ]
 BUILTIN_SCENARIO_IDS = {s["id"] for s in BUILTIN_SCENARIOS}
 
+# Region instances kept in memory between requests (see AppData.cached_instance)
+INSTANCE_CACHE_SIZE = int(os.environ.get("KAELO_INSTANCE_CACHE_SIZE", "64"))
+
+# Files load() reads; their sizes and mtimes fingerprint the data on disk
+SOURCE_FILES = [
+    "botswana_geocode/census_population_2022_geocoded_final_uniform.csv",
+    "data/processed/facilities_with_warehouses.csv",
+    "data/processed/distance_matrix_named.csv",
+    "data/processed/duration_matrix_named.csv",
+    "census_datacleaning/botswana_population_age_breakdown.csv",
+    "data/reference/district_admissions_estimates_2021.csv",
+    "national_pipeline/antimicrobials.csv",
+]
+
+
+def _source_fingerprint() -> str:
+    h = hashlib.sha1()
+    paths = [BASE_DIR / f for f in SOURCE_FILES]
+    paths += sorted((BASE_DIR / "antimicrobialglm/artifacts").glob("*.csv"))
+    paths += sorted(CMS_SCENARIOS_DIR.glob("*.csv"))
+    for path in paths:
+        try:
+            st = path.stat()
+            h.update(f"{path}:{st.st_size}:{st.st_mtime_ns};".encode())
+        except OSError:
+            h.update(f"{path}:missing;".encode())
+    return h.hexdigest()[:16]
+
 
 def _clean_matrix(df: pd.DataFrame) -> pd.DataFrame:
     df.index = df.index.astype(str).str.replace("\ufeff", "").str.strip()
@@ -31,6 +63,12 @@ def _clean_matrix(df: pd.DataFrame) -> pd.DataFrame:
     return df
 
 
+def _dedupe_matrix(df: pd.DataFrame) -> pd.DataFrame:
+    """Keep the first occurrence of each row and column label."""
+    df = df[~df.index.duplicated(keep="first")]
+    return df.loc[:, ~df.columns.duplicated(keep="first")]
+
+
 def clean_fac_name(x: str) -> str:
     s = str(x).replace("\ufeff", "").replace("\xa0", " ")
     return " ".join(s.split()).strip()
@@ -92,15 +130,73 @@ def _attach_assigned_dhmt(result_df, fac_df, subtype):
     return out.drop(columns=["Facility Name"])
 
 
+def build_demand_rate_tensor(p_class: pd.DataFrame, m_ak: pd.DataFrame,
+                             pi_inf_given_a: pd.DataFrame, age_map: dict) -> dict:
+    """
+    Collapse the GLM artifacts into expected prescriptions per patient-day.
+
+    rate[a, h, c] = sum over infection status i of
+                    pi(i | a) * m_ak(a, i) * p_class(c | a, i, h)
+
+    present[a, h, c] marks the (age group, hospital type, class) combinations
+    the artifact tables actually join on, so callers can reproduce which
+    classes appear for a facility even where the rate is zero.
+    """
+    pi = pi_inf_given_a.copy()
+    pi["agegroup"] = pi["agegroup"].replace(age_map)
+    pi["infectionstatus"] = pi["infectionstatus"].astype(str).str.strip().str.lower()
+
+    m = m_ak[["agegroup", "infectionstatus", "m_ak"]].copy()
+    m["agegroup"] = m["agegroup"].replace(age_map)
+    m["infectionstatus"] = m["infectionstatus"].astype(str).str.strip().str.lower()
+
+    p = p_class.copy()
+    for col in ["agegroup", "infectionstatus", "hospital_type", "Class"]:
+        if col in p.columns:
+            p[col] = p[col].astype(str).str.strip()
+
+    chain = (
+        pi.merge(m, on=["agegroup", "infectionstatus"], how="left")
+        .merge(p, on=["agegroup", "infectionstatus"], how="inner")
+    )
+    chain["rate"] = (chain["pi_inf_given_a"] * chain["m_ak"] * chain["p_class"]).fillna(0.0)
+
+    agegroups = sorted(chain["agegroup"].unique().tolist())
+    hospital_types = sorted(chain["hospital_type"].unique().tolist())
+    classes = sorted(chain["Class"].unique().tolist())
+    a = chain["agegroup"].map({v: i for i, v in enumerate(agegroups)}).to_numpy()
+    h = chain["hospital_type"].map({v: i for i, v in enumerate(hospital_types)}).to_numpy()
+    c = chain["Class"].map({v: i for i, v in enumerate(classes)}).to_numpy()
+
+    shape = (len(agegroups), len(hospital_types), len(classes))
+    rate = np.zeros(shape)
+    np.add.at(rate, (a, h, c), chain["rate"].to_numpy(dtype=float))
+    present = np.zeros(shape, dtype=bool)
+    present[a, h, c] = True
+    return {
+        "agegroups": agegroups,
+        "hospital_types": hospital_types,
+        "classes": classes,
+        "rate": rate,
+        "present": present,
+    }
+
+
 class AppData:
     """Singleton-like container holding all loaded data."""
 
     def __init__(self):
         self.loaded = False
+        # Bumped by every route that mutates facilities, matrices or CMS data;
+        # cached region instances are only valid for the version they were built at.
+        self.data_version = 0
+        self._instance_cache = OrderedDict()
+        self._instance_lock = threading.Lock()
 
     def load(self):
         if self.loaded:
             return
+        self.data_fingerprint = _source_fingerprint()
         self._load_population()
         self._load_facilities()
         self._load_matrices()
@@ -157,13 +253,78 @@ class AppData:
         self.dhmt_list = sorted(fac["DHMT"].dropna().astype(str).str.strip().unique().tolist())
 
     # Distance / time matrices
+    #
+    # Both matrices are held as square float32 arrays over one shared node list
+    # (the distance matrix's, de-duplicated keep-first), with a name -> index
+    # dict; regions are gathered with np.ix_. Distances are metres, times seconds.
     def _load_matrices(self):
-        self.dist_matrix_df = _clean_matrix(
+        dist_df = _dedupe_matrix(_clean_matrix(
             pd.read_csv(BASE_DIR / "data/processed/distance_matrix_named.csv", index_col=0)
-        )
-        self.time_matrix_df = _clean_matrix(
+        ))
+        time_df = _dedupe_matrix(_clean_matrix(
             pd.read_csv(BASE_DIR / "data/processed/duration_matrix_named.csv", index_col=0)
-        )
+        ))
+        cols = set(dist_df.columns)
+        nodes = [n for n in dist_df.index if n in cols]
+        self._matrix_lock = threading.Lock()
+        self.matrix_nodes = nodes
+        self.matrix_index = {n: i for i, n in enumerate(nodes)}
+        self.dist_matrix = np.ascontiguousarray(
+            dist_df.reindex(index=nodes, columns=nodes).to_numpy(dtype=np.float32))
+        self.time_matrix = np.ascontiguousarray(
+            time_df.reindex(index=nodes, columns=nodes).to_numpy(dtype=np.float32))
+
+    def has_matrix_node(self, name: str) -> bool:
+        return name in self.matrix_index
+
+    def matrix_slice(self, nodes: list) -> tuple:
+        """(distance, time) sub-matrices for nodes, in that order, as float32 arrays."""
+        with self._matrix_lock:
+            idx = np.array([self.matrix_index[n] for n in nodes], dtype=np.intp)
+            ix = np.ix_(idx, idx)
+            return self.dist_matrix[ix], self.time_matrix[ix]
+
+    def update_matrix_node(self, name: str, dists: dict, times: dict):
+        """
+        Set the symmetric distances/times between name and the given nodes.
+
+        A new node is appended with every other entry unreachable (inf);
+        entries not listed in dists/times keep their current values.
+        """
+        with self._matrix_lock:
+            if name not in self.matrix_index:
+                n = len(self.matrix_nodes)
+                pad = ((0, 1), (0, 1))
+                self.dist_matrix = np.pad(self.dist_matrix, pad, constant_values=np.inf)
+                self.time_matrix = np.pad(self.time_matrix, pad, constant_values=np.inf)
+                self.matrix_nodes = self.matrix_nodes + [name]
+                self.matrix_index = {**self.matrix_index, name: n}
+            i = self.matrix_index[name]
+            for mat, values in ((self.dist_matrix, dists), (self.time_matrix, times)):
+                js = np.array([self.matrix_index[v] for v in values], dtype=np.intp)
+                vals = np.array(list(values.values()), dtype=np.float32)
+                mat[i, js] = vals
+                mat[js, i] = vals
+                mat[i, i] = 0.0
+
+    def remove_matrix_node(self, name: str):
+        with self._matrix_lock:
+            i = self.matrix_index.get(name)
+            if i is None:
+                return
+            for attr in ("dist_matrix", "time_matrix"):
+                mat = getattr(self, attr)
+                setattr(self, attr, np.ascontiguousarray(
+                    np.delete(np.delete(mat, i, axis=0), i, axis=1)))
+            self.matrix_nodes = [n for n in self.matrix_nodes if n != name]
+            self.matrix_index = {n: k for k, n in enumerate(self.matrix_nodes)}
+
+    def matrix_frames(self) -> tuple:
+        """(distance, time) as labelled DataFrames, e.g. for writing back to CSV."""
+        with self._matrix_lock:
+            nodes = self.matrix_nodes
+            return (pd.DataFrame(self.dist_matrix, index=nodes, columns=nodes),
+                    pd.DataFrame(self.time_matrix, index=nodes, columns=nodes))
 
     # Age breakdown
     def _load_age_data(self):
@@ -222,6 +383,7 @@ class AppData:
         pi = pi[["agegroup", "infectionstatus", "pi_inf_given_a"]]
         pi["agegroup"] = pi["agegroup"].replace(self.age_map)
         self.pi_inf_given_a = pi
+        self.demand_rates = build_demand_rate_tensor(self.p_class, m_ak, pi, self.age_map)
 
     # CMS data
     def _load_cms_data(self):
@@ -304,6 +466,52 @@ class AppData:
     def scenario_exists(self, scenario_id: str) -> bool:
         return f"biweekly_{scenario_id}" in self.cms_active.columns
 
+    # Region instance cache
+    @property
+    def cache_token(self) -> str:
+        """
+        Identifies the data results were computed from, across restarts: the
+        on-disk fingerprint taken at load plus the in-process edit counter.
+        """
+        return f"{getattr(self, 'data_fingerprint', '')}-{self.data_version}"
+
+    def bump_version(self):
+        """Invalidate everything derived from the mutable datasets; call once the edit is saved."""
+        with self._instance_lock:
+            self.data_version += 1
+            self._instance_cache.clear()
+
+    def cached_instance(self, key: tuple, build) -> dict:
+        """
+        Return the instance dict cached under key, calling build() on a miss.
+
+        Callers get a shallow copy, so replacing entries (mu_mat, arc_cap, ...)
+        never leaks into the cache; the DataFrames inside must not be modified
+        in place.
+        """
+        with self._instance_lock:
+            version = self.data_version
+            inst = self._instance_cache.get(key)
+            if inst is not None:
+                self._instance_cache.move_to_end(key)
+                return dict(inst)
+
+        inst = build()
+        with self._instance_lock:
+            # Drop results built against data that changed while we were building
+            if self.data_version == version and INSTANCE_CACHE_SIZE > 0:
+                self._instance_cache[key] = inst
+                while len(self._instance_cache) > INSTANCE_CACHE_SIZE:
+                    self._instance_cache.popitem(last=False)
+        return dict(inst)
+
+    def _after_fork(self):
+        # A process forked from a threaded server would keep any lock another
+        # thread held at that moment locked forever.
+        self._instance_lock = threading.Lock()
+        if hasattr(self, "_matrix_lock"):
+            self._matrix_lock = threading.Lock()
+
     # Facility assignments
     def _compute_facility_assignments(self):
         _pop = self.pop.copy()
@@ -425,3 +633,4 @@ class AppData:
 
 # Module-level singleton
 app_data = AppData()
+os.register_at_fork(after_in_child=app_data._after_fork)
@@ -0,0 +1,476 @@
+"""
+highs_direct.py: The one-period supply LP assembled straight into sparse arrays for HiGHS.
+
+Same model as optimizer.CompiledProblem (Nominal, Static Robust, ADR), but the
+constraint matrix is built with NumPy index arithmetic into a scipy.sparse CSC
+matrix and handed to highspy, skipping CVXPY canonicalization entirely. The
+Highs handle stays alive between solves: per-period changes (opening inventory,
+demand, sigma right-hand sides, costs) are applied in place as row bounds and
+column costs, so HiGHS re-solves from the previous optimal basis.
+"""
+
+import threading
+import time
+
+import highspy
+import numpy as np
+import scipy.sparse as sp
+
+INF = highspy.kHighsInf
+
+
+class _LPBuilder:
+    """Accumulates columns, rows and COO triplets for one LP."""
+
+    def __init__(self):
+        self.n_col = 0
+        self.n_row = 0
+        self.col_lo, self.col_hi = [], []
+        self.integer = []
+        self.row_lo, self.row_hi = [], []
+        self.r, self.c, self.v = [], [], []
+
+    def var(self, shape, lb=0.0, ub=INF, integer=False) -> np.ndarray:
+        size = int(np.prod(shape))
+        idx = np.arange(self.n_col, self.n_col + size).reshape(shape)
+        self.n_col += size
+        self.col_lo.append(np.broadcast_to(np.asarray(lb, dtype=float), shape).ravel())
+        self.col_hi.append(np.broadcast_to(np.asarray(ub, dtype=float), shape).ravel())
+        if integer:
+            self.integer.append(idx.ravel())
+        return idx
+
+    def rows(self, shape, lo=-INF, hi=INF) -> np.ndarray:
+        size = int(np.prod(shape))
+        idx = np.arange(self.n_row, self.n_row + size).reshape(shape)
+        self.n_row += size
+        self.row_lo.append(np.broadcast_to(np.asarray(lo, dtype=float), shape).ravel())
+        self.row_hi.append(np.broadcast_to(np.asarray(hi, dtype=float), shape).ravel())
+        return idx
+
+    def add(self, rows, cols, vals=1.0):
+        rows, cols, vals = np.broadcast_arrays(
+            np.asarray(rows), np.asarray(cols), np.asarray(vals, dtype=float)
+        )
+        self.r.append(rows.ravel())
+        self.c.append(cols.ravel())
+        self.v.append(vals.ravel())
+
+    def lp(self, cost) -> highspy.HighsLp:
+        A = sp.coo_matrix(
+            (np.concatenate(self.v), (np.concatenate(self.r), np.concatenate(self.c))),
+            shape=(self.n_row, self.n_col),
+        ).tocsc()
+        A.sum_duplicates()
+        lp = highspy.HighsLp()
+        lp.num_col_ = self.n_col
+        lp.num_row_ = self.n_row
+        lp.col_cost_ = np.asarray(cost, dtype=float)
+        lp.col_lower_ = np.concatenate(self.col_lo)
+        lp.col_upper_ = np.concatenate(self.col_hi)
+        if self.integer:
+            integrality = [highspy.HighsVarType.kContinuous] * self.n_col
+            for j in np.concatenate(self.integer):
+                integrality[j] = highspy.HighsVarType.kInteger
+            lp.integrality_ = integrality
+        lp.row_lower_ = np.concatenate(self.row_lo)
+        lp.row_upper_ = np.concatenate(self.row_hi)
+        lp.a_matrix_.format_ = highspy.MatrixFormat.kColwise
+        lp.a_matrix_.num_col_ = self.n_col
+        lp.a_matrix_.num_row_ = self.n_row
+        lp.a_matrix_.start_ = A.indptr.astype(np.int32)
+        lp.a_matrix_.index_ = A.indices.astype(np.int32)
+        lp.a_matrix_.value_ = A.data
+        self.nnz = int(A.nnz)
+        return lp
+
+
+_STATUS = {
+    highspy.HighsModelStatus.kOptimal: "optimal",
+    highspy.HighsModelStatus.kInfeasible: "infeasible",
+    highspy.HighsModelStatus.kUnbounded: "unbounded",
+    highspy.HighsModelStatus.kUnboundedOrInfeasible: "infeasible_or_unbounded",
+    highspy.HighsModelStatus.kTimeLimit: "time_limit",
+    highspy.HighsModelStatus.kIterationLimit: "iteration_limit",
+}
+
+
+def incumbent(info, is_mip: bool, offset: float = 0.0) -> tuple[str, dict | None]:
+    """
+    ("feasible", {incumbent, bound, gap}) if HiGHS holds a feasible point,
+    else ("time_limit", None); bound and gap are only set for MIPs. Used for
+    solves stopped at their time limit, and for the gap of MIPs solved to
+    optimality within mip_gap.
+    """
+    if info.primal_solution_status != int(highspy.SolutionStatus.kSolutionStatusFeasible):
+        return "time_limit", None
+    limit = {"incumbent": float(info.objective_function_value) + offset,
+             "bound": None, "gap": None}
+    if is_mip:
+        limit["bound"] = float(info.mip_dual_bound) + offset
+        limit["gap"] = float(info.mip_gap)
+    return "feasible", limit
+
+
+class HighsDirectProblem:
+    """
+    Drop-in alternative to optimizer.CompiledProblem backed by a live highspy model.
+
+    Shares the same interface (set_data / solve / values and the incidence
+    attributes used for post-solve bookkeeping) so run_simulation and
+    run_planning can switch engines with backend="highs_direct". horizon > 1
+    chains that many periods into one lookahead LP, as in CompiledProblem;
+    integer makes truck counts integer, as in CompiledProblem.
+    """
+
+    backend = "highs_direct"
+
+    def __init__(self, nodes, arcs, classes, cms, strategy, adaptive_mask=None, horizon=1,
+                 integer=False):
+        if strategy not in ("nominal", "static_robust", "adr"):
+            raise ValueError(f"Unknown strategy '{strategy}'")
+        if strategy == "adr" and adaptive_mask is None:
+            raise ValueError("arc_df required for ADR strategy")
+        self.nodes = list(nodes)
+        self.arcs = list(arcs)
+        self.classes = list(classes)
+        self.strategy = strategy
+        self.horizon = int(horizon)
+        self.integer = bool(integer)
+        self.lock = threading.Lock()
+        self.solves = 0
+        self.solution_info = None
+
+        N, m, K = len(self.nodes), len(self.arcs), len(self.classes)
+        self.N, self.m, self.K = N, m, K
+        node_idx = {n: i for i, n in enumerate(self.nodes)}
+        self.node_idx = node_idx
+        self.cms_idx = node_idx[cms]
+        self.arc_dest_idx = np.array([node_idx[j] for (_, j) in self.arcs], dtype=int)
+        self.arc_src_idx = np.array([node_idx[i] for (i, _) in self.arcs], dtype=int)
+
+        # Sparse incidence matrices for post-solve bookkeeping
+        ones, arange = np.ones(m), np.arange(m)
+        self.A_in = sp.csr_matrix((ones, (self.arc_dest_idx, arange)), shape=(N, m))
+        self.A_out = sp.csr_matrix((ones, (self.arc_src_idx, arange)), shape=(N, m))
+
+        self.A_adapt = None
+        self.dst_adapt = None
+        if strategy == "adr":
+            mask = np.asarray(adaptive_mask, dtype=float)
+            self.A_adapt = np.where(mask == 1.0)[0]
+            self.non_adapt = np.where(mask == 0.0)[0]
+            self.src_adapt = self.arc_src_idx[self.A_adapt]
+            self.dst_adapt = self.arc_dest_idx[self.A_adapt]
+
+        self.highs = highspy.Highs()
+        self.highs.setOptionValue("output_flag", False)
+        self._matrix_key = None
+        self._data = None
+        self._prep_s = 0.0
+        self._last_stats = {}
+
+    # Assembly
+
+    def _assemble(self):
+        """Build the full LP for the current data and pass it to HiGHS."""
+        b = _LPBuilder()
+        # Rows whose bounds track I0 / mu, refreshed in place before each solve:
+        # (rows, "upper" | "equal", subtract_mu, opens_with_I0)
+        self._rhs_rows = []
+        # Rows whose lower bound is +/- sigma: (rows, sign)
+        self._sigma_rows = []
+        self._periods = []
+        I_prev = None
+        for _ in range(self.horizon):
+            cols = self._period_block(b, I_prev)
+            self._periods.append(cols)
+            I_prev = cols["I1"]
+        self._cols = self._periods[0]
+
+        # Keep the previous optimal basis when the rebuilt LP has the same shape
+        # (e.g. only Gamma or capacities moved), so the re-solve starts warm.
+        basis = None
+        if getattr(self, "n_col", None) == b.n_col and self.n_row == b.n_row and self.solves > 0:
+            basis = self.highs.getBasis()
+
+        self.n_col, self.n_row = b.n_col, b.n_row
+        self.highs.clearModel()
+        self.highs.passModel(b.lp(self._cost_vector(b.n_col)))
+        self.nnz = b.nnz
+        self._bounds_from_data()
+        if basis is not None and basis.valid:
+            self.highs.setBasis(basis)
+
+    def _period_block(self, b, I_prev):
+        """
+        Columns and rows of one period. I_prev holds the column indices of the
+        previous period's closing inventory, or None for the period opening at I0.
+        """
+        d = self._data
+        N, m, K = self.N, self.m, self.K
+        sigma, Gamma = d["sigma"], d["Gamma"]
+        src, dst, cms = self.arc_src_idx, self.arc_dest_idx, self.cms_idx
+
+        F = b.var((m, K))
+        u = b.var((N, K))
+        I1 = b.var((N, K))
+        q = b.var(K)
+        lam = b.var(m, integer=self.integer)
+        y = b.var(m, ub=1.0, integer=self.integer)
+        cols = {"F": F, "u": u, "I1": I1, "q": q, "lam": lam}
+
+        big_m = 1e5
+        r = b.rows(m, hi=0.0)                      # lam - big_m * y <= 0
+        b.add(r, lam, 1.0)
+        b.add(r, y, -big_m)
+
+        def flow_terms(R):
+            """R(N,K) rows receive -(net inflow) - supply, i.e. the negated net_flow + supply."""
+            b.add(R[dst, :], F, -1.0)
+            b.add(R[src, :], F, 1.0)
+            b.add(R[cms, :], q, -1.0)
+
+        def opening(R, kind, sub_mu):
+            """Register R as a row block whose right-hand side is I0 (- mu)."""
+            if I_prev is not None:
+                b.add(R, I_prev, -1.0)             # opening stock is a variable here
+            self._rhs_rows.append((R, kind, sub_mu, I_prev is None))
+
+        ksum = np.broadcast_to(np.arange(m)[:, None], (m, K))
+        zeros = np.zeros((N, K))
+
+        if self.strategy in ("nominal", "static_robust"):
+            r = b.rows(m, hi=0.0)                  # sum_k F - cap * lam <= 0
+            b.add(r[ksum], F, 1.0)
+            b.add(r, lam, -d["arc_cap"])
+
+        if self.strategy == "nominal":
+            R = b.rows((N, K), lo=zeros, hi=zeros)  # I1 - net_flow - supply - u == I0 - mu
+            b.add(R, I1, 1.0)
+            b.add(R, u, -1.0)
+            flow_terms(R)
+            opening(R, "equal", True)
+
+            R = b.rows((N, K), hi=zeros)           # A_out F - A_in F - supply <= I0
+            flow_terms(R)
+            opening(R, "upper", False)
+
+        elif self.strategy == "static_robust":
+            for ship in (False, True):
+                theta = b.var((N, K))
+                pi_plus = b.var((N, K))
+                pi_minus = b.var((N, K))
+                R = b.rows((N, K), hi=zeros)       # Gamma*theta + pi+ + pi- - rhs <= 0
+                b.add(R, theta, Gamma)
+                b.add(R, pi_plus, 1.0)
+                b.add(R, pi_minus, 1.0)
+                flow_terms(R)
+                if not ship:
+                    b.add(R, u, -1.0)
+                    b.add(R, I1, 1.0)
+                opening(R, "upper", not ship)
+
+                R = b.rows((N, K), lo=-sigma)      # theta + pi+ >= -sigma
+                b.add(R, theta, 1.0)
+                b.add(R, pi_plus, 1.0)
+                self._sigma_rows.append((R, -1.0))
+                R = b.rows((N, K), lo=sigma)       # theta + pi- >= sigma
+                b.add(R, theta, 1.0)
+                b.add(R, pi_minus, 1.0)
+                self._sigma_rows.append((R, 1.0))
+
+        else:  # adr
+            A_adapt, src_a, dst_a = self.A_adapt, self.src_adapt, self.dst_adapt
+            P = len(A_adapt)
+            alpha_ub = np.full((m, K), INF)
+            alpha_ub[self.non_adapt, :] = 0.0      # non-adaptive arcs: alpha = 0
+            alpha = b.var((m, K), lb=-alpha_ub, ub=alpha_ub)
+            cols["alpha"] = alpha
+            eta = b.var(m)
+            rho_plus = b.var((m, K))
+            rho_minus = b.var((m, K))
+
+            # Robust arc capacity: Gamma*eta + sum_k(rho) + sum_k(F) - cap*lam <= 0
+            r = b.rows(m, hi=0.0)
+            b.add(r, eta, Gamma)
+            b.add(r[ksum], rho_plus, 1.0)
+            b.add(r[ksum], rho_minus, 1.0)
+            b.add(r[ksum], F, 1.0)
+            b.add(r, lam, -d["arc_cap"])
+            sigma_dest = sigma[dst, :]
+            R = b.rows((m, K), lo=0.0)             # eta + rho+ - alpha*sigma_dest >= 0
+            b.add(R, eta[:, None], 1.0)
+            b.add(R, rho_plus, 1.0)
+            b.add(R, alpha, -sigma_dest)
+            R = b.rows((m, K), lo=0.0)             # eta + rho- + alpha*sigma_dest >= 0
+            b.add(R, eta[:, None], 1.0)
+            b.add(R, rho_minus, 1.0)
+            b.add(R, alpha, sigma_dest)
+
+            sigma_in = sigma[dst_a, :]             # sigma at the head of each adaptive arc
+            for ship in (False, True):
+                theta = b.var((N, K))
+                self_plus = b.var((N, K))
+                self_minus = b.var((N, K))
+                cross_plus = b.var((P, K))
+                cross_minus = b.var((P, K))
+
+                R = b.rows((N, K), hi=zeros)
+                b.add(R, theta, Gamma)
+                b.add(R, self_plus, 1.0)
+                b.add(R, self_minus, 1.0)
+                b.add(R[src_a, :], cross_plus, 1.0)
+                b.add(R[src_a, :], cross_minus, 1.0)
+                flow_terms(R)
+                if not ship:
+                    b.add(R, u, -1.0)
+                    b.add(R, I1, 1.0)
+                opening(R, "upper", not ship)
+
+                # Self terms: coeff_self = A_in_adapt @ alpha - 1 (demand) or
+                # -(A_in_adapt @ alpha) (ship), each scaled by sigma at the node.
+                sgn = -1.0 if ship else 1.0
+                R = b.rows((N, K), lo=zeros if ship else -sigma)
+                b.add(R, theta, 1.0)
+                b.add(R, self_plus, 1.0)
+                b.add(R[dst_a, :], alpha[A_adapt, :], -sgn * sigma_in)
+                if not ship:
+                    self._sigma_rows.append((R, -1.0))
+                R = b.rows((N, K), lo=zeros if ship else sigma)
+                b.add(R, theta, 1.0)
+                b.add(R, self_minus, 1.0)
+                b.add(R[dst_a, :], alpha[A_adapt, :], sgn * sigma_in)
+                if not ship:
+                    self._sigma_rows.append((R, 1.0))
+
+                # Cross terms at the source of each adaptive arc
+                R = b.rows((P, K), lo=0.0)
+                b.add(R, theta[src_a, :], 1.0)
+                b.add(R, cross_plus, 1.0)
+                b.add(R, alpha[A_adapt, :], sgn * sigma_in)
+                R = b.rows((P, K), lo=0.0)
+                b.add(R, theta[src_a, :], 1.0)
+                b.add(R, cross_minus, 1.0)
+                b.add(R, alpha[A_adapt, :], -sgn * sigma_in)
+
+        return cols
+
+    def _cost_vector(self, n_col):
+        d = self._data
+        cost = np.zeros(n_col)
+        for cols in self._periods:
+            cost[cols["lam"]] = d["c_arc"]
+            cost[cols["u"]] = np.broadcast_to(d["c_pen"], (self.N, self.K))
+            cost[cols["I1"]] = d["holding"]
+            cost[cols["q"]] = d["c_proc"]
+        return cost
+
+    def _bounds_from_data(self):
+        """Refresh sigma-dependent row bounds in place."""
+        for R, sign in self._sigma_rows:
+            lo = (sign * self._data["sigma"]).ravel()
+            self._change_rows(R.ravel(), lo, np.full(lo.size, INF))
+
+    def _change_rows(self, rows, lo, hi):
+        self.highs.changeRowsBounds(
+            rows.size, rows.astype(np.int32),
+            np.ascontiguousarray(lo, dtype=float), np.ascontiguousarray(hi, dtype=float),
+        )
+
+    # Interface shared with CompiledProblem
+
+    def set_data(self, mu_np, sigma_np, Gamma, arc_cap_vec, c_arc, c_pen, c_proc,
+                 holding_cost, transport_cost_per_km):
+        """Store instance data; rebuild only if matrix coefficients changed."""
+        t0 = time.perf_counter()
+        self._data = {
+            "mu": np.asarray(mu_np, dtype=float),
+            "sigma": np.asarray(sigma_np, dtype=float),
+            "Gamma": float(Gamma),
+            "arc_cap": np.asarray(arc_cap_vec, dtype=float),
+            "c_arc": float(transport_cost_per_km) * np.asarray(c_arc, dtype=float),
+            "c_pen": np.asarray(c_pen, dtype=float),
+            "c_proc": np.asarray(c_proc, dtype=float),
+            "holding": float(holding_cost),
+        }
+        # sigma enters the ADR matrix through alpha * sigma; Gamma and arc_cap
+        # are coefficients for every strategy that uses them.
+        d = self._data
+        matrix_key = (
+            d["Gamma"], d["arc_cap"].tobytes(),
+            d["sigma"].tobytes() if self.strategy == "adr" else None,
+        )
+        if matrix_key != self._matrix_key:
+            self._assemble()
+            self._matrix_key = matrix_key
+        else:
+            cost = self._cost_vector(self.n_col)
+            self.highs.changeColsCost(
+                self.n_col, np.arange(self.n_col, dtype=np.int32), cost,
+            )
+            self._bounds_from_data()
+        self._prep_s += time.perf_counter() - t0
+
+    def solve(self, I0_np, warm_start: bool = True, time_limit: float | None = None,
+              mip_gap: float | None = None, threads: int | None = None) -> str:
+        """
+        Solve for opening inventory I0. With warm_start the Highs handle keeps
+        the previous optimal basis and factorization; otherwise it starts cold.
+        time_limit (seconds), mip_gap and threads bound this run only; a run
+        stopped at the time limit returns "feasible" or "time_limit" (see
+        incumbent()); solution_info holds its incumbent, bound and gap.
+        """
+        t0 = time.perf_counter()
+        I0 = np.asarray(I0_np, dtype=float)
+        mu = self._data["mu"]
+        for R, kind, sub_mu, opens in self._rhs_rows:
+            rhs = (I0 if opens else np.zeros_like(I0)) - (mu if sub_mu else 0.0)
+            rhs = rhs.ravel()
+            lo = rhs if kind == "equal" else np.full(rhs.size, -INF)
+            self._change_rows(R.ravel(), lo, rhs)
+        if not warm_start:
+            self.highs.clearSolver()
+        self.highs.setOptionValue("time_limit", INF if time_limit is None else max(time_limit, 0.0))
+        self.highs.setOptionValue("mip_rel_gap", 1e-4 if mip_gap is None else float(mip_gap))
+        self.highs.setOptionValue("threads", 0 if threads is None else int(threads))
+        t1 = time.perf_counter()
+        self.highs.run()
+        t2 = time.perf_counter()
+        self.solves += 1
+        self.solution_info = None
+        info = self.highs.getInfo()
+        # canon_s is the direct path's equivalent of CVXPY canonicalization:
+        # model assembly or in-place updates since the previous solve.
+        self._last_stats = {
+            "n_vars": self.n_col,
+            "n_constraints": self.n_row,
+            "nnz": self.nnz,
+            "canon_s": self._prep_s + (t1 - t0),
+            "solver_s": t2 - t1,
+            "iterations": max(info.simplex_iteration_count, 0) + max(info.ipm_iteration_count, 0),
+        }
+        self._prep_s = 0.0
+        status = self.highs.getModelStatus()
+        if status == highspy.HighsModelStatus.kTimeLimit:
+            outcome, self.solution_info = incumbent(self.highs.getInfo(), self.integer)
+            return outcome
+        if self.integer and status == highspy.HighsModelStatus.kOptimal:
+            self.solution_info = incumbent(self.highs.getInfo(), True)[1]
+        return _STATUS.get(status, self.highs.modelStatusToString(status).lower())
+
+    def solve_stats(self) -> dict:
+        """Size and timings of the last solve (see CompiledProblem.solve_stats)."""
+        return dict(self._last_stats)
+
+    def values(self) -> dict:
+        """Period-0 primal values and the objective of the whole window."""
+        x = np.asarray(self.highs.getSolution().col_value, dtype=float)
+        cols = self._cols
+        return {
+            "F": x[cols["F"]],
+            "q": x[cols["q"]],
+            "lam": x[cols["lam"]],
+            "alpha": x[cols["alpha"]] if "alpha" in cols else None,
+            "objective": float(self.highs.getInfo().objective_function_value),
+        }
@@ -0,0 +1,385 @@
+"""
+Background optimization jobs run in a bounded pool of worker processes.
+
+A job is a function and its arguments. If it returns a generator, the worker
+iterates it, publishes every yielded item as progress, and the generator's
+return value becomes the job result; otherwise the return value is the
+result. Workers are forked from the multiprocessing fork server, a
+single-threaded process that preloads the solver libraries
+(worker_preload.py), so forking never copies the lock state of the threaded
+API process. Workers hold no region data: jobs carry their packed instance,
+so data edits never make a worker stale. Each worker reports back over a
+pipe of its own rather than a queue shared with the others: a worker killed
+mid-write (e.g. for memory) would leave a shared queue's write lock held and
+silence every worker after it. A worker that dies is replaced outside the
+manager's lock.
+
+Cancellation is cooperative: a queued job is dropped immediately, a running
+one stops after the period it is solving. The worker throws JobCancelled into
+the generator at its current yield; a generator that catches it and returns
+hands back a partial result, which is kept as the cancelled job's result.
+"""
+
+import inspect
+import logging
+import multiprocessing as mp
+import multiprocessing.connection
+import os
+import threading
+import time
+import uuid
+from collections import OrderedDict, deque
+
+log = logging.getLogger(__name__)
+
+WORKER_PRELOAD = "app.backend.core.worker_preload"
+
+JOB_WORKERS = int(os.environ.get("KAELO_JOB_WORKERS", "2"))
+JOB_QUEUE_SIZE = int(os.environ.get("KAELO_JOB_QUEUE_SIZE", "16"))
+JOB_HISTORY = int(os.environ.get("KAELO_JOB_HISTORY", "100"))
+
+FINISHED = ("completed", "failed", "cancelled")
+
+
+class JobQueueFull(RuntimeError):
+    pass
+
+
+class JobFailed(RuntimeError):
+    pass
+
+
+class JobCancelled(Exception):
+    """Thrown into a running job's generator when the job is cancelled."""
+
+
+def _worker_loop(tasks, events, cancel):
+    """Worker process: run one job at a time, sending events back to the API process."""
+    while True:
+        task = tasks.get()
+        if task is None:
+            return
+        job_id, fn, args, kwargs = task
+        try:
+            gen = fn(*args, **kwargs)
+            if not inspect.isgenerator(gen):
+                events.send((job_id, "completed", gen))
+                continue
+            while True:
+                if cancel.is_set():
+                    try:
+                        gen.throw(JobCancelled())
+                        gen.close()
+                        partial = None
+                    except StopIteration as stop:
+                        partial = stop.value
+                    except JobCancelled:
+                        partial = None
+                    events.send((job_id, "cancelled", partial))
+                    break
+                try:
+                    item = next(gen)
+                except StopIteration as stop:
+                    events.send((job_id, "completed", stop.value))
+                    break
+                events.send((job_id, "progress", item))
+        except Exception as e:
+            detail = getattr(e, "detail", None) or str(e)
+            events.send((job_id, "failed", f"{type(e).__name__}: {detail}"))
+
+
+class _Worker:
+    """One worker process with its own task queue, event pipe and cancel flag."""
+
+    def __init__(self, ctx):
+        self.tasks = ctx.Queue()
+        self.cancel = ctx.Event()
+        self.events, send = ctx.Pipe(duplex=False)
+        self.job_id = None
+        self.replacing = False
+        self.process = ctx.Process(
+            target=_worker_loop, args=(self.tasks, send, self.cancel), daemon=True,
+        )
+        self.process.start()
+        send.close()    # the worker holds the only write end, so its exit reads as EOF
+
+    def stop(self):
+        if self.process.is_alive():
+            self.tasks.put(None)
+            self.process.join(timeout=5)
+        if self.process.is_alive():
+            self.process.terminate()
+
+
+class JobManager:
+    """
+    Queue of jobs in front of JOB_WORKERS worker processes.
+
+    Job records live in this process only; get() returns a snapshot that is
+    safe to serialize. At most JOB_QUEUE_SIZE jobs wait for a worker and the
+    JOB_HISTORY most recent jobs are kept for polling.
+    """
+
+    def __init__(self, workers: int = JOB_WORKERS, max_queued: int = JOB_QUEUE_SIZE,
+                 history: int = JOB_HISTORY, name: str = "job"):
+        self.n_workers = max(1, workers)
+        self.max_queued = max_queued
+        self.history = history
+        self.name = name
+        self._ctx = mp.get_context("forkserver")
+        self._ctx.set_forkserver_preload([WORKER_PRELOAD])
+        self._lock = threading.Lock()
+        self._changed = threading.Condition(self._lock)
+        self._jobs: "OrderedDict[str, dict]" = OrderedDict()
+        self._tasks: dict[str, tuple] = {}
+        self._pending: deque = deque()
+        self._workers: list[_Worker] = []
+        self._pump = None
+
+    def start(self):
+        """Fork the workers now (e.g. right after the data has loaded) instead of on first use."""
+        with self._lock:
+            self._start()
+
+    def _start(self):
+        if self._pump is not None:
+            return
+        self._workers = [_Worker(self._ctx) for _ in range(self.n_workers)]
+        self._pump = threading.Thread(target=self._pump_events, name=f"{self.name}-events",
+                                      daemon=True)
+        self._pump.start()
+        log.info("Started %d %s workers", self.n_workers, self.name)
+
+    def submit(self, fn, *args, kind: str = "job", meta: dict | None = None, **kwargs) -> str:
+        """Queue fn(*args, **kwargs) and return the job id."""
+        with self._lock:
+            if len(self._pending) >= self.max_queued:
+                raise JobQueueFull(f"{len(self._pending)} jobs already queued")
+            self._start()
+            job_id = uuid.uuid4().hex
+            self._jobs[job_id] = {
+                "id": job_id,
+                "kind": kind,
+                "status": "queued",
+                "submitted_at": time.time(),
+                "started_at": None,
+                "finished_at": None,
+                **(meta or {}),
+                "progress": [],
+                "result": None,
+                "error": None,
+            }
+            self._tasks[job_id] = (fn, args, kwargs)
+            self._pending.append(job_id)
+            self._trim()
+            dead = self._dispatch()
+        self._replace(dead)
+        return job_id
+
+    def get(self, job_id: str) -> dict | None:
+        with self._lock:
+            job = self._jobs.get(job_id)
+            if job is None:
+                return None
+            return {**job, "progress": list(job["progress"])}
+
+    def cancel(self, job_id: str) -> dict | None:
+        """Cancel a queued or running job; finished jobs are left as they are."""
+        with self._lock:
+            job = self._jobs.get(job_id)
+            if job is None:
+                return None
+            if job["status"] == "queued":
+                self._pending.remove(job_id)
+                self._tasks.pop(job_id, None)
+                self._finish(job, "cancelled")
+                self._changed.notify_all()
+            elif job["status"] == "running":
+                for w in self._workers:
+                    if w.job_id == job_id:
+                        w.cancel.set()
+                job["status"] = "cancelling"
+        return self.get(job_id)
+
+    def follow(self, job_id: str):
+        """
+        Yield a job's progress items as they arrive and return its result.
+
+        Raises JobFailed if the job fails or is cancelled. Closing the
+        generator before the job finishes cancels it. The record is dropped
+        either way.
+        """
+        seen = 0
+        finished = False
+        try:
+            while True:
+                with self._changed:
+                    job = self._jobs.get(job_id)
+                    while (job is not None and len(job["progress"]) == seen
+                           and job["status"] not in FINISHED):
+                        self._changed.wait()
+                    if job is None:
+                        raise JobFailed(f"unknown job '{job_id}'")
+                    items = job["progress"][seen:]
+                    status = job["status"]
+                seen += len(items)
+                yield from items
+                if status in FINISHED and seen == len(job["progress"]):
+                    finished = True
+                    break
+        finally:
+            if not finished:
+                self.cancel(job_id)
+                with self._lock:
+                    self._jobs.pop(job_id, None)
+        with self._lock:
+            job = self._jobs.pop(job_id, None)
+        if job["status"] != "completed":
+            raise JobFailed(job["error"] or job["status"])
+        return job["result"]
+
+    def run(self, fn, *args, **kwargs):
+        """Submit fn and block until it finishes; returns its result."""
+        gen = self.follow(self.submit(fn, *args, **kwargs))
+        while True:
+            try:
+                next(gen)
+            except StopIteration as stop:
+                return stop.value
+
+    def stats(self) -> dict:
+        with self._lock:
+            return {
+                "workers": self.n_workers,
+                "busy": sum(w.job_id is not None for w in self._workers),
+                "queued": len(self._pending),
+            }
+
+    def shutdown(self):
+        with self._lock:
+            workers, self._workers = self._workers, []
+            self._pending.clear()
+            self._tasks.clear()
+        for w in workers:
+            w.cancel.set()
+            w.stop()
+
+    def _replace(self, dead: list):
+        """
+        Start fresh workers in place of the dead ones _dispatch marked as
+        replacing, on a thread of their own, so neither the caller nor anyone
+        waiting for the lock waits for the forks.
+        """
+        if dead:
+            threading.Thread(target=self._respawn, args=(dead,), name=f"{self.name}-respawn",
+                             daemon=True).start()
+
+    def _respawn(self, dead: list):
+        while dead:
+            fresh = []
+            for w in dead:
+                w.stop()
+                fresh.append((w, _Worker(self._ctx)))
+            with self._lock:
+                for old, new in fresh:
+                    if old in self._workers:
+                        self._workers[self._workers.index(old)] = new
+                    else:   # shut down meanwhile
+                        new.stop()
+                dead = self._dispatch()
+
+    # Internals; everything below runs with self._lock held
+
+    def _dispatch(self) -> list:
+        """Hand pending jobs to idle workers; returns the dead workers to _replace."""
+        dead = []
+        for w in self._workers:
+            if w.job_id is not None or w.replacing:
+                continue
+            if not w.process.is_alive():
+                w.replacing = True
+                dead.append(w)
+                continue
+            if not self._pending:
+                continue
+            job_id = self._pending.popleft()
+            fn, args, kwargs = self._tasks.pop(job_id)
+            job = self._jobs[job_id]
+            job["status"] = "running"
+            job["started_at"] = time.time()
+            w.cancel.clear()
+            w.job_id = job_id
+            w.tasks.put((job_id, fn, args, kwargs))
+        return dead
+
+    def _finish(self, job: dict, status: str):
+        job["status"] = status
+        job["finished_at"] = time.time()
+
+    def _trim(self):
+        finished = [k for k, j in self._jobs.items() if j["status"] in FINISHED]
+        for k in finished[:max(0, len(self._jobs) - self.history)]:
+            del self._jobs[k]
+
+    def _pump_events(self):
+        while True:
+            with self._lock:
+                conns = {w.events: w for w in self._workers if not w.replacing}
+            ready = mp.connection.wait(list(conns), timeout=1.0)
+            if not ready:
+                with self._lock:
+                    dead = self._reap_dead()
+                self._replace(dead)
+                continue
+            dead = []
+            for conn in ready:
+                try:
+                    job_id, kind, payload = conn.recv()
+                except (EOFError, OSError):
+                    # The worker exited; wait for it so _reap_dead sees it dead
+                    w = conns[conn]
+                    w.process.join(timeout=5)
+                    with self._lock:
+                        dead += self._reap_dead()
+                    if w.replacing:
+                        conn.close()
+                    continue
+                with self._lock:
+                    job = self._jobs.get(job_id)
+                    if job is not None:
+                        self._apply(job, kind, payload)
+                    if kind in FINISHED:
+                        for w in self._workers:
+                            if w.job_id == job_id:
+                                w.job_id = None
+                        dead += self._dispatch()
+                    self._changed.notify_all()
+            self._replace(dead)
+
+    def _apply(self, job: dict, kind: str, payload):
+        if kind == "progress":
+            job["progress"].append(payload)
+        elif kind == "completed":
+            job["result"] = payload
+            self._finish(job, "completed")
+        elif kind == "failed":
+            job["error"] = payload
+            self._finish(job, "failed")
+        elif kind == "cancelled":
+            job["result"] = payload
+            self._finish(job, "cancelled")
+
+    def _reap_dead(self) -> list:
+        """Fail the jobs of workers that died mid-run (e.g. killed for memory)."""
+        for w in self._workers:
+            if w.job_id is not None and not w.process.is_alive():
+                job = self._jobs.get(w.job_id)
+                if job is not None and job["status"] not in FINISHED:
+                    job["error"] = f"worker exited with code {w.process.exitcode}"
+                    self._finish(job, "failed")
+                w.job_id = None
+        self._changed.notify_all()
+        return self._dispatch()
+
+
+job_manager = JobManager()
@@ -0,0 +1,98 @@
+"""
+Prometheus metrics in the text exposition format, without the client library.
+
+Histograms and gauges here live in the API process; GET /metrics renders all
+of them. Solves run in worker processes and report through the telemetry
+store (core/telemetry.py) instead.
+"""
+
+import threading
+from bisect import bisect_left
+
+# Seconds; interactive requests are sub-second, national runs take minutes
+LATENCY_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0,
+                   10.0, 30.0, 60.0, 120.0, 300.0, 600.0)
+
+_registry: list = []
+
+
+def _escape(value) -> str:
+    return str(value).replace("\\", "\\\\").replace("\n", "\\n").replace('"', '\\"')
+
+
+def _labels(names, values) -> str:
+    if not names:
+        return ""
+    return "{" + ",".join(f'{n}="{_escape(v)}"' for n, v in zip(names, values)) + "}"
+
+
+def _number(value: float) -> str:
+    return repr(float(value)) if value != int(value) else str(int(value))
+
+
+class Histogram:
+    """Cumulative-bucket histogram keyed by label values."""
+
+    def __init__(self, name: str, help: str, labels: tuple = (), buckets=LATENCY_BUCKETS):
+        self.name = name
+        self.help = help
+        self.labels = tuple(labels)
+        self.buckets = tuple(sorted(buckets))
+        self._lock = threading.Lock()
+        self._series: dict[tuple, list] = {}   # label values -> [bucket counts, sum, count]
+        _registry.append(self)
+
+    def observe(self, value: float, *label_values):
+        with self._lock:
+            series = self._series.get(label_values)
+            if series is None:
+                series = self._series[label_values] = [[0] * len(self.buckets), 0.0, 0]
+            i = bisect_left(self.buckets, value)
+            if i < len(self.buckets):
+                series[0][i] += 1
+            series[1] += value
+            series[2] += 1
+
+    def render(self) -> list[str]:
+        lines = [f"# HELP {self.name} {self.help}", f"# TYPE {self.name} histogram"]
+        le_names = self.labels + ("le",)
+        with self._lock:
+            series = sorted((k, (list(c), s, n)) for k, (c, s, n) in self._series.items())
+        for values, (counts, total, n) in series:
+            cumulative = 0
+            for le, c in zip(self.buckets, counts):
+                cumulative += c
+                lines.append(f"{self.name}_bucket{_labels(le_names, values + (_number(le),))} "
+                             f"{cumulative}")
+            lines.append(f"{self.name}_bucket{_labels(le_names, values + ('+Inf',))} {n}")
+            lines.append(f"{self.name}_sum{_labels(self.labels, values)} {total!r}")
+            lines.append(f"{self.name}_count{_labels(self.labels, values)} {n}")
+        return lines
+
+
+class Gauge:
+    """Value read from a callback at scrape time."""
+
+    def __init__(self, name: str, help: str, read):
+        self.name = name
+        self.help = help
+        self.read = read
+        _registry.append(self)
+
+    def render(self) -> list[str]:
+        return [f"# HELP {self.name} {self.help}", f"# TYPE {self.name} gauge",
+                f"{self.name} {_number(self.read())}"]
+
+
+def render_metrics() -> str:
+    lines = []
+    for metric in _registry:
+        lines.extend(metric.render())
+    return "\n".join(lines) + "\n"
+
+
+REQUEST_SECONDS = Histogram(
+    "kaelo_http_request_duration_seconds",
+    "HTTP request latency until the response starts, by route template",
+    labels=("method", "route", "status"),
+)
@@ -4,18 +4,24 @@ Extracted from national_pipeline/run_cms_two.py and scripts/run_compare_strategi
 """
 
 import logging
+import os
 import re
+import threading
 import time
+from collections import OrderedDict
 from typing import Optional
 
 import cvxpy as cp
 import numpy as np
 import pandas as pd
+import scipy.sparse as sp
 from scipy.spatial import cKDTree
 
 log = logging.getLogger(__name__)
 
 from .data_loader import app_data, clean_fac_name
+from .highs_direct import HighsDirectProblem, incumbent
+from .telemetry import record_solve
 
 # District mapping 
 DISTRICT_MAP = {
@@ -64,47 +70,73 @@ def nb_sigma_from_mean(mu_mat: pd.DataFrame, kappa: float) -> pd.DataFrame:
     return np.sqrt(var)
 
 
-def make_nb_draws(mean_mat: pd.DataFrame, kappa: float, T: int, seed: int = 0):
+def make_nb_draws(demand, kappa: float, T: int, seed: int = 0):
+    """
+    Yield T periods of (N, K) NB demand draws around demand: an (N, K) mean
+    (DataFrame or ndarray), or rank-1 demand factors, whose NB probabilities
+    are formed one node row at a time. The draws are the same as one
+    (T, N, K) draw from the same seed.
+    """
     rng = np.random.default_rng(seed)
-    mu = mean_mat.values.astype(float)
     kappa = max(kappa, 1e-6)
-    p = kappa / (kappa + mu)
-    return rng.negative_binomial(n=kappa, p=p, size=(T, *mu.shape)).astype(float)
-
-
-def expected_class_counts_by_facility(pop_fac_age_df: pd.DataFrame) -> pd.DataFrame:
-    d = app_data
-    df = pop_fac_age_df.copy()
-    df["patient_days"] = pd.to_numeric(df["patient_days"], errors="coerce").fillna(0.0)
-
-    pi_tmp = d.pi_inf_given_a.copy()
-    pi_tmp["agegroup"] = pi_tmp["agegroup"].replace(d.age_map)
-    pi_tmp["infectionstatus"] = pi_tmp["infectionstatus"].astype(str).str.strip().str.lower()
-    df["agegroup"] = df["agegroup"].astype(str).str.strip()
-    df = df.merge(pi_tmp, on="agegroup", how="left")
-    df["infectionstatus"] = df["infectionstatus"].astype(str).str.strip().str.lower()
-    df["patients_ak"] = df["patient_days"] * df["pi_inf_given_a"]
-
-    m_tmp = d.m_ak.copy()
-    m_tmp["agegroup"] = m_tmp["agegroup"].replace(d.age_map)
-    m_tmp["infectionstatus"] = m_tmp["infectionstatus"].astype(str).str.strip().str.lower()
-    df = df.merge(
-        m_tmp[["agegroup", "infectionstatus", "m_ak"]],
-        on=["agegroup", "infectionstatus"], how="left",
-    )
-    df["n_akh"] = df["patients_ak"] * df["m_ak"]
-
-    p_tmp = d.p_class.copy()
-    for col in ["agegroup", "infectionstatus", "hospital_type", "Class"]:
-        if col in p_tmp.columns:
-            p_tmp[col] = p_tmp[col].astype(str).str.strip()
-    df["hospital_type"] = df["hospital_type"].astype(str).str.strip()
-    df = df.merge(p_tmp, on=["agegroup", "infectionstatus", "hospital_type"], how="left")
-    df["expected_count"] = df["n_akh"] * df["p_class"]
+    if isinstance(demand, dict):
+        national = np.asarray(demand["national"], dtype=float)
+        scale = float(demand["scale"])
+        shares = np.asarray(demand["shares"], dtype=float)
+        for _ in range(T):
+            draw = np.empty((len(shares), len(national)))
+            for i, share in enumerate(shares):
+                draw[i] = rng.negative_binomial(n=kappa, p=kappa / (kappa + share * national * scale))
+            yield draw
+    else:
+        p = kappa / (kappa + np.asarray(demand, dtype=float))
+        for _ in range(T):
+            yield rng.negative_binomial(n=kappa, p=p).astype(float)
+
+
+def expected_class_counts_by_facility(pop_fac_age_df: pd.DataFrame, rates: dict | None = None) -> pd.DataFrame:
+    """
+    Expected prescriptions per (facility_name, facility_type, Class).
 
-    return df.groupby(
-        ["facility_name", "facility_type", "Class"], as_index=False
-    )["expected_count"].sum()
+    pop_fac_age_df needs facility_name, facility_type, agegroup, hospital_type
+    and patient_days. Patient-days are accumulated into a facility x age group
+    x hospital type array and contracted with the precomputed rate tensor
+    (data_loader.build_demand_rate_tensor; app_data.demand_rates by default).
+    """
+    rates = app_data.demand_rates if rates is None else rates
+    df = pop_fac_age_df
+    a = df["agegroup"].astype(str).str.strip().map(
+        {v: i for i, v in enumerate(rates["agegroups"])})
+    h = df["hospital_type"].astype(str).str.strip().map(
+        {v: i for i, v in enumerate(rates["hospital_types"])})
+    keep = (a.notna() & h.notna() & df["facility_name"].notna()
+            & df["facility_type"].notna()).to_numpy()
+    cols = ["facility_name", "facility_type", "Class", "expected_count"]
+    if not keep.any():
+        return pd.DataFrame(columns=cols)
+
+    fac_keys = pd.MultiIndex.from_frame(df.loc[keep, ["facility_name", "facility_type"]])
+    f_idx, facilities = fac_keys.factorize(sort=True)
+    a_idx = a.to_numpy()[keep].astype(int)
+    h_idx = h.to_numpy()[keep].astype(int)
+    pdays = pd.to_numeric(df["patient_days"], errors="coerce").fillna(0.0).to_numpy()[keep]
+
+    A, H, C = rates["rate"].shape
+    W = np.zeros((len(facilities), A, H))
+    np.add.at(W, (f_idx, a_idx, h_idx), pdays)
+    seen = np.zeros((len(facilities), A, H), dtype=bool)
+    seen[f_idx, a_idx, h_idx] = True
+
+    counts = np.einsum("fah,ahc->fc", W, rates["rate"])
+    present = np.einsum("fah,ahc->fc", seen.astype(float), rates["present"].astype(float)) > 0
+
+    fi, ci = np.nonzero(present)
+    return pd.DataFrame({
+        "facility_name": facilities.get_level_values(0)[fi],
+        "facility_type": facilities.get_level_values(1)[fi],
+        "Class": np.asarray(rates["classes"], dtype=object)[ci],
+        "expected_count": counts[fi, ci],
+    })
 
 
 def build_node_demand_matrix(demand_fac_long: pd.DataFrame) -> pd.DataFrame:
@@ -120,7 +152,65 @@ def build_node_demand_matrix(demand_fac_long: pd.DataFrame) -> pd.DataFrame:
 
 # REGION INSTANCE BUILDER
 
-def build_region_instance(target_dhmt: str) -> dict:
+def build_arcs(nodes, tier_map: dict, D: np.ndarray, T: np.ndarray, allowed: dict) -> pd.DataFrame:
+    """
+    Enumerate the arcs u -> v allowed by the tier rules with finite distance and time.
+
+    nodes:    node names, the row/column order of D (metres) and T (seconds)
+    tier_map: node -> tier; nodes without a tier have no arcs
+    allowed:  tier -> list of downstream tiers
+
+    Rows come out ordered by source node, then by the position of the
+    destination tier in allowed[u_tier], then by destination node.
+    """
+    nodes = np.asarray(list(nodes), dtype=object)
+    tiers = list(dict.fromkeys(
+        [*allowed.keys(), *(t for vs in allowed.values() for t in vs)]
+    ))
+    code = {t: i for i, t in enumerate(tiers)}
+    tier_idx = np.array([code.get(tier_map.get(n), -1) for n in nodes], dtype=int)
+
+    # rank[a, b]: position of tier b in allowed[tier a], -1 if not allowed
+    rank = np.full((len(tiers) + 1, len(tiers) + 1), -1, dtype=int)
+    for u_tier, v_tiers in allowed.items():
+        for r, v_tier in enumerate(v_tiers):
+            rank[code[u_tier], code[v_tier]] = r
+    arc_rank = rank[tier_idx[:, None], tier_idx[None, :]]   # -1 row/col for untiered nodes
+
+    D = np.asarray(D, dtype=float)
+    T = np.asarray(T, dtype=float)
+    ok = (arc_rank >= 0) & np.isfinite(D) & np.isfinite(T)
+    np.fill_diagonal(ok, False)
+    ui, vi = np.nonzero(ok)
+    order = np.lexsort((vi, arc_rank[ui, vi], ui))
+    ui, vi = ui[order], vi[order]
+
+    tier_names = np.asarray(tiers, dtype=object)
+    return pd.DataFrame({
+        "u": nodes[ui],
+        "v": nodes[vi],
+        "u_tier": tier_names[tier_idx[ui]],
+        "v_tier": tier_names[tier_idx[vi]],
+        "dist_km": D[ui, vi] / 1000.0,
+        "time_min": T[ui, vi] / 60.0,
+    })
+
+
+def build_region_instance(target_dhmt: str, use_cache: bool = True) -> dict:
+    """
+    Region instance (nodes, arcs, distances, GLM demand) for one DHMT.
+
+    Cached in app_data until the next data mutation; use_cache=False rebuilds.
+    """
+    if not use_cache:
+        return _build_region_instance(target_dhmt)
+    return app_data.cached_instance(
+        ("region", target_dhmt), lambda: _build_region_instance(target_dhmt)
+    )
+
+
+def _region_network(target_dhmt: str) -> dict:
+    """Facilities, node list, distance/time sub-matrices and tier rules for one DHMT."""
     d = app_data
     target_norm = str(target_dhmt).strip().lower()
 
@@ -142,22 +232,12 @@ def build_region_instance(target_dhmt: str) -> dict:
     if source_node not in all_nodes:
         all_nodes = [source_node] + all_nodes
 
-    nodes_region = list(dict.fromkeys(
-        n for n in all_nodes
-        if n in d.dist_matrix_df.index and n in d.dist_matrix_df.columns
-    ))
+    nodes_region = list(dict.fromkeys(n for n in all_nodes if d.has_matrix_node(n)))
     if source_node not in nodes_region:
         raise ValueError(f"Source node '{source_node}' missing from distance matrix")
 
-    # De-duplicate distance/time matrix indices before slicing
-    _dm = d.dist_matrix_df
-    _dm = _dm[~_dm.index.duplicated(keep='first')]
-    _dm = _dm.loc[:, ~_dm.columns.duplicated(keep='first')]
-    D_region = _dm.loc[nodes_region, nodes_region].copy()
-    _tm = d.time_matrix_df
-    _tm = _tm[~_tm.index.duplicated(keep='first')]
-    _tm = _tm.loc[:, ~_tm.columns.duplicated(keep='first')]
-    T_region = _tm.loc[nodes_region, nodes_region].copy()
+    # (n, n) float32 gathers from the shared matrix store
+    D_region, T_region = d.matrix_slice(nodes_region)
     tier_map = dict(zip(fac_region["facility_name"], fac_region["tier"]))
     tier_map[source_node] = "warehouse"
 
@@ -169,32 +249,21 @@ def build_region_instance(target_dhmt: str) -> dict:
         {"warehouse": ["hospital"], "hospital": ["clinic", "health_post"],
          "clinic": ["hospital"], "health_post": ["hospital"]}
     )
+    return {
+        "fac_region": fac_region, "source_node": source_node, "nodes": nodes_region,
+        "D": D_region, "T": T_region, "tier_map": tier_map, "allowed": allowed,
+    }
 
-    rows = []
-    for u in nodes_region:
-        u_tier = tier_map.get(u)
-        if u_tier is None:
-            continue
-        for v_tier in allowed.get(u_tier, []):
-            cand = [v for v in nodes_region if v != u and tier_map.get(v) == v_tier]
-            if not cand:
-                continue
-            dists = D_region.loc[u, cand].astype(float).replace(
-                [np.inf, -np.inf], np.nan
-            ).dropna()
-            for v, dist_val in dists.items():
-                dv = float(dist_val.iloc[0]) if isinstance(dist_val, pd.Series) else float(dist_val)
-                tv = T_region.loc[u, v]
-                time_val = float(tv.iloc[0]) if isinstance(tv, pd.Series) else float(tv)
-                if pd.isna(time_val) or np.isinf(time_val):
-                    continue
-                rows.append({
-                    "u": u, "v": v, "u_tier": u_tier, "v_tier": v_tier,
-                    "dist_km": dv / 1000.0,
-                    "time_min": time_val / 60.0,
-                })
 
-    arcs_df = pd.DataFrame(rows).drop_duplicates(subset=["u", "v"]).reset_index(drop=True)
+def _build_region_instance(target_dhmt: str) -> dict:
+    d = app_data
+    target_norm = str(target_dhmt).strip().lower()
+    net = _region_network(target_dhmt)
+    source_node, nodes_region = net["source_node"], net["nodes"]
+    fac_region, D_region = net["fac_region"], net["D"]
+    tier_map, allowed = net["tier_map"], net["allowed"]
+
+    arcs_df = build_arcs(nodes_region, tier_map, D_region, net["T"], allowed)
     if arcs_df.empty:
         raise ValueError(f"No arcs for DHMT = {target_dhmt}")
     model_arcs = [(r.u, r.v) for r in arcs_df.itertuples(index=False)]
@@ -324,7 +393,7 @@ def build_region_instance(target_dhmt: str) -> dict:
     node_demand_mat = build_node_demand_matrix(demand_fac)
 
     model_classes = sorted(node_demand_mat.columns.tolist())
-    model_nodes = list(D_region.index)
+    model_nodes = list(nodes_region)
     mu_mat = node_demand_mat.reindex(index=model_nodes, columns=model_classes).fillna(0.0).astype(float)
     sigma_mat = nb_sigma_from_mean(mu_mat, kappa=10.0).reindex(
         index=model_nodes, columns=model_classes
@@ -336,7 +405,10 @@ def build_region_instance(target_dhmt: str) -> dict:
         "nodes": model_nodes,
         "arcs": model_arcs,
         "arc_df": arcs_df,
-        "dist_km": D_region / 1000.0,
+        "dist_km": pd.DataFrame(
+            D_region.astype(float) / 1000.0, index=model_nodes, columns=model_nodes
+        ),
+        "classes": model_classes,
         "mu_mat": mu_mat,
         "sigma_mat": sigma_mat,
         "storage_cap_per_node": None,
@@ -346,28 +418,599 @@ def build_region_instance(target_dhmt: str) -> dict:
 
 # CMS INSTANCE BUILDER
 
-def build_cms_region_instance(region: str, scenario: str = "2526") -> dict:
+def build_cms_region_instance(region: str, scenario: str = "2526", use_cache: bool = True) -> dict:
+    """Region instance with CMS product-level demand for a scenario, cached like build_region_instance."""
+    if not use_cache:
+        return _build_cms_region_instance(region, scenario, use_cache=False)
+    return app_data.cached_instance(
+        ("cms", region, scenario),
+        lambda: _build_cms_region_instance(region, scenario),
+    )
+
+
+def _build_cms_region_instance(region: str, scenario: str, use_cache: bool = True) -> dict:
     d = app_data
-    base = build_region_instance(region)
+    base = build_region_instance(region, use_cache=use_cache)
     col = f"biweekly_{scenario}"
     if col not in d.cms_active.columns:
         raise ValueError(f"Unknown CMS scenario '{scenario}'")
-    national_dem = d.cms_active[col]
+    national_dem = d.cms_active[col].astype(float)
     demand_nodes = [n for n in base["nodes"] if n != base["CMS"]]
     shares = d.pop_fac_share.reindex(demand_nodes).fillna(0.0)
-    mu_demand = pd.DataFrame(
-        np.outer(shares.values, national_dem.values),
-        index=demand_nodes, columns=national_dem.index,
-    )
-    mu_mat = mu_demand.reindex(base["nodes"]).fillna(0.0).astype(float)
     # Drop drug classes with negligible total demand to reduce problem size
-    active_cols = mu_mat.columns[mu_mat.sum(axis=0) > 0.01]
-    mu_mat = mu_mat[active_cols]
-    classes = mu_mat.columns.tolist()
-    sigma_mat = nb_sigma_from_mean(mu_mat, kappa=10.0).reindex(
-        index=base["nodes"], columns=classes
-    ).fillna(0.0).astype(float)
-    return {**base, "mu_mat": mu_mat, "sigma_mat": sigma_mat, "proc_cost": d.cms_proc_cost}
+    national_dem = national_dem[national_dem * float(shares.sum()) > 0.01]
+    # CMS demand is rank-1 (facility share x national class demand), so only
+    # the factors are kept: the solve expands them once (demand_arrays) and
+    # demand_frames() builds N x K frames for the callers that want labels.
+    factors = {
+        "shares": shares.reindex(base["nodes"]).fillna(0.0).to_numpy(dtype=float),
+        "national": national_dem.to_numpy(dtype=float),
+        "scale": 1.0,
+        "kappa": 10.0,
+    }
+    network = {k: v for k, v in base.items() if k not in ("mu_mat", "sigma_mat")}
+    return {**network, "classes": national_dem.index.tolist(),
+            "demand_factors": factors, "proc_cost": d.cms_proc_cost}
+
+
+def demand_arrays(instance: dict) -> tuple[np.ndarray, np.ndarray]:
+    """
+    (mu, sigma) as (N, K) arrays in instance node/class order.
+
+    Built straight from the rank-1 "demand_factors" when the instance has
+    them (CMS instances store nothing else); callers that override individual
+    cells must replace the factors with mu_mat/sigma_mat frames.
+    """
+    if "demand_arrays" in instance:
+        return instance["demand_arrays"]
+    nodes = list(instance["nodes"])
+    f = instance.get("demand_factors")
+    if f is not None:
+        mu = np.outer(f["shares"], f["national"])
+        if f["scale"] != 1.0:
+            mu = mu * f["scale"]
+        sigma = np.sqrt(mu + (mu ** 2) / float(f["kappa"]))
+        return mu, sigma
+    mu_mat = instance["mu_mat"]
+    classes = list(mu_mat.columns)
+    mu = mu_mat.reindex(index=nodes, columns=classes).fillna(0.0).astype(float).to_numpy()
+    sigma = instance["sigma_mat"].reindex(
+        index=nodes, columns=classes).fillna(0.0).astype(float).to_numpy()
+    return mu, sigma
+
+
+def demand_frames(instance: dict) -> tuple[pd.DataFrame, pd.DataFrame]:
+    """(mu_mat, sigma_mat) indexed by node and class, built from the factors if need be."""
+    if "mu_mat" in instance:
+        return instance["mu_mat"], instance["sigma_mat"]
+    mu, sigma = demand_arrays(instance)
+    nodes, classes = list(instance["nodes"]), list(instance["classes"])
+    return (pd.DataFrame(mu, index=nodes, columns=classes),
+            pd.DataFrame(sigma, index=nodes, columns=classes))
+
+
+def arc_lengths(instance: dict) -> np.ndarray:
+    """Length in km of every arc, in instance["arcs"] order."""
+    if "arc_km" in instance:
+        return np.asarray(instance["arc_km"], dtype=float)
+    dist_km = instance["dist_km"]
+    arcs = instance["arcs"]
+    rows = dist_km.index.get_indexer([i for i, _ in arcs])
+    cols = dist_km.columns.get_indexer([j for _, j in arcs])
+    if len(arcs) and (rows.min() < 0 or cols.min() < 0):
+        raise KeyError("arc endpoint missing from dist_km")
+    return dist_km.to_numpy(dtype=float)[rows, cols]
+
+
+def pack_instance(instance: dict) -> dict:
+    """
+    The parts of an instance the solvers read, as NumPy arrays and label lists.
+
+    Sending this to a solver process pickles a handful of flat buffers instead
+    of the distance matrix, arc table and demand frames. Rank-1 CMS demand
+    travels as its factors only. unpack_instance() restores a dict that
+    run_simulation, run_planning and sweep_parameters accept.
+    """
+    nodes = list(instance["nodes"])
+    classes = list(instance["classes"])
+    node_idx = {n: i for i, n in enumerate(nodes)}
+    arcs = list(instance["arcs"])
+    packed = {
+        "region": instance.get("region"),
+        "CMS": instance["CMS"],
+        "nodes": nodes,
+        "classes": classes,
+        "arc_idx": np.array([(node_idx[i], node_idx[j]) for i, j in arcs],
+                            dtype=np.int32).reshape(-1, 2),
+        "arc_km": arc_lengths(instance),
+        "adaptive_mask": _adaptive_mask_of(instance),
+        "arc_cap": _arc_cap_vector(instance.get("arc_cap", 2000.0), arcs),
+    }
+    if instance.get("demand_factors") is not None:
+        packed["demand_factors"] = instance["demand_factors"]
+    else:
+        packed["mu"], packed["sigma"] = demand_arrays(instance)
+    proc_cost = instance.get("proc_cost", 0.0)
+    packed["proc_cost"] = (float(proc_cost) if np.isscalar(proc_cost)
+                           else _resolve_costs(proc_cost, classes))
+    return packed
+
+
+def unpack_instance(packed: dict) -> dict:
+    nodes, classes = packed["nodes"], packed["classes"]
+    inst = {
+        "region": packed["region"],
+        "CMS": packed["CMS"],
+        "nodes": nodes,
+        "arcs": [(nodes[i], nodes[j]) for i, j in packed["arc_idx"].tolist()],
+        "arc_km": packed["arc_km"],
+        "adaptive_mask": packed["adaptive_mask"],
+        "arc_cap": packed["arc_cap"],
+        "classes": classes,
+        "demand_factors": packed.get("demand_factors"),
+    }
+    if "mu" in packed:
+        inst["demand_arrays"] = (packed["mu"], packed["sigma"])
+    proc_cost = packed["proc_cost"]
+    inst["proc_cost"] = (proc_cost if np.isscalar(proc_cost)
+                         else pd.Series(proc_cost, index=classes))
+    return inst
+
+
+def _product_groups(instance: dict, strategy: str, I0_np, c_pen, c_proc):
+    """
+    (K, G) membership and weight matrices for the product-aggregation presolve, or None.
+
+    In the nominal LP classes only interact through the shared arc capacity.
+    Classes with the same shortage and procurement cost whose demand and
+    opening inventory split by the same national weights can be solved as one
+    class and split back by those weights without changing the optimum. That
+    holds for rank-1 CMS demand as long as I0 follows the same split. sigma is
+    not linear in mu, so the robust strategies are never aggregated. Only
+    run_planning aggregates: in a simulation, inventory after the first period
+    carries the per-class NB draws and no longer splits by national weights.
+    """
+    f = instance.get("demand_factors")
+    if strategy != "nominal" or f is None:
+        return None
+    national = np.asarray(f["national"], dtype=float)
+    K = len(national)
+    _, group = np.unique(np.stack([c_pen, c_proc], axis=1), axis=0, return_inverse=True)
+    group = np.asarray(group).ravel()
+    G = int(group.max()) + 1 if K else 0
+    if G == K or np.any(national <= 0):
+        return None
+    M = np.zeros((K, G))
+    M[np.arange(K), group] = 1.0
+    W = M * (national / (national @ M)[group])[:, None]
+    if not np.allclose((I0_np @ M) @ W.T, I0_np, rtol=1e-9, atol=1e-9):
+        return None
+    return M, W
+
+
+# COMPILED PROBLEM CACHE
+#
+# The LP for a given (region, strategy, node list, arc list, class list) has a
+# fixed structure; only its data (demand, sigma, Gamma, costs, capacities and
+# the opening inventory) change between requests. Everything that varies is a
+# cp.Parameter, so CVXPY canonicalizes the problem once (DPP) and a repeat
+# request only pushes new parameter values before calling HiGHS.
+
+PROBLEM_CACHE_SIZE = int(os.environ.get("KAELO_PROBLEM_CACHE_SIZE", "8"))
+
+_problem_cache: "OrderedDict[tuple, CompiledProblem]" = OrderedDict()
+_problem_cache_lock = threading.Lock()
+
+
+def _adaptive_arc_mask(arc_df: pd.DataFrame) -> np.ndarray:
+    """1.0 for arcs whose shipments adapt to demand (CMS/warehouse/hospital -> downstream)."""
+    return np.array([
+        1.0 if (row.u_tier in ["cms", "warehouse", "hospital"]
+                and row.v_tier in ["clinic", "warehouse", "hospital", "health_post"])
+        else 0.0
+        for row in arc_df.itertuples(index=False)
+    ], dtype=float)
+
+
+def _adaptive_mask_of(instance: dict):
+    if instance.get("adaptive_mask") is not None:
+        return np.asarray(instance["adaptive_mask"], dtype=float)
+    arc_df = instance.get("arc_df")
+    return None if arc_df is None else _adaptive_arc_mask(arc_df)
+
+
+def _selector(row_idx: np.ndarray, n_rows: int) -> sp.csr_matrix:
+    """(n_rows, len(row_idx)) 0/1 matrix with a single 1 per column at row_idx[col]."""
+    n_cols = len(row_idx)
+    return sp.csr_matrix(
+        (np.ones(n_cols), (np.asarray(row_idx, dtype=int), np.arange(n_cols))),
+        shape=(n_rows, n_cols),
+    )
+
+
+class CompiledProblem:
+    """
+    Supply LP for a fixed instance structure, with all data as Parameters.
+
+    With horizon > 1 the model is a rolling lookahead window: period l starts
+    from the closing inventory I1 of period l-1, every period plans against
+    the same forecast mu/sigma, and only period 0's decisions are reported.
+
+    With integer=True truck counts lam are integers and arc-use indicators y
+    binary, which makes the model a MIP; solve() then takes a time limit and
+    gap, and solution_info reports the incumbent, its bound and the gap.
+
+    Instances are shared process-wide through get_compiled_problem(); callers must
+    hold `lock` while they set parameter values, solve and read variable values.
+    """
+
+    backend = "cvxpy"
+
+    def __init__(self, nodes, arcs, classes, cms, strategy, adaptive_mask=None, horizon=1,
+                 integer=False):
+        if strategy not in ("nominal", "static_robust", "adr"):
+            raise ValueError(f"Unknown strategy '{strategy}'")
+        if strategy == "adr" and adaptive_mask is None:
+            raise ValueError("arc_df required for ADR strategy")
+        self.nodes = list(nodes)
+        self.arcs = list(arcs)
+        self.classes = list(classes)
+        self.strategy = strategy
+        self.horizon = int(horizon)
+        self.integer = bool(integer)
+        self.lock = threading.Lock()
+        self.solves = 0
+        self.solution_info = None
+
+        N, m, K = len(self.nodes), len(self.arcs), len(self.classes)
+        self.N, self.m, self.K = N, m, K
+        node_idx = {n: i for i, n in enumerate(self.nodes)}
+        self.node_idx = node_idx
+
+        self.arc_dest_idx = np.array([node_idx[j] for (_, j) in self.arcs], dtype=int)
+        self.arc_src_idx = np.array([node_idx[i] for (i, _) in self.arcs], dtype=int)
+
+        # Incidence matrices for vectorized flow constraints. Every column has
+        # exactly one nonzero, so they are kept sparse end to end.
+        self.A_in = _selector(self.arc_dest_idx, N)
+        self.A_out = _selector(self.arc_src_idx, N)
+
+        self.cms_idx = node_idx[cms]
+        self.cms_mask = _selector(np.array([self.cms_idx]), N)   # (N, 1)
+
+        # alpha variable for ADR (None for other strategies)
+        self.A_adapt = None
+        self.dst_adapt = None
+        if strategy == "adr":
+            adaptive_arc_mask = np.asarray(adaptive_mask, dtype=float)
+            self.A_adapt = np.where(adaptive_arc_mask == 1.0)[0]
+            self.non_adapt = np.where(adaptive_arc_mask == 0.0)[0]
+            self.src_adapt = self.arc_src_idx[self.A_adapt]
+            self.dst_adapt = self.arc_dest_idx[self.A_adapt]
+            # Incidence matrix for incoming adaptive arcs: (N, m)
+            self.A_in_adapt = sp.csr_matrix(
+                (np.ones(len(self.A_adapt)), (self.dst_adapt, self.A_adapt)), shape=(N, m)
+            )
+            # Source-outgoing map: S_out[n, p] = 1 if A_adapt[p] is outgoing from n
+            self.S_out = _selector(self.src_adapt, N)
+
+        # Data parameters
+        self.I0 = cp.Parameter((N, K))
+        self.mu = cp.Parameter((N, K))
+        self.sigma = cp.Parameter((N, K))
+        self.Gamma = cp.Parameter(nonneg=True)
+        self.arc_cap = cp.Parameter(m)
+        self.c_arc = cp.Parameter(m)      # transport_cost_per_km * km
+        self.c_pen = cp.Parameter(K)
+        self.c_proc = cp.Parameter(K)
+        self.holding = cp.Parameter()
+
+        constraints = []
+        cost = 0
+        I_open = self.I0
+        for l in range(self.horizon):
+            period, period_cons = self._period_block(I_open)
+            constraints += period_cons
+            cost += (
+                cp.sum(cp.multiply(self.c_arc, period["lam"]))
+                + cp.sum(period["u"], axis=0) @ self.c_pen
+                + self.holding * cp.sum(period["I1"])
+                + self.c_proc @ period["q"]
+            )
+            if l == 0:
+                self.F, self.q, self.lam = period["F"], period["q"], period["lam"]
+                self.u, self.I1 = period["u"], period["I1"]
+                self.alpha = period["alpha"]
+            I_open = period["I1"]
+
+        self.prob = cp.Problem(cp.Minimize(cost), constraints)
+
+    def _period_block(self, I0):
+        """Variables and constraints of one period opening with inventory I0."""
+        N, m, K = self.N, self.m, self.K
+        A_in, A_out = self.A_in, self.A_out
+        mu, sigma, Gamma = self.mu, self.sigma, self.Gamma
+
+        F = cp.Variable((m, K), nonneg=True)
+        u = cp.Variable((N, K), nonneg=True)
+        I1 = cp.Variable((N, K), nonneg=True)
+        q = cp.Variable(K, nonneg=True)
+        alpha = None
+        if self.integer:
+            lam = cp.Variable(m, integer=True)
+            y = cp.Variable(m, boolean=True)
+            constraints = [lam >= 0]
+        else:
+            lam = cp.Variable(m, nonneg=True)
+            y = cp.Variable(m, nonneg=True)
+            constraints = [y <= 1.0]
+
+        big_m = 1e5
+        net_flow = A_in @ F - A_out @ F          # (N, K)
+        supply = self.cms_mask @ cp.reshape(q, (1, K), order='C')  # (N, K), only CMS row nonzero
+
+        constraints.append(lam <= big_m * y)
+
+        if self.strategy == "nominal":
+            constraints += [
+                cp.sum(F, axis=1) <= cp.multiply(self.arc_cap, lam),
+                I1 == I0 + net_flow + supply - mu + u,
+                A_out @ F <= I0 + A_in @ F + supply,
+            ]
+
+        elif self.strategy == "static_robust":
+            constraints.append(cp.sum(F, axis=1) <= cp.multiply(self.arc_cap, lam))
+            # Dual variables are (N, K) scalars; off-diagonal entries are
+            # always zero at optimality (no cross-node adaptive terms).
+            theta = cp.Variable((N, K), nonneg=True)
+            pi_plus = cp.Variable((N, K), nonneg=True)
+            pi_minus = cp.Variable((N, K), nonneg=True)
+            theta_ship = cp.Variable((N, K), nonneg=True)
+            pi_ship_plus = cp.Variable((N, K), nonneg=True)
+            pi_ship_minus = cp.Variable((N, K), nonneg=True)
+
+            rhs = I0 + net_flow + supply - mu + u - I1
+            rhs_ship = I0 + net_flow + supply
+
+            constraints += [
+                Gamma * theta + pi_plus + pi_minus <= rhs,
+                theta + pi_plus >= -sigma,
+                theta + pi_minus >= sigma,
+                Gamma * theta_ship + pi_ship_plus + pi_ship_minus <= rhs_ship,
+                theta_ship + pi_ship_plus >= -sigma,
+                theta_ship + pi_ship_minus >= sigma,
+            ]
+
+        else:  # adr
+            # Affine Decision Rules: ship[a] = F[a] + alpha[a] * (d - mu)
+            A_adapt, non_adapt = self.A_adapt, self.non_adapt
+            src_adapt, dst_adapt = self.src_adapt, self.dst_adapt
+            A_in_adapt, S_out = self.A_in_adapt, self.S_out
+            sigma_dest = sigma[self.arc_dest_idx, :]  # (m, K)
+            sigma_dst_adapt = sigma[dst_adapt, :]
+
+            # Variables
+            alpha = cp.Variable((m, K))
+            eta = cp.Variable(m, nonneg=True)
+            rho_plus = cp.Variable((m, K), nonneg=True)
+            rho_minus = cp.Variable((m, K), nonneg=True)
+
+            # Demand balance duals: self-node (N,K) + cross-node (len(A_adapt),K)
+            theta = cp.Variable((N, K), nonneg=True)
+            pi_self_plus = cp.Variable((N, K), nonneg=True)
+            pi_self_minus = cp.Variable((N, K), nonneg=True)
+            pi_cross_plus = cp.Variable((len(A_adapt), K), nonneg=True)
+            pi_cross_minus = cp.Variable((len(A_adapt), K), nonneg=True)
+
+            # Ship balance duals
+            theta_ship = cp.Variable((N, K), nonneg=True)
+            pis_self_plus = cp.Variable((N, K), nonneg=True)
+            pis_self_minus = cp.Variable((N, K), nonneg=True)
+            pis_cross_plus = cp.Variable((len(A_adapt), K), nonneg=True)
+            pis_cross_minus = cp.Variable((len(A_adapt), K), nonneg=True)
+
+            # Non-adaptive arcs: alpha = 0
+            if len(non_adapt) > 0:
+                constraints.append(alpha[non_adapt, :] == 0)
+
+            # Robust arc capacity: Gamma*eta + sum_k(rho) <= cap*lam - sum_k(F)
+            eta_col = cp.reshape(eta, (m, 1), order='C')
+            constraints += [
+                Gamma * eta + cp.sum(rho_plus + rho_minus, axis=1)
+                    <= cp.multiply(self.arc_cap, lam) - cp.sum(F, axis=1),
+                eta_col + rho_plus >= cp.multiply(alpha, sigma_dest),
+                eta_col + rho_minus >= -cp.multiply(alpha, sigma_dest),
+            ]
+
+            # Demand balance robust constraints
+            rhs = I0 + net_flow + supply - mu + u - I1
+            coeff_self = A_in_adapt @ alpha - 1  # (N, K)
+            constraints += [
+                Gamma * theta + pi_self_plus + pi_self_minus
+                    + S_out @ pi_cross_plus + S_out @ pi_cross_minus <= rhs,
+                theta + pi_self_plus >= cp.multiply(coeff_self, sigma),
+                theta + pi_self_minus >= -cp.multiply(coeff_self, sigma),
+                theta[src_adapt, :] + pi_cross_plus
+                    >= -cp.multiply(alpha[A_adapt, :], sigma_dst_adapt),
+                theta[src_adapt, :] + pi_cross_minus
+                    >= cp.multiply(alpha[A_adapt, :], sigma_dst_adapt),
+            ]
+
+            # Ship balance robust constraints
+            rhs_ship = I0 + net_flow + supply
+            coeff_self_ship = -(A_in_adapt @ alpha)  # (N, K)
+            constraints += [
+                Gamma * theta_ship + pis_self_plus + pis_self_minus
+                    + S_out @ pis_cross_plus + S_out @ pis_cross_minus <= rhs_ship,
+                theta_ship + pis_self_plus >= cp.multiply(coeff_self_ship, sigma),
+                theta_ship + pis_self_minus >= -cp.multiply(coeff_self_ship, sigma),
+                theta_ship[src_adapt, :] + pis_cross_plus
+                    >= cp.multiply(alpha[A_adapt, :], sigma_dst_adapt),
+                theta_ship[src_adapt, :] + pis_cross_minus
+                    >= -cp.multiply(alpha[A_adapt, :], sigma_dst_adapt),
+            ]
+
+        period = {"F": F, "u": u, "I1": I1, "q": q, "lam": lam, "alpha": alpha}
+        return period, constraints
+
+    def set_data(self, mu_np, sigma_np, Gamma, arc_cap_vec, c_arc, c_pen, c_proc,
+                 holding_cost, transport_cost_per_km):
+        """Push instance data into the Parameters (everything except I0)."""
+        self.mu.value = np.asarray(mu_np, dtype=float)
+        self.sigma.value = np.asarray(sigma_np, dtype=float)
+        self.Gamma.value = float(Gamma)
+        self.arc_cap.value = np.asarray(arc_cap_vec, dtype=float)
+        self.c_arc.value = float(transport_cost_per_km) * np.asarray(c_arc, dtype=float)
+        self.c_pen.value = np.asarray(c_pen, dtype=float)
+        self.c_proc.value = np.asarray(c_proc, dtype=float)
+        self.holding.value = float(holding_cost)
+
+    def solve(self, I0_np, time_limit: float | None = None,
+              mip_gap: float | None = None, threads: int | None = None) -> str:
+        """
+        Solve for opening inventory I0, always cold. CVXPY can only seed HiGHS
+        with the previous primal point, not a basis; that never sped up these
+        LPs and made ADR re-solves several times slower. Basis reuse across
+        periods is highs_direct's.
+
+        time_limit (seconds), mip_gap (relative) and threads are passed to
+        HiGHS. A solve stopped at the time limit returns "feasible" with the
+        incumbent, bound and gap in solution_info, or "time_limit" if it had no
+        feasible point yet. Integer models fill solution_info when optimal too.
+        """
+        self.I0.value = np.asarray(I0_np, dtype=float)
+        opts = {}
+        if time_limit is not None:
+            opts["time_limit"] = max(float(time_limit), 0.0)
+        if mip_gap is not None:
+            opts["mip_rel_gap"] = float(mip_gap)
+        if threads is not None:
+            opts["threads"] = int(threads)
+        self.prob.solve(solver=cp.HIGHS, verbose=False, warm_start=False, **opts)
+        self.solves += 1
+        self.solution_info = None
+        at_limit = self.prob.status == cp.USER_LIMIT and time_limit is not None
+        if not (at_limit or (self.integer and self.prob.status == cp.OPTIMAL)):
+            return self.prob.status
+        info = self.prob.solver_stats.extra_stats
+        offset = (self.prob.value - info.objective_function_value
+                  if self.prob.value is not None else 0.0)
+        status, self.solution_info = incumbent(info, self.integer, offset)
+        return status if at_limit else self.prob.status
+
+    def solve_stats(self) -> dict:
+        """Size and timings of the last solve, as reported by CVXPY and HiGHS."""
+        highs = self.prob._solver_cache.get(cp.HIGHS, (None,))[0]
+        stats = self.prob.solver_stats
+        return {
+            "n_vars": highs.getNumCol() if highs is not None else None,
+            "n_constraints": highs.getNumRow() if highs is not None else None,
+            "nnz": highs.getNumNz() if highs is not None else None,
+            "canon_s": self.prob.compilation_time,
+            "solver_s": stats.solve_time,
+            "iterations": stats.num_iters,
+        }
+
+    def values(self) -> dict:
+        """Primal values of the decision variables after the last solve."""
+        return {
+            "F": self.F.value,
+            "q": self.q.value,
+            "lam": self.lam.value,
+            "alpha": self.alpha.value if self.alpha is not None else None,
+            "objective": self.prob.value,
+        }
+
+
+def _problem_key(instance: dict, strategy: str, classes, backend: str = "cvxpy",
+                 horizon: int = 1, integer: bool = False) -> tuple:
+    key = (
+        backend, int(horizon), bool(integer), instance.get("region"), strategy, instance["CMS"],
+        tuple(instance["nodes"]), tuple(instance["arcs"]), tuple(classes),
+    )
+    if strategy == "adr":
+        mask = _adaptive_mask_of(instance)
+        if mask is not None:
+            key += (tuple(mask),)
+    return key
+
+
+def get_compiled_problem(instance: dict, strategy: str, classes, use_cache: bool = True,
+                         backend: str = "cvxpy", horizon: int = 1, integer: bool = False):
+    """
+    Return the compiled LP for this instance structure, building it on a cache miss.
+
+    backend: "cvxpy" (CompiledProblem) | "highs_direct" (HighsDirectProblem)
+    horizon: number of chained periods in the lookahead window (1 = myopic)
+    integer: integer truck counts (a MIP) instead of the LP relaxation
+    """
+    if backend not in BACKENDS:
+        raise ValueError(f"Unknown backend '{backend}'")
+    if int(horizon) < 1:
+        raise ValueError("horizon must be at least 1")
+    adaptive_mask = None
+    if strategy == "adr":
+        adaptive_mask = _adaptive_mask_of(instance)
+        if adaptive_mask is None:
+            raise ValueError("arc_df required for ADR strategy")
+
+    def _build():
+        t0 = time.perf_counter()
+        model = BACKENDS[backend](
+            instance["nodes"], instance["arcs"], classes, instance["CMS"],
+            strategy, adaptive_mask, horizon=horizon, integer=integer,
+        )
+        model.build_s = time.perf_counter() - t0
+        log.info("%s problem built: N=%d, m=%d, K=%d, strategy=%s, horizon=%d%s (%.2fs)",
+                 backend, model.N, model.m, model.K, strategy, horizon,
+                 ", integer" if integer else "", model.build_s)
+        return model
+
+    if not use_cache or PROBLEM_CACHE_SIZE <= 0:
+        return _build()
+
+    key = _problem_key(instance, strategy, classes, backend, horizon, integer)
+    with _problem_cache_lock:
+        model = _problem_cache.get(key)
+        if model is not None:
+            _problem_cache.move_to_end(key)
+            log.info("%s problem reused from cache: region=%s, strategy=%s",
+                     backend, instance.get("region"), strategy)
+            return model
+
+    model = _build()
+    with _problem_cache_lock:
+        # another thread may have built the same structure meanwhile; keep theirs
+        existing = _problem_cache.get(key)
+        if existing is not None:
+            return existing
+        _problem_cache[key] = model
+        while len(_problem_cache) > PROBLEM_CACHE_SIZE:
+            _problem_cache.popitem(last=False)
+    return model
+
+
+BACKENDS = {
+    "cvxpy": CompiledProblem,
+    "highs_direct": HighsDirectProblem,
+}
+
+
+def clear_problem_cache():
+    with _problem_cache_lock:
+        _problem_cache.clear()
+
+
+def _problem_cache_after_fork():
+    # Keep the compiled problems a forked worker can use; one whose lock was
+    # held by another thread at fork time can never be acquired in the child.
+    global _problem_cache_lock
+    _problem_cache_lock = threading.Lock()
+    for key in [k for k, model in _problem_cache.items() if model.lock.locked()]:
+        del _problem_cache[key]
+
+
+os.register_at_fork(after_in_child=_problem_cache_after_fork)
 
 
 # SIMULATION: run T periods of a policy under NB demand draws
@@ -378,7 +1021,15 @@ def _resolve_costs(cost_input, classes):
     return pd.Series(cost_input).reindex(classes).fillna(0.0).astype(float).to_numpy()
 
 
-def run_simulation(
+def _arc_cap_vector(arc_cap, arcs):
+    if isinstance(arc_cap, np.ndarray):
+        return arc_cap.astype(float)
+    return np.full(len(arcs), float(arc_cap)) if np.isscalar(arc_cap) else np.array(
+        [float(arc_cap[(i, j)]) for (i, j) in arcs]
+    )
+
+
+def iter_simulation(
     instance: dict,
     strategy: str = "nominal",
     T: int = 12,
@@ -390,276 +1041,294 @@ def run_simulation(
     procurement_cost=0.0,
     supply_multiplier: float = 0.0,
     seed: int = 42,
-) -> pd.DataFrame:
+    use_cache: bool = True,
+    backend: str = "cvxpy",
+    lookahead: int = 1,
+    warm_start: bool = True,
+    model=None,
+    deadline: float | None = None,
+    integer: bool = False,
+    time_limit_s: float | None = None,
+    mip_gap: float | None = None,
+    threads: int | None = None,
+):
     """
-    Run a simulation for a given strategy and return period-level metrics.
+    Simulate T periods of a policy, yielding each period's metrics dict as soon
+    as that period is solved and simulated. Closing the generator early (or
+    throwing into it) stops the run between periods and releases the compiled
+    problem. Returns "completed", or "time_limit" if the deadline stopped it
+    first.
 
     strategy: "nominal" | "static_robust" | "adr"
+    use_cache: reuse the compiled problem for this instance structure, if any
+    backend:  "cvxpy" (CVXPY + HiGHS) | "highs_direct" (sparse LP straight into highspy)
+    lookahead: plan over a rolling window of this many periods against the
+               forecast and commit only the first one (1 = myopic)
+    warm_start: highs_direct only: start each period's solve from the previous
+                period's basis. The first period is always solved cold so a run's
+                result does not depend on what the shared model solved before it;
+                the cvxpy backend always solves cold (see CompiledProblem.solve)
+    model:    compiled problem to solve with (from get_compiled_problem);
+              looked up for this instance when None
+    deadline: time.time() after which no new period is started; the period
+              being solved gets the remaining time as its HiGHS time limit
+    integer:  integer truck counts per arc (a MIP) instead of the LP relaxation
+    time_limit_s, mip_gap, threads: HiGHS limits for each period's solve. A
+              period stopped at its time limit still runs on the best incumbent;
+              its row has status "feasible" and the incumbent, bound and gap
     """
     nodes = list(instance["nodes"])
     arcs = list(instance["arcs"])
-    mu_mat = instance["mu_mat"]
-    sigma_mat = instance["sigma_mat"]
-    dist_km = instance["dist_km"]
     CMS = instance["CMS"]
     arc_cap = instance.get("arc_cap", 2000.0)
 
-    classes = list(mu_mat.columns)
-    N, m, K = len(nodes), len(arcs), len(classes)
+    classes = list(instance["classes"])
+    N, K = len(nodes), len(classes)
 
-    demand_draws = make_nb_draws(mu_mat, kappa, T, seed)
+    mu_np, sigma_np = demand_arrays(instance)
+    factors = instance.get("demand_factors")
+    demand_draws = make_nb_draws(factors if factors is not None else mu_np, kappa, T, seed)
 
-    node_idx = {n: i for i, n in enumerate(nodes)}
-    arc_cap_vec = np.full(m, float(arc_cap)) if np.isscalar(arc_cap) else np.array(
-        [float(arc_cap[(i, j)]) for (i, j) in arcs]
-    )
-    c_arc = np.array([float(dist_km.loc[i, j]) for (i, j) in arcs], dtype=float)
+    arc_cap_vec = _arc_cap_vector(arc_cap, arcs)
+    c_arc = arc_lengths(instance)
     c_proc = _resolve_costs(procurement_cost, classes)
     c_pen = _resolve_costs(shortage_penalty, classes)
 
-    mu_np = mu_mat.reindex(index=nodes, columns=classes).fillna(0.0).astype(float).to_numpy()
-    sigma_np = sigma_mat.reindex(index=nodes, columns=classes).fillna(0.0).astype(float).to_numpy()
+    # Inventory is an (N, K) array, in instance node/class order
+    I = np.zeros((N, K))
+    I[nodes.index(CMS), :] = supply_multiplier * mu_np.sum(axis=0)
+
+    # The problem is built once per instance structure (and cached across
+    # requests); inventory and all data are Parameters, so each period only
+    # pushes new values instead of reconstructing the expression tree.
+    if model is None:
+        model = get_compiled_problem(instance, strategy, classes, use_cache=use_cache,
+                                     backend=backend, horizon=lookahead, integer=integer)
+    A_in, A_out, cms_idx = model.A_in, model.A_out, model.cms_idx
+
+    with model.lock:
+        model.set_data(mu_np, sigma_np, Gamma, arc_cap_vec, c_arc, c_pen, c_proc,
+                       holding_cost, transport_cost_per_km)
+
+        for t in range(T):
+            time_limit = time_limit_s
+            if deadline is not None:
+                remaining = deadline - time.time()
+                if remaining <= 0:
+                    log.info("  deadline reached after %d/%d periods", t, T)
+                    return "time_limit"
+                time_limit = remaining if time_limit is None else min(time_limit, remaining)
+            t1 = time.perf_counter()
+            opts = dict(time_limit=time_limit, mip_gap=mip_gap, threads=threads)
+            if model.backend == "highs_direct":
+                opts["warm_start"] = warm_start and t > 0
+            status = model.solve(I, **opts)
+            log.info("  period %d/%d solved in %.3fs [%s]",
+                     t + 1, T, time.perf_counter() - t1, status)
+            record_solve(model, status, "simulate", instance, period=t)
+            if status == "time_limit" and deadline is not None and time.time() >= deadline:
+                return "time_limit"
+
+            demand_np = next(demand_draws)      # (N, K)
+            if status not in ("optimal", "optimal_inaccurate", "feasible"):
+                yield {
+                    "t": t, "status": status,
+                    "objective": None, "transport_cost": None,
+                    "shortage_cost": None, "holding_cost": None,
+                    "procurement_cost": None, "unmet_pct": None,
+                    "total_unmet": None, "total_demand": None,
+                }
+                continue
 
-    # Incidence matrices for vectorized flow constraints
-    A_in = np.zeros((N, m))
-    A_out = np.zeros((N, m))
-    for a, (i, j) in enumerate(arcs):
-        A_out[node_idx[i], a] = 1.0
-        A_in[node_idx[j], a] = 1.0
-
-    cms_idx = node_idx[CMS]
-    cms_mask = np.zeros((N, 1))
-    cms_mask[cms_idx] = 1.0
-
-    I = pd.DataFrame(0.0, index=nodes, columns=classes)
-    I.loc[CMS, :] = supply_multiplier * mu_mat.sum(axis=0)
-    metrics = []
-
-    # Build CVXPY problem once; use Parameter for inventory to re-solve
-    # without reconstructing the expression tree each period.
-    I0_param = cp.Parameter((N, K), nonneg=True)
-
-    F = cp.Variable((m, K), nonneg=True)
-    u = cp.Variable((N, K), nonneg=True)
-    I1 = cp.Variable((N, K), nonneg=True)
-    q = cp.Variable(K, nonneg=True)
-    lam = cp.Variable(m, nonneg=True)
-    y = cp.Variable(m, nonneg=True)
-
-    big_m = 1e5
-    net_flow = A_in @ F - A_out @ F          # (N, K)
-    supply = cms_mask @ cp.reshape(q, (1, K), order='C')  # (N, K), only CMS row nonzero
-
-    constraints = [
-        y <= 1.0,
-        lam <= big_m * y,
-    ]
+            sol = model.values()
+            F_val = np.maximum(np.asarray(sol["F"], dtype=float), 0.0)
+            q_val = np.maximum(np.asarray(sol["q"], dtype=float), 0.0)
+            lam_val = np.maximum(np.asarray(sol["lam"], dtype=float), 0.0)
+
+            # For ADR: adapt shipments to realized demand deviation
+            if sol["alpha"] is not None:
+                alpha_val = np.asarray(sol["alpha"], dtype=float)
+                A_adapt, dst_adapt = model.A_adapt, model.dst_adapt
+                xi_real = demand_np - mu_np  # (N, K)
+                ship_np = F_val.copy()
+                ship_np[A_adapt, :] += alpha_val[A_adapt, :] * xi_real[dst_adapt, :]
+                ship_np = np.maximum(ship_np, 0.0)
+            else:
+                ship_np = F_val
+
+            # Vectorized post-solve simulation using incidence matrices
+            inflow_np = A_in @ ship_np           # (N, K)
+            outflow_np = A_out @ ship_np          # (N, K)
+            supply_np = np.zeros((N, K))
+            supply_np[cms_idx, :] = q_val
+
+            avail = I + supply_np + inflow_np - outflow_np
+            served = np.minimum(avail, demand_np)
+            unmet_np = demand_np - served
+            I = avail - served
+
+            transport_cost = transport_cost_per_km * float((c_arc * lam_val).sum())
+            shortage_cost = float((unmet_np * c_pen).sum())
+            hold_cost = holding_cost * float(I.sum())
+            proc_cost = float((q_val * c_proc).sum())
+            total_demand = float(demand_np.sum())
+            total_unmet = float(unmet_np.sum())
+
+            row = {
+                "t": t,
+                "status": "optimal",
+                "objective": transport_cost + shortage_cost + hold_cost + proc_cost,
+                "transport_cost": transport_cost,
+                "shortage_cost": shortage_cost,
+                "holding_cost": hold_cost,
+                "procurement_cost": proc_cost,
+                "unmet_pct": (total_unmet / total_demand * 100.0) if total_demand > 0 else 0.0,
+                "total_unmet": total_unmet,
+                "total_demand": total_demand,
+            }
+            if model.solution_info is not None:
+                row.update(model.solution_info)
+            if status == "feasible":
+                row["status"] = "feasible"
+            yield row
+
+    return "completed"
+
+
+def run_simulation(instance: dict, strategy: str = "nominal", **kwargs) -> pd.DataFrame:
+    """Run a simulation for a given strategy and return period-level metrics (see iter_simulation)."""
+    return pd.DataFrame(list(iter_simulation(instance, strategy, **kwargs)))
+
+
+# Period statuses whose metrics count: solved to optimality, or stopped at a
+# time limit with a feasible incumbent
+SOLVED = ("optimal", "feasible")
+
+
+def summarize_simulation(metrics_df: pd.DataFrame) -> dict:
+    """Aggregate run_simulation period metrics into the /optimize summary."""
+    valid = metrics_df[metrics_df["status"].isin(SOLVED)]
+    if valid.empty:
+        return {}
+    return {
+        "avg_unmet_pct": round(float(valid["unmet_pct"].mean()), 2),
+        "max_unmet_pct": round(float(valid["unmet_pct"].max()), 2),
+        "total_cost": round(float(valid["objective"].sum()), 2),
+        "total_transport_cost": round(float(valid["transport_cost"].sum()), 2),
+        "total_procurement_cost": round(float(valid["procurement_cost"].sum()), 2),
+        "total_holding_cost": round(float(valid["holding_cost"].sum()), 2),
+        "total_shortage_cost": round(float(valid["shortage_cost"].sum()), 2),
+        "avg_transport_cost": round(float(valid["transport_cost"].mean()), 2),
+        "avg_shortage_cost": round(float(valid["shortage_cost"].mean()), 2),
+        "avg_holding_cost": round(float(valid["holding_cost"].mean()), 2),
+        "avg_procurement_cost": round(float(valid["procurement_cost"].mean()), 2),
+        "periods_solved": len(valid),
+        "periods_failed": len(metrics_df) - len(valid),
+        "periods_at_limit": int((valid["status"] == "feasible").sum()),
+    }
 
-    # Precompute arc destination indices (needed by ADR)
-    arc_dest_idx = np.array([node_idx[j] for (_, j) in arcs], dtype=int)
-    arc_src_idx = np.array([node_idx[i] for (i, _) in arcs], dtype=int)
-
-    # alpha variable for ADR (None for other strategies)
-    alpha = None
-
-    if strategy == "nominal":
-        constraints += [
-            cp.sum(F, axis=1) <= cp.multiply(arc_cap_vec, lam),
-            I1 == I0_param + net_flow + supply - mu_np + u,
-            A_out @ F <= I0_param + A_in @ F + supply,
-        ]
-
-    elif strategy == "static_robust":
-        constraints.append(cp.sum(F, axis=1) <= cp.multiply(arc_cap_vec, lam))
-        # Dual variables are (N, K) scalars; off-diagonal entries are
-        # always zero at optimality (no cross-node adaptive terms).
-        theta = cp.Variable((N, K), nonneg=True)
-        pi_plus = cp.Variable((N, K), nonneg=True)
-        pi_minus = cp.Variable((N, K), nonneg=True)
-        theta_ship = cp.Variable((N, K), nonneg=True)
-        pi_ship_plus = cp.Variable((N, K), nonneg=True)
-        pi_ship_minus = cp.Variable((N, K), nonneg=True)
-
-        rhs = I0_param + net_flow + supply - mu_np + u - I1
-        rhs_ship = I0_param + net_flow + supply
-
-        constraints += [
-            Gamma * theta + pi_plus + pi_minus <= rhs,
-            theta + pi_plus >= -sigma_np,
-            theta + pi_minus >= sigma_np,
-            Gamma * theta_ship + pi_ship_plus + pi_ship_minus <= rhs_ship,
-            theta_ship + pi_ship_plus >= -sigma_np,
-            theta_ship + pi_ship_minus >= sigma_np,
-        ]
-
-    elif strategy == "adr":
-        # Affine Decision Rules: ship[a] = F[a] + alpha[a] * (d - mu)
-        arc_df = instance.get("arc_df")
-        if arc_df is None:
-            raise ValueError("arc_df required for ADR strategy")
 
-        # Identify adaptive arcs (CMS/warehouse/hospital → downstream)
-        adaptive_arc_mask = np.array([
-            1.0 if (row.u_tier in ["cms", "warehouse", "hospital"]
-                    and row.v_tier in ["clinic", "warehouse", "hospital", "health_post"])
-            else 0.0
-            for row in arc_df.itertuples(index=False)
-        ], dtype=float)
-        A_adapt = np.where(adaptive_arc_mask == 1.0)[0]
-        non_adapt = np.where(adaptive_arc_mask == 0.0)[0]
-
-        # Incidence matrix for incoming adaptive arcs: (N, m)
-        A_in_adapt = np.zeros((N, m))
-        for a in A_adapt:
-            A_in_adapt[arc_dest_idx[a], a] = 1.0
-
-        # Source-outgoing map: S_out[n, p] = 1 if A_adapt[p] is outgoing from n
-        S_out = np.zeros((N, len(A_adapt)))
-        for p, a in enumerate(A_adapt):
-            S_out[arc_src_idx[a], p] = 1.0
-
-        src_adapt = arc_src_idx[A_adapt]
-        dst_adapt = arc_dest_idx[A_adapt]
-        sigma_dest = sigma_np[arc_dest_idx, :]  # (m, K)
-
-        # Variables
-        alpha = cp.Variable((m, K))
-        eta = cp.Variable(m, nonneg=True)
-        rho_plus = cp.Variable((m, K), nonneg=True)
-        rho_minus = cp.Variable((m, K), nonneg=True)
-
-        # Demand balance duals: self-node (N,K) + cross-node (len(A_adapt),K)
-        theta = cp.Variable((N, K), nonneg=True)
-        pi_self_plus = cp.Variable((N, K), nonneg=True)
-        pi_self_minus = cp.Variable((N, K), nonneg=True)
-        pi_cross_plus = cp.Variable((len(A_adapt), K), nonneg=True)
-        pi_cross_minus = cp.Variable((len(A_adapt), K), nonneg=True)
-
-        # Ship balance duals
-        theta_ship = cp.Variable((N, K), nonneg=True)
-        pis_self_plus = cp.Variable((N, K), nonneg=True)
-        pis_self_minus = cp.Variable((N, K), nonneg=True)
-        pis_cross_plus = cp.Variable((len(A_adapt), K), nonneg=True)
-        pis_cross_minus = cp.Variable((len(A_adapt), K), nonneg=True)
-
-        # Non-adaptive arcs: alpha = 0
-        if len(non_adapt) > 0:
-            constraints.append(alpha[non_adapt, :] == 0)
-
-        # Robust arc capacity: Gamma*eta + sum_k(rho) <= cap*lam - sum_k(F)
-        eta_col = cp.reshape(eta, (m, 1), order='C')
-        constraints += [
-            Gamma * eta + cp.sum(rho_plus + rho_minus, axis=1)
-                <= cp.multiply(arc_cap_vec, lam) - cp.sum(F, axis=1),
-            eta_col + rho_plus >= cp.multiply(alpha, sigma_dest),
-            eta_col + rho_minus >= -cp.multiply(alpha, sigma_dest),
-        ]
-
-        # Demand balance robust constraints
-        rhs = I0_param + net_flow + supply - mu_np + u - I1
-        coeff_self = A_in_adapt @ alpha - 1  # (N, K)
-        constraints += [
-            Gamma * theta + pi_self_plus + pi_self_minus
-                + S_out @ pi_cross_plus + S_out @ pi_cross_minus <= rhs,
-            theta + pi_self_plus >= cp.multiply(coeff_self, sigma_np),
-            theta + pi_self_minus >= -cp.multiply(coeff_self, sigma_np),
-            theta[src_adapt, :] + pi_cross_plus
-                >= -cp.multiply(alpha[A_adapt, :], sigma_np[dst_adapt, :]),
-            theta[src_adapt, :] + pi_cross_minus
-                >= cp.multiply(alpha[A_adapt, :], sigma_np[dst_adapt, :]),
-        ]
-
-        # Ship balance robust constraints
-        rhs_ship = I0_param + net_flow + supply
-        coeff_self_ship = -(A_in_adapt @ alpha)  # (N, K)
-        constraints += [
-            Gamma * theta_ship + pis_self_plus + pis_self_minus
-                + S_out @ pis_cross_plus + S_out @ pis_cross_minus <= rhs_ship,
-            theta_ship + pis_self_plus >= cp.multiply(coeff_self_ship, sigma_np),
-            theta_ship + pis_self_minus >= -cp.multiply(coeff_self_ship, sigma_np),
-            theta_ship[src_adapt, :] + pis_cross_plus
-                >= cp.multiply(alpha[A_adapt, :], sigma_np[dst_adapt, :]),
-            theta_ship[src_adapt, :] + pis_cross_minus
-                >= -cp.multiply(alpha[A_adapt, :], sigma_np[dst_adapt, :]),
-        ]
-
-    obj = cp.Minimize(
-        transport_cost_per_km * cp.sum(cp.multiply(c_arc, lam))
-        + cp.sum(cp.multiply(c_pen.reshape(1, K), u))
-        + holding_cost * cp.sum(I1)
-        + cp.sum(cp.multiply(c_proc, q))
-    )
-    t0 = time.perf_counter()
-    prob = cp.Problem(obj, constraints)
-    log.info("CVXPY problem built: N=%d, m=%d, K=%d, strategy=%s (%.2fs)",
-             N, m, K, strategy, time.perf_counter() - t0)
-
-    for t in range(T):
-        I0_param.value = I.to_numpy().astype(float)
-        t1 = time.perf_counter()
-        prob.solve(solver=cp.HIGHS, verbose=False)
-        log.info("  period %d/%d solved in %.3fs [%s]",
-                 t + 1, T, time.perf_counter() - t1, prob.status)
-
-        if prob.status not in ("optimal", "optimal_inaccurate"):
-            metrics.append({
-                "t": t, "status": prob.status,
-                "objective": None, "transport_cost": None,
-                "shortage_cost": None, "holding_cost": None,
-                "procurement_cost": None, "unmet_pct": None,
-                "total_unmet": None, "total_demand": None,
-            })
-            continue
-
-        F_val = np.maximum(np.asarray(F.value, dtype=float), 0.0)
-        q_val = np.maximum(np.asarray(q.value, dtype=float), 0.0)
-        lam_val = np.maximum(np.asarray(lam.value, dtype=float), 0.0)
-
-        # For ADR: adapt shipments to realized demand deviation
-        if alpha is not None:
-            alpha_val = np.asarray(alpha.value, dtype=float)
-            xi_real = demand_draws[t] - mu_np  # (N, K)
-            ship_np = F_val.copy()
-            ship_np[A_adapt, :] += alpha_val[A_adapt, :] * xi_real[dst_adapt, :]
-            ship_np = np.maximum(ship_np, 0.0)
-        else:
-            ship_np = F_val
-
-        # Vectorized post-solve simulation using incidence matrices
-        inflow_np = A_in @ ship_np           # (N, K)
-        outflow_np = A_out @ ship_np          # (N, K)
-        supply_np = np.zeros((N, K))
-        supply_np[cms_idx, :] = q_val
-        demand_np = demand_draws[t]          # (N, K)
-        I_np = I.to_numpy()
-
-        avail = I_np + supply_np + inflow_np - outflow_np
-        served = np.minimum(avail, demand_np)
-        unmet_np = demand_np - served
-        I_next_np = avail - served
-        I = pd.DataFrame(I_next_np, index=nodes, columns=classes)
-
-        transport_cost = transport_cost_per_km * float((c_arc * lam_val).sum())
-        shortage_cost = float((unmet_np * c_pen).sum())
-        hold_cost = holding_cost * float(I_next_np.sum())
-        proc_cost = float((q_val * c_proc).sum())
-        total_demand = float(demand_np.sum())
-        total_unmet = float(unmet_np.sum())
-
-        metrics.append({
-            "t": t,
-            "status": "optimal",
-            "objective": transport_cost + shortage_cost + hold_cost + proc_cost,
-            "transport_cost": transport_cost,
-            "shortage_cost": shortage_cost,
-            "holding_cost": hold_cost,
-            "procurement_cost": proc_cost,
-            "unmet_pct": (total_unmet / total_demand * 100.0) if total_demand > 0 else 0.0,
-            "total_unmet": total_unmet,
-            "total_demand": total_demand,
+def combine_simulations(runs: list[list[dict]]) -> list[dict]:
+    """
+    Sum per-region period metrics into national ones. A national period is
+    "optimal" only when every run has a solved row for it; otherwise it is
+    "incomplete" and its sums cover just the regions that solved it.
+    """
+    frames = [pd.DataFrame(r) for r in runs if r]
+    if not frames:
+        return []
+    df = pd.concat(frames, ignore_index=True)
+    sums = ["objective", "transport_cost", "shortage_cost", "holding_cost",
+            "procurement_cost", "total_unmet", "total_demand"]
+    solved = df[df["status"].isin(SOLVED)]
+    totals = solved.groupby("t")[sums].sum().reindex(sorted(df["t"].unique()), fill_value=0.0)
+    n_solved = solved.groupby("t").size().reindex(totals.index, fill_value=0)
+    periods = []
+    for t, row in totals.iterrows():
+        demand = float(row["total_demand"])
+        periods.append({
+            "t": int(t),
+            "status": "optimal" if n_solved[t] == len(runs) else "incomplete",
+            **{c: float(row[c]) for c in sums},
+            "unmet_pct": float(row["total_unmet"]) / demand * 100.0 if demand > 0 else 0.0,
+            "regions_solved": int(n_solved[t]),
         })
+    return periods
 
-    return pd.DataFrame(metrics)
+
+# PARAMETER SWEEP: Gamma x shortage-penalty frontier on one compiled model
+
+def sweep_parameters(
+    instance: dict,
+    strategy: str = "static_robust",
+    gammas=(10.0,),
+    penalty_multipliers=(1.0,),
+    shortage_penalty=10.0,
+    T: int = 12,
+    backend: str = "cvxpy",
+    use_cache: bool = True,
+    deadline: float | None = None,
+    **sim_kwargs,
+) -> list[dict]:
+    """
+    Simulate every (Gamma, penalty) grid point and return the cost/unmet frontier.
+
+    shortage_penalty:    base per-unit penalty (scalar or per-class); grid point
+                         p uses shortage_penalty * penalty_multipliers[p]
+    sim_kwargs:          passed through to run_simulation (kappa, costs, seed, ...)
+    deadline:            time.time() at which to stop; points not fully
+                         simulated by then are left out
+
+    The problem is compiled once and shared by every point; only parameter
+    values change between solves. Penalties are walked back and forth within
+    each Gamma so consecutive runs differ by one step. Every point uses the
+    same seed, so points differ only by policy.
+    """
+    classes = list(instance["classes"])
+    model = get_compiled_problem(instance, strategy, classes, use_cache=use_cache,
+                                 backend=backend, horizon=sim_kwargs.get("lookahead", 1),
+                                 integer=sim_kwargs.get("integer", False))
+    base_pen = (float(shortage_penalty) if np.isscalar(shortage_penalty)
+                else pd.Series(shortage_penalty).astype(float))
+
+    points = []
+    t0 = time.perf_counter()
+    mults = list(penalty_multipliers)
+    grid = [
+        (gamma, mult)
+        for g_i, gamma in enumerate(gammas)
+        for mult in (mults if g_i % 2 == 0 else mults[::-1])
+    ]
+    for gamma, mult in grid:
+        metrics_df = run_simulation(
+            instance, strategy, T=T, Gamma=float(gamma),
+            shortage_penalty=base_pen * float(mult),
+            model=model, deadline=deadline, **sim_kwargs,
+        )
+        if len(metrics_df) < T:
+            log.info("Sweep: deadline reached after %d/%d points", len(points), len(grid))
+            break
+        summary = summarize_simulation(metrics_df)
+        point = {"gamma": float(gamma), "penalty_multiplier": float(mult), **summary}
+        if summary:
+            point["operating_cost"] = round(
+                summary["total_cost"] - summary["total_shortage_cost"], 2)
+        points.append(point)
+    log.info("Sweep: %d points, strategy=%s, %.2fs",
+             len(points), strategy, time.perf_counter() - t0)
+
+    # Pareto frontier on (operating cost, average unmet %): a point is efficient
+    # if no other point is at least as good on both and better on one.
+    solved = [p for p in points if "operating_cost" in p]
+    for p in points:
+        p["pareto"] = "operating_cost" in p and not any(
+            o["operating_cost"] <= p["operating_cost"]
+            and o["avg_unmet_pct"] <= p["avg_unmet_pct"]
+            and (o["operating_cost"] < p["operating_cost"]
+                 or o["avg_unmet_pct"] < p["avg_unmet_pct"])
+            for o in solved
+        )
+    return sorted(points, key=lambda p: (p["gamma"], p["penalty_multiplier"]))
 
 
 # PLANNING MODE: solve one period with real inventory, return shipment plan
@@ -675,34 +1344,41 @@ def run_planning(
     procurement_cost=0.0,
     initial_inventory: dict | None = None,
     last_demand: dict | None = None,
+    use_cache: bool = True,
+    backend: str = "cvxpy",
+    aggregate: bool = True,
+    integer: bool = False,
+    time_limit_s: float | None = None,
+    mip_gap: float | None = None,
+    threads: int | None = None,
 ) -> dict:
     """
     Solve ONE period with real inputs and return actionable shipment decisions.
 
     initial_inventory: {facility_name: {drug: quantity}}, current stock on hand
     last_demand:       {facility_name: {drug: quantity}}, last period realized demand
+    use_cache:         reuse the compiled problem for this instance structure, if any
+    backend:           "cvxpy" | "highs_direct", see run_simulation
+    aggregate:         solve cost-identical classes as one where that is exact
+                       (see _product_groups)
+    integer:           integer truck counts per arc (a MIP)
+    time_limit_s, mip_gap, threads: HiGHS limits; a solve stopped at the time
+                       limit returns the best incumbent with status "feasible"
+                       and its incumbent objective, bound and gap
     """
     nodes = list(instance["nodes"])
     arcs = list(instance["arcs"])
-    mu_mat = instance["mu_mat"]
-    sigma_mat = instance["sigma_mat"]
-    dist_km = instance["dist_km"]
-    CMS = instance["CMS"]
     arc_cap = instance.get("arc_cap", 2000.0)
 
-    classes = list(mu_mat.columns)
+    classes = list(instance["classes"])
     N, m, K = len(nodes), len(arcs), len(classes)
 
-    node_idx = {n: i for i, n in enumerate(nodes)}
-    arc_cap_vec = np.full(m, float(arc_cap)) if np.isscalar(arc_cap) else np.array(
-        [float(arc_cap[(i, j)]) for (i, j) in arcs]
-    )
-    c_arc = np.array([float(dist_km.loc[i, j]) for (i, j) in arcs], dtype=float)
+    arc_cap_vec = _arc_cap_vector(arc_cap, arcs)
+    c_arc = arc_lengths(instance)
     c_proc = _resolve_costs(procurement_cost, classes)
     c_pen = _resolve_costs(shortage_penalty, classes)
 
-    mu_np = mu_mat.reindex(index=nodes, columns=classes).fillna(0.0).astype(float).to_numpy()
-    sigma_np = sigma_mat.reindex(index=nodes, columns=classes).fillna(0.0).astype(float).to_numpy()
+    mu_np, sigma_np = demand_arrays(instance)
 
     # Build I0 from user-supplied inventory
     I0 = pd.DataFrame(0.0, index=nodes, columns=classes)
@@ -728,153 +1404,50 @@ def run_planning(
                     realized_df.loc[fac, drug] = float(qty)
         realized_np = realized_df.to_numpy().astype(float)
 
-    # Incidence matrices
-    A_in = np.zeros((N, m))
-    A_out = np.zeros((N, m))
-    for a, (i, j) in enumerate(arcs):
-        A_out[node_idx[i], a] = 1.0
-        A_in[node_idx[j], a] = 1.0
-
-    cms_idx = node_idx[CMS]
-    cms_mask = np.zeros((N, 1))
-    cms_mask[cms_idx] = 1.0
-
-    arc_dest_idx = np.array([node_idx[j] for (_, j) in arcs], dtype=int)
-    arc_src_idx = np.array([node_idx[i] for (i, _) in arcs], dtype=int)
-
-    # Build CVXPY problem (single period)
-    F = cp.Variable((m, K), nonneg=True)
-    u = cp.Variable((N, K), nonneg=True)
-    I1 = cp.Variable((N, K), nonneg=True)
-    q = cp.Variable(K, nonneg=True)
-    lam = cp.Variable(m, nonneg=True)
-    y = cp.Variable(m, nonneg=True)
-
-    big_m = 1e5
-    net_flow = A_in @ F - A_out @ F
-    supply = cms_mask @ cp.reshape(q, (1, K), order='C')
-
-    constraints = [
-        y <= 1.0,
-        lam <= big_m * y,
-    ]
-
-    if strategy == "nominal":
-        constraints += [
-            cp.sum(F, axis=1) <= cp.multiply(arc_cap_vec, lam),
-            I1 == I0_np + net_flow + supply - mu_np + u,
-            A_out @ F <= I0_np + A_in @ F + supply,
-        ]
-    elif strategy == "static_robust":
-        constraints.append(cp.sum(F, axis=1) <= cp.multiply(arc_cap_vec, lam))
-        theta = cp.Variable((N, K), nonneg=True)
-        pi_plus = cp.Variable((N, K), nonneg=True)
-        pi_minus = cp.Variable((N, K), nonneg=True)
-        theta_ship = cp.Variable((N, K), nonneg=True)
-        pi_ship_plus = cp.Variable((N, K), nonneg=True)
-        pi_ship_minus = cp.Variable((N, K), nonneg=True)
-
-        rhs = I0_np + net_flow + supply - mu_np + u - I1
-        rhs_ship = I0_np + net_flow + supply
-        constraints += [
-            Gamma * theta + pi_plus + pi_minus <= rhs,
-            theta + pi_plus >= -sigma_np,
-            theta + pi_minus >= sigma_np,
-            Gamma * theta_ship + pi_ship_plus + pi_ship_minus <= rhs_ship,
-            theta_ship + pi_ship_plus >= -sigma_np,
-            theta_ship + pi_ship_minus >= sigma_np,
-        ]
-    elif strategy == "adr":
-        arc_df = instance.get("arc_df")
-        if arc_df is None:
-            raise ValueError("arc_df required for ADR strategy")
-        adaptive_arc_mask = np.array([
-            1.0 if (row.u_tier in ["cms", "warehouse", "hospital"]
-                    and row.v_tier in ["clinic", "warehouse", "hospital", "health_post"])
-            else 0.0
-            for row in arc_df.itertuples(index=False)
-        ], dtype=float)
-        A_adapt = np.where(adaptive_arc_mask == 1.0)[0]
-        non_adapt = np.where(adaptive_arc_mask == 0.0)[0]
-        A_in_adapt = np.zeros((N, m))
-        for a in A_adapt:
-            A_in_adapt[arc_dest_idx[a], a] = 1.0
-        S_out = np.zeros((N, len(A_adapt)))
-        for p, a in enumerate(A_adapt):
-            S_out[arc_src_idx[a], p] = 1.0
-        src_adapt = arc_src_idx[A_adapt]
-        dst_adapt = arc_dest_idx[A_adapt]
-        sigma_dest = sigma_np[arc_dest_idx, :]
-
-        alpha = cp.Variable((m, K))
-        eta = cp.Variable(m, nonneg=True)
-        rho_plus = cp.Variable((m, K), nonneg=True)
-        rho_minus = cp.Variable((m, K), nonneg=True)
-        theta = cp.Variable((N, K), nonneg=True)
-        pi_self_plus = cp.Variable((N, K), nonneg=True)
-        pi_self_minus = cp.Variable((N, K), nonneg=True)
-        pi_cross_plus = cp.Variable((len(A_adapt), K), nonneg=True)
-        pi_cross_minus = cp.Variable((len(A_adapt), K), nonneg=True)
-        theta_ship = cp.Variable((N, K), nonneg=True)
-        pis_self_plus = cp.Variable((N, K), nonneg=True)
-        pis_self_minus = cp.Variable((N, K), nonneg=True)
-        pis_cross_plus = cp.Variable((len(A_adapt), K), nonneg=True)
-        pis_cross_minus = cp.Variable((len(A_adapt), K), nonneg=True)
-
-        if len(non_adapt) > 0:
-            constraints.append(alpha[non_adapt, :] == 0)
-        eta_col = cp.reshape(eta, (m, 1), order='C')
-        constraints += [
-            Gamma * eta + cp.sum(rho_plus + rho_minus, axis=1)
-                <= cp.multiply(arc_cap_vec, lam) - cp.sum(F, axis=1),
-            eta_col + rho_plus >= cp.multiply(alpha, sigma_dest),
-            eta_col + rho_minus >= -cp.multiply(alpha, sigma_dest),
-        ]
-        rhs = I0_np + net_flow + supply - mu_np + u - I1
-        coeff_self = A_in_adapt @ alpha - 1
-        constraints += [
-            Gamma * theta + pi_self_plus + pi_self_minus
-                + S_out @ pi_cross_plus + S_out @ pi_cross_minus <= rhs,
-            theta + pi_self_plus >= cp.multiply(coeff_self, sigma_np),
-            theta + pi_self_minus >= -cp.multiply(coeff_self, sigma_np),
-            theta[src_adapt, :] + pi_cross_plus
-                >= -cp.multiply(alpha[A_adapt, :], sigma_np[dst_adapt, :]),
-            theta[src_adapt, :] + pi_cross_minus
-                >= cp.multiply(alpha[A_adapt, :], sigma_np[dst_adapt, :]),
-        ]
-        rhs_ship = I0_np + net_flow + supply
-        coeff_self_ship = -(A_in_adapt @ alpha)
-        constraints += [
-            Gamma * theta_ship + pis_self_plus + pis_self_minus
-                + S_out @ pis_cross_plus + S_out @ pis_cross_minus <= rhs_ship,
-            theta_ship + pis_self_plus >= cp.multiply(coeff_self_ship, sigma_np),
-            theta_ship + pis_self_minus >= -cp.multiply(coeff_self_ship, sigma_np),
-            theta_ship[src_adapt, :] + pis_cross_plus
-                >= cp.multiply(alpha[A_adapt, :], sigma_np[dst_adapt, :]),
-            theta_ship[src_adapt, :] + pis_cross_minus
-                >= -cp.multiply(alpha[A_adapt, :], sigma_np[dst_adapt, :]),
-        ]
-
-    obj = cp.Minimize(
-        transport_cost_per_km * cp.sum(cp.multiply(c_arc, lam))
-        + cp.sum(cp.multiply(c_pen.reshape(1, K), u))
-        + holding_cost * cp.sum(I1)
-        + cp.sum(cp.multiply(c_proc, q))
-    )
+    groups = _product_groups(instance, strategy, I0_np, c_pen, c_proc) if aggregate else None
+    if groups is None:
+        solve_classes = classes
+        mu_s, sigma_s, I0_s, c_pen_s, c_proc_s = mu_np, sigma_np, I0_np, c_pen, c_proc
+    else:
+        M, W = groups
+        lead = M.argmax(axis=0)  # one representative class per group
+        solve_classes = [classes[k] for k in lead]
+        mu_s, sigma_s, I0_s = mu_np @ M, sigma_np @ M, I0_np @ M
+        c_pen_s, c_proc_s = c_pen[lead], c_proc[lead]
+
+    # Single-period problem, shared with run_simulation through the cache
+    model = get_compiled_problem(instance, strategy, solve_classes, use_cache=use_cache,
+                                 backend=backend, integer=integer)
+    A_in, A_out, cms_idx = model.A_in, model.A_out, model.cms_idx
+    arc_dest_idx = model.arc_dest_idx
+
+    with model.lock:
+        model.set_data(mu_s, sigma_s, Gamma, arc_cap_vec, c_arc, c_pen_s, c_proc_s,
+                       holding_cost, transport_cost_per_km)
+        t0 = time.perf_counter()
+        status = model.solve(I0_s, time_limit=time_limit_s, mip_gap=mip_gap, threads=threads)
+        solve_time = time.perf_counter() - t0
+        log.info("Planning solve: N=%d, m=%d, K=%d (solved as %d), strategy=%s, %.2fs [%s]",
+                 N, m, K, len(solve_classes), strategy, solve_time, status)
+        record_solve(model, status, "plan", instance)
+
+        if status not in ("optimal", "optimal_inaccurate", "feasible"):
+            return {"status": status, "shipments": [], "procurement": [], "summary": {}}
+        solution_info = model.solution_info
+
+        sol = model.values()
+        F_val = np.maximum(np.asarray(sol["F"], dtype=float), 0.0)
+        q_val = np.maximum(np.asarray(sol["q"], dtype=float), 0.0)
+        lam_val = np.maximum(np.asarray(sol["lam"], dtype=float), 0.0)
+        alpha_val = (np.asarray(sol["alpha"], dtype=float)
+                     if sol["alpha"] is not None else None)
+        prob_value = sol["objective"]
+
+    if groups is not None:
+        # Split each group's flows and purchases back by the national weights
+        F_val = F_val @ W.T
+        q_val = W @ q_val
 
-    t0 = time.perf_counter()
-    prob = cp.Problem(obj, constraints)
-    prob.solve(solver=cp.HIGHS, verbose=False)
-    solve_time = time.perf_counter() - t0
-    log.info("Planning solve: N=%d, m=%d, K=%d, strategy=%s, %.2fs [%s]",
-             N, m, K, strategy, solve_time, prob.status)
-
-    if prob.status not in ("optimal", "optimal_inaccurate"):
-        return {"status": prob.status, "shipments": [], "procurement": [], "summary": {}}
-
-    F_val = np.maximum(np.asarray(F.value, dtype=float), 0.0)
-    q_val = np.maximum(np.asarray(q.value, dtype=float), 0.0)
-    lam_val = np.maximum(np.asarray(lam.value, dtype=float), 0.0)
     total_transport_cost = float(transport_cost_per_km * float((c_arc * lam_val).sum()))
     total_procurement_cost = float((c_proc * q_val).sum())
 
@@ -889,7 +1462,6 @@ def run_planning(
         ship_r = F_val.copy()
         if strategy == "adr":
             try:
-                alpha_val = np.asarray(alpha.value, dtype=float)
                 xi_real = realized_np - mu_np  # observed deviation per (node, drug)
                 # Affine rule from paper: F_{(u,v),k}(ξ) = F̄_{(u,v),k} + α_{(u,v),k} · ξ_{v,k}
                 # ξ indexed by destination node v for arc (u, v).
@@ -920,7 +1492,7 @@ def run_planning(
                     "to": j,
                     "drug": drug,
                     "quantity": round(qty, 1),
-                    "distance_km": round(float(dist_km.loc[i, j]), 1),
+                    "distance_km": round(float(c_arc[a]), 1),
                 })
 
     # Procurement recommendations
@@ -938,10 +1510,11 @@ def run_planning(
     # Summary
     total_shipped = float(F_val.sum())
     total_procured = float(q_val.sum())
-    total_cost = float(prob.value) if prob.value is not None else 0.0
+    total_cost = float(prob_value) if prob_value is not None else 0.0
 
     return {
-        "status": "optimal",
+        "status": "feasible" if status == "feasible" else "optimal",
+        **(solution_info or {}),
         "solve_time_s": round(solve_time, 2),
         "strategy": strategy,
         "shipments": sorted(shipments, key=lambda s: -s["quantity"]),
@@ -0,0 +1,153 @@
+"""
+Disk-backed cache of /optimize and /plan responses.
+
+Simulations use a fixed seed, so the same request against the same data
+always produces the same answer. Responses are stored in SQLite under
+outputs/, keyed by a SHA-256 of the canonical request JSON plus
+AppData.cache_token. Editing facilities, matrices, products or scenarios
+changes the token, so older entries can no longer be hit; they are purged on
+the next write. Entries are evicted least-recently-used past
+KAELO_RESULT_CACHE_SIZE entries or KAELO_RESULT_CACHE_MB megabytes.
+"""
+
+import hashlib
+import json
+import logging
+import os
+import sqlite3
+import threading
+import time
+import zlib
+from pathlib import Path
+
+from .data_loader import BASE_DIR, app_data
+
+log = logging.getLogger(__name__)
+
+RESULT_CACHE_PATH = Path(os.environ.get(
+    "KAELO_RESULT_CACHE", str(BASE_DIR / "outputs" / "result_cache.db")
+))
+RESULT_CACHE_SIZE = int(os.environ.get("KAELO_RESULT_CACHE_SIZE", "500"))
+RESULT_CACHE_MB = float(os.environ.get("KAELO_RESULT_CACHE_MB", "256"))
+
+# Bump when a code change alters what a given request returns
+RESULT_SCHEMA = 2
+
+
+def request_key(kind: str, request: dict) -> str:
+    """Cache key for a request body (model_dump(mode="json")) against the current data."""
+    canonical = json.dumps(
+        {"kind": kind, "request": request, "data": app_data.cache_token,
+         "schema": RESULT_SCHEMA},
+        sort_keys=True, separators=(",", ":"),
+    )
+    return hashlib.sha256(canonical.encode()).hexdigest()
+
+
+class ResultCache:
+    """SQLite table of zlib-compressed JSON responses with LRU eviction."""
+
+    def __init__(self, path: Path = RESULT_CACHE_PATH, max_entries: int = RESULT_CACHE_SIZE,
+                 max_mb: float = RESULT_CACHE_MB):
+        self.path = Path(path)
+        self.max_entries = max_entries
+        self.max_bytes = int(max_mb * 1024 * 1024)
+        self._ready = False
+        self._init_lock = threading.Lock()
+
+    @property
+    def enabled(self) -> bool:
+        return self.max_entries > 0
+
+    def _get_db(self):
+        conn = sqlite3.connect(str(self.path), timeout=10)
+        if not self._ready:
+            with self._init_lock:
+                self.path.parent.mkdir(parents=True, exist_ok=True)
+                conn.execute("PRAGMA journal_mode=WAL")
+                conn.execute("""
+                    CREATE TABLE IF NOT EXISTS results (
+                        key TEXT PRIMARY KEY,
+                        kind TEXT NOT NULL,
+                        data_token TEXT NOT NULL,
+                        body BLOB NOT NULL,
+                        size INTEGER NOT NULL,
+                        created_at REAL NOT NULL,
+                        last_used REAL NOT NULL,
+                        hits INTEGER DEFAULT 0
+                    )
+                """)
+                conn.execute("CREATE INDEX IF NOT EXISTS results_lru ON results (last_used)")
+                conn.commit()
+                self._ready = True
+        return conn
+
+    def get(self, key: str) -> dict | None:
+        if not self.enabled:
+            return None
+        try:
+            conn = self._get_db()
+            try:
+                row = conn.execute("SELECT body FROM results WHERE key = ?", (key,)).fetchone()
+                if row is None:
+                    return None
+                conn.execute(
+                    "UPDATE results SET last_used = ?, hits = hits + 1 WHERE key = ?",
+                    (time.time(), key),
+                )
+                conn.commit()
+            finally:
+                conn.close()
+            return json.loads(zlib.decompress(row[0]))
+        except (sqlite3.Error, zlib.error, ValueError) as e:
+            log.warning("Result cache read failed: %s", e)
+            return None
+
+    def put(self, key: str, kind: str, body: dict):
+        if not self.enabled:
+            return
+        blob = zlib.compress(json.dumps(body, separators=(",", ":")).encode())
+        if len(blob) > self.max_bytes:
+            return
+        now = time.time()
+        token = app_data.cache_token
+        try:
+            conn = self._get_db()
+            try:
+                conn.execute("DELETE FROM results WHERE data_token != ?", (token,))
+                conn.execute(
+                    "INSERT OR REPLACE INTO results"
+                    " (key, kind, data_token, body, size, created_at, last_used)"
+                    " VALUES (?, ?, ?, ?, ?, ?, ?)",
+                    (key, kind, token, blob, len(blob), now, now),
+                )
+                self._evict(conn)
+                conn.commit()
+            finally:
+                conn.close()
+        except sqlite3.Error as e:
+            log.warning("Result cache write failed: %s", e)
+
+    def _evict(self, conn):
+        rows = conn.execute("SELECT key, size FROM results ORDER BY last_used DESC").fetchall()
+        total = 0
+        stale = []
+        for i, (key, size) in enumerate(rows):
+            total += size
+            if i >= self.max_entries or total > self.max_bytes:
+                stale.append((key,))
+        conn.executemany("DELETE FROM results WHERE key = ?", stale)
+
+    def clear(self):
+        try:
+            conn = self._get_db()
+            try:
+                conn.execute("DELETE FROM results")
+                conn.commit()
+            finally:
+                conn.close()
+        except sqlite3.Error as e:
+            log.warning("Result cache clear failed: %s", e)
+
+
+result_cache = ResultCache()
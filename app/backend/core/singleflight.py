@@ -0,0 +1,82 @@
+"""
+Request coalescing: concurrent identical requests share one computation.
+
+The first caller for a key runs the work; callers that arrive with the same
+key while it is running block until it finishes and get the same result (or
+the same exception). Nothing is remembered afterwards; that is the result
+cache's job.
+"""
+
+import threading
+
+
+class FlightAbandoned(Exception):
+    """Raised to a caller that gave up waiting on an in-flight call."""
+
+
+class _Call:
+    def __init__(self):
+        self.done = threading.Event()
+        self.result = None
+        self.error = None
+        self.waiters = 0
+
+
+class SingleFlight:
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._calls: dict[str, _Call] = {}
+
+    def do(self, key: str, fn, shareable=None, gave_up=None, poll_s: float = 1.0):
+        """
+        Return (fn() or the in-flight call's result, shared) for key.
+
+        A caller that gets an in-flight result failing shareable(result) runs
+        the call again instead (or joins a newer one). A caller with gave_up
+        checks it every poll_s seconds while it waits; once it is true the
+        caller stops counting as a waiter and gets FlightAbandoned.
+        """
+        while True:
+            with self._lock:
+                call = self._calls.get(key)
+                leader = call is None
+                if leader:
+                    call = self._calls[key] = _Call()
+                else:
+                    call.waiters += 1
+            if leader:
+                break
+
+            while not call.done.wait(poll_s if gave_up is not None else None):
+                if gave_up():
+                    with self._lock:
+                        call.waiters -= 1
+                    raise FlightAbandoned(key)
+            if call.error is not None:
+                raise call.error
+            if shareable is None or shareable(call.result):
+                return call.result, True
+
+        try:
+            call.result = fn()
+        except Exception as e:
+            call.error = e
+            raise
+        finally:
+            with self._lock:
+                del self._calls[key]
+            call.done.set()
+        return call.result, False
+
+    def waiters(self, key: str) -> int:
+        """Callers still waiting on the in-flight call for key, besides the one running it."""
+        with self._lock:
+            call = self._calls.get(key)
+            return call.waiters if call is not None else 0
+
+    def in_flight(self) -> int:
+        with self._lock:
+            return len(self._calls)
+
+
+flights = SingleFlight()
@@ -0,0 +1,37 @@
+"""
+Solver processes for the interactive endpoints.
+
+CVXPY canonicalization holds the GIL, so solving inside the API process stalls
+every other request while a large model builds. /optimize, /plan and the
+sweep instead build their instance in the API process (cheap, cached), pack
+it into NumPy arrays (optimizer.pack_instance) and hand it to one of
+KAELO_SOLVER_WORKERS processes forked at startup. The workers keep their own
+compiled-problem caches, so repeat structures stay warm.
+
+The pool is a JobManager separate from the background-job pool, so
+interactive solves never queue behind long jobs.
+"""
+
+import os
+
+from .jobs import JobManager
+from .optimizer import iter_simulation, run_planning, sweep_parameters, unpack_instance
+
+SOLVER_WORKERS = int(os.environ.get("KAELO_SOLVER_WORKERS", str(min(4, os.cpu_count() or 1))))
+
+solver_pool = JobManager(
+    workers=SOLVER_WORKERS, max_queued=256, history=1024, name="solver",
+)
+
+
+def simulate(packed: dict, strategy: str, kwargs: dict):
+    """Solver-process body: iter_simulation on a packed instance."""
+    return (yield from iter_simulation(unpack_instance(packed), strategy, **kwargs))
+
+
+def plan(packed: dict, strategy: str, kwargs: dict) -> dict:
+    return run_planning(unpack_instance(packed), strategy, **kwargs)
+
+
+def sweep(packed: dict, strategy: str, kwargs: dict) -> list[dict]:
+    return sweep_parameters(unpack_instance(packed), strategy, **kwargs)
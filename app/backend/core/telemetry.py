@@ -0,0 +1,178 @@
+"""
+Structured telemetry for every solve, kept in SQLite under outputs/.
+
+iter_simulation and run_planning call record_solve() after each solve, in
+whichever process ran it (API, solver pool or job worker), with the model's
+sizes, its build, canonicalization and solver times, iterations, status and
+the process's peak RSS. Rows past KAELO_TELEMETRY_ROWS are pruned oldest
+first; KAELO_TELEMETRY_ROWS=0 turns recording off. query() backs the admin
+telemetry endpoint.
+"""
+
+import logging
+import os
+import resource
+import sqlite3
+import threading
+import time
+from pathlib import Path
+
+import pandas as pd
+
+from .data_loader import BASE_DIR
+
+log = logging.getLogger(__name__)
+
+TELEMETRY_PATH = Path(os.environ.get(
+    "KAELO_TELEMETRY", str(BASE_DIR / "outputs" / "telemetry.db")
+))
+TELEMETRY_ROWS = int(os.environ.get("KAELO_TELEMETRY_ROWS", "200000"))
+
+COLUMNS = (
+    "ts", "kind", "region", "strategy", "backend", "horizon", "integer", "period",
+    "N", "m", "K", "n_vars", "n_constraints", "nnz",
+    "build_s", "canon_s", "solver_s", "iterations", "status", "peak_rss_mb", "pid",
+)
+GROUP_COLUMNS = ("region", "strategy", "backend", "kind", "status", "day")
+
+_PRUNE_EVERY = 500
+
+
+def _peak_rss_mb() -> float:
+    # ru_maxrss is in kilobytes on Linux
+    return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024.0
+
+
+class TelemetryStore:
+    def __init__(self, path: Path = TELEMETRY_PATH, max_rows: int = TELEMETRY_ROWS):
+        self.path = Path(path)
+        self.max_rows = max_rows
+        self._ready = False
+        self._init_lock = threading.Lock()
+        self._writes = 0
+
+    @property
+    def enabled(self) -> bool:
+        return self.max_rows > 0
+
+    def _get_db(self):
+        conn = sqlite3.connect(str(self.path), timeout=10)
+        if not self._ready:
+            with self._init_lock:
+                self.path.parent.mkdir(parents=True, exist_ok=True)
+                conn.execute("PRAGMA journal_mode=WAL")
+                conn.execute(f"""
+                    CREATE TABLE IF NOT EXISTS solves (
+                        id INTEGER PRIMARY KEY AUTOINCREMENT,
+                        {", ".join(COLUMNS)}
+                    )
+                """)
+                conn.execute("CREATE INDEX IF NOT EXISTS solves_ts ON solves (ts)")
+                conn.commit()
+                self._ready = True
+        conn.execute("PRAGMA synchronous=NORMAL")
+        return conn
+
+    def record(self, row: dict):
+        if not self.enabled:
+            return
+        try:
+            conn = self._get_db()
+            try:
+                conn.execute(
+                    f"INSERT INTO solves ({', '.join(COLUMNS)})"
+                    f" VALUES ({', '.join('?' * len(COLUMNS))})",
+                    [row.get(c) for c in COLUMNS],
+                )
+                self._writes += 1
+                if self._writes % _PRUNE_EVERY == 0:
+                    conn.execute(
+                        "DELETE FROM solves WHERE id <= (SELECT MAX(id) FROM solves) - ?",
+                        (self.max_rows,),
+                    )
+                conn.commit()
+            finally:
+                conn.close()
+        except sqlite3.Error as e:
+            log.warning("Telemetry write failed: %s", e)
+
+    def query(self, region: str | None = None, strategy: str | None = None,
+              since: float | None = None, group_by: list[str] | None = None,
+              limit: int = 200) -> list[dict]:
+        """
+        Most recent rows matching the filters, or with group_by one row per
+        group: solve count, failures, solver-time mean/p50/p95/max, mean
+        canonicalization and build time, mean size and peak RSS.
+        """
+        where, params = [], []
+        for col, value in (("region", region), ("strategy", strategy)):
+            if value is not None:
+                where.append(f"{col} = ?")
+                params.append(value)
+        if since is not None:
+            where.append("ts >= ?")
+            params.append(since)
+        sql = "SELECT * FROM solves"
+        if where:
+            sql += " WHERE " + " AND ".join(where)
+        sql += " ORDER BY id DESC"
+        if not group_by:
+            sql += f" LIMIT {int(limit)}"
+
+        conn = self._get_db()
+        try:
+            if not group_by:
+                conn.row_factory = sqlite3.Row
+                return [dict(r) for r in conn.execute(sql, params)]
+            df = pd.read_sql_query(sql, conn, params=params)
+        finally:
+            conn.close()
+        if df.empty:
+            return []
+
+        df["day"] = pd.to_datetime(df["ts"], unit="s").dt.strftime("%Y-%m-%d")
+        df["failed"] = ~df["status"].isin(["optimal", "optimal_inaccurate", "feasible"])
+        out = df.groupby(list(group_by), dropna=False).agg(
+            solves=("id", "size"),
+            failed=("failed", "sum"),
+            solver_s_mean=("solver_s", "mean"),
+            solver_s_p50=("solver_s", "median"),
+            solver_s_p95=("solver_s", lambda s: s.quantile(0.95)),
+            solver_s_max=("solver_s", "max"),
+            canon_s_mean=("canon_s", "mean"),
+            build_s_mean=("build_s", lambda s: s[s > 0].mean()),
+            n_vars_mean=("n_vars", "mean"),
+            peak_rss_mb_max=("peak_rss_mb", "max"),
+        ).reset_index()
+        out = out.round(4).sort_values("solver_s_mean", ascending=False).head(int(limit))
+        return out.astype(object).where(out.notna(), None).to_dict("records")
+
+
+telemetry = TelemetryStore()
+
+
+def record_solve(model, status: str, kind: str, instance: dict, period: int | None = None):
+    """Record the model's last solve. The first solve of a fresh model carries its build time."""
+    if not telemetry.enabled:
+        return
+    try:
+        stats = model.solve_stats()
+    except Exception as e:   # telemetry must never fail a solve
+        log.warning("Telemetry stats unavailable: %s", e)
+        stats = {}
+    telemetry.record({
+        "ts": time.time(),
+        "kind": kind,
+        "region": instance.get("region"),
+        "strategy": model.strategy,
+        "backend": model.backend,
+        "horizon": model.horizon,
+        "integer": int(model.integer),
+        "period": period,
+        "N": model.N, "m": model.m, "K": model.K,
+        "build_s": getattr(model, "build_s", None) if model.solves == 1 else 0.0,
+        "status": status,
+        "peak_rss_mb": round(_peak_rss_mb(), 1),
+        "pid": os.getpid(),
+        **stats,
+    })
@@ -0,0 +1,11 @@
+"""
+Imported once by the multiprocessing fork server that job and solver workers
+are forked from (see jobs.py). Importing the solver libraries here, in that
+single-threaded process, lets every worker start with them loaded without
+forking the threaded API process. Workers need no AppData: every job carries
+its packed instance (optimizer.pack_instance).
+"""
+
+from . import optimizer   # imports CVXPY and HiGHS
+
+__all__ = ["optimizer"]
@@ -3,16 +3,21 @@ FastAPI application for Botswana Antimicrobial Supply Chain Optimization.
 """
 
 import os
+import time
 from contextlib import asynccontextmanager
 
 from fastapi import FastAPI
 from fastapi.middleware.cors import CORSMiddleware
 
 from fastapi import Request
-from fastapi.responses import JSONResponse
+from fastapi.responses import JSONResponse, PlainTextResponse
 
 from .core.data_loader import app_data
 from .core.auth import init_db, verify_token
+from .core.admission import admission
+from .core.jobs import job_manager
+from .core.metrics import REQUEST_SECONDS, Gauge, render_metrics
+from .core.solver_pool import solver_pool
 from .api.routes import router
 from .api.auth_routes import auth_router
 
@@ -37,8 +42,12 @@ async def lifespan(app: FastAPI):
     print("Loading data...")
     app_data.load()
     print(f"Data loaded: {app_data.get_facility_summary()['total_facilities']} facilities")
+    # Start the solver processes now so the first solve does not wait for them
+    solver_pool.start()
     yield
-    # Shutdown: nothing to clean up
+    # Shutdown: stop the solver and job workers
+    solver_pool.shutdown()
+    job_manager.shutdown()
 
 
 app = FastAPI(
@@ -93,6 +102,43 @@ async def auth_middleware(request: Request, call_next):
 
     return await call_next(request)
 
+
+# Registered after auth_middleware, so it wraps it and times rejected requests too
+@app.middleware("http")
+async def metrics_middleware(request: Request, call_next):
+    t0 = time.perf_counter()
+    status = 500
+    try:
+        response = await call_next(request)
+        status = response.status_code
+        return response
+    finally:
+        # Label by route template, not raw path, to keep the series bounded
+        route = request.scope.get("route")
+        REQUEST_SECONDS.observe(time.perf_counter() - t0, request.method,
+                                getattr(route, "path", "unmatched"), str(status))
+
+
+Gauge("kaelo_solver_workers_busy", "Solver-pool processes running a solve",
+      lambda: solver_pool.stats()["busy"])
+Gauge("kaelo_solver_queue_length", "Solves waiting for a solver-pool process",
+      lambda: solver_pool.stats()["queued"])
+Gauge("kaelo_jobs_running", "Background jobs running",
+      lambda: job_manager.stats()["busy"])
+Gauge("kaelo_jobs_queued", "Background jobs waiting for a worker",
+      lambda: job_manager.stats()["queued"])
+Gauge("kaelo_admission_memory_in_use_mb", "Memory budget held by admitted solves",
+      lambda: admission.stats()["memory_in_use_mb"])
+Gauge("kaelo_admission_queued", "Solves waiting for memory-budget admission",
+      lambda: admission.stats()["queued"])
+
+
+# Outside /api/, so the auth middleware lets scrapers through
+@app.get("/metrics", include_in_schema=False)
+def metrics():
+    return PlainTextResponse(render_metrics(), media_type="text/plain; version=0.0.4")
+
+
 # In production, serve the built frontend from the backend
 _static_dir = os.path.join(os.path.dirname(__file__), "..", "frontend", "dist")
 if os.path.isdir(_static_dir):
@@ -0,0 +1,55 @@
+"""Shared fixtures for the backend tests: a small synthetic region in the layout of build_region_instance."""
+
+import os
+import sys
+from pathlib import Path
+
+import numpy as np
+import pandas as pd
+import pytest
+
+sys.path.insert(0, str(Path(__file__).resolve().parents[3]))
+
+# Every solve records telemetry; switch it off before the app modules read the setting
+os.environ.setdefault("KAELO_TELEMETRY_ROWS", "0")
+
+
+def make_region(n_hosp: int = 2, n_clin: int = 4, K: int = 3, seed: int = 0) -> dict:
+    """
+    Warehouse -> hospitals -> clinics, plus non-adaptive clinic -> hospital
+    return arcs from the first two clinics. Demand is rank-1 as in the
+    real instances, with the warehouse row zero.
+    """
+    rng = np.random.default_rng(seed)
+    hosp = [f"H{i}" for i in range(n_hosp)]
+    clin = [f"C{i}" for i in range(n_clin)]
+    nodes = ["WH", *hosp, *clin]
+    tiers = {"WH": "warehouse", **{h: "hospital" for h in hosp}, **{c: "clinic" for c in clin}}
+    D = rng.uniform(5, 200, size=(len(nodes), len(nodes)))
+    D = (D + D.T) / 2
+    np.fill_diagonal(D, 0.0)
+    dist_km = pd.DataFrame(D, index=nodes, columns=nodes)
+    arcs = ([("WH", h) for h in hosp] + [(h, c) for h in hosp for c in clin]
+            + [(c, h) for c in clin[:2] for h in hosp])
+    arc_df = pd.DataFrame({
+        "u": [i for i, _ in arcs], "v": [j for _, j in arcs],
+        "u_tier": [tiers[i] for i, _ in arcs], "v_tier": [tiers[j] for _, j in arcs],
+        "dist_km": [dist_km.loc[i, j] for i, j in arcs], "time_min": 1.0,
+    })
+    classes = [f"D{k}" for k in range(K)]
+    shares = np.r_[0.0, rng.uniform(0.5, 2.0, size=len(nodes) - 1)]
+    mu_mat = pd.DataFrame(np.outer(shares, rng.uniform(5, 50, size=K)),
+                          index=nodes, columns=classes)
+    return {
+        "region": "Synth", "CMS": "WH", "nodes": nodes, "classes": classes, "arcs": arcs,
+        "arc_df": arc_df, "dist_km": dist_km, "mu_mat": mu_mat,
+        "sigma_mat": np.sqrt(mu_mat + mu_mat ** 2 / 10.0),
+        "arc_cap": 200.0, "storage_cap_per_node": None,
+        "proc_cost": pd.Series(rng.uniform(1, 10, size=K), index=classes),
+    }
+
+
+@pytest.fixture
+def region(request):
+    """make_region() with the seed given by indirect parametrization, 0 otherwise."""
+    return make_region(seed=getattr(request, "param", 0))
@@ -0,0 +1,104 @@
+"""Admission control: solves are sized up front and share one memory budget."""
+
+import threading
+import time
+
+import pytest
+
+from app.backend.core.admission import (
+    AdmissionController, AdmissionRejected, Estimate, estimate, estimate_instance, lp_variables,
+)
+
+MB = 2**20
+
+
+def test_estimates_scale_with_the_model():
+    nominal, robust, adr = (lp_variables(40, 300, 20, s) for s in ("nominal", "static_robust", "adr"))
+    assert nominal < robust < adr
+    assert lp_variables(40, 300, 20, "adr", horizon=3) == 3 * adr
+    assert lp_variables(40, 300, 20, "adr", cross_rows=100) < adr
+    assert estimate(40, 300, 20, "adr", periods=12).seconds == pytest.approx(
+        12 * estimate(40, 300, 20, "adr").seconds)
+
+
+def test_adr_counts_adaptive_arcs(region):
+    # warehouse -> hospital and hospital -> clinic arcs adapt; clinic -> hospital returns do not
+    n_adaptive = sum(1 for r in region["arc_df"].itertuples() if r.u_tier != "clinic")
+    N, m, K = len(region["nodes"]), len(region["arcs"]), len(region["classes"])
+    assert n_adaptive < m
+    assert estimate_instance(region, "adr") == estimate(N, m, K, "adr", cross_rows=n_adaptive)
+    assert estimate_instance(region, "nominal") == estimate(N, m, K, "nominal")
+
+
+def hold(controller, est, entered, release, **kwargs):
+    def run():
+        with controller.admit(est, **kwargs):
+            entered.set()
+            release.wait(5)
+    thread = threading.Thread(target=run)
+    thread.start()
+    return thread
+
+
+def test_queues_until_memory_is_free():
+    controller = AdmissionController(budget_mb=100, max_queue=4, max_wait_s=60)
+    first_in, second_in, release = threading.Event(), threading.Event(), threading.Event()
+    first = hold(controller, Estimate(60 * MB, 1.0), first_in, release)
+    assert first_in.wait(5)
+    second = hold(controller, Estimate(60 * MB, 1.0), second_in, release)
+    deadline = time.monotonic() + 5
+    while controller.stats()["queued"] != 1:
+        assert time.monotonic() < deadline
+        time.sleep(0.01)
+    assert not second_in.is_set()
+    assert controller.stats()["memory_in_use_mb"] == 60
+
+    release.set()
+    assert second_in.wait(5)
+    first.join(5)
+    second.join(5)
+    assert controller.stats()["running"] == 0 and controller.stats()["memory_in_use_mb"] == 0
+
+
+def test_rejects_when_the_wait_is_too_long():
+    controller = AdmissionController(budget_mb=100, max_queue=4, max_wait_s=5)
+    entered, release = threading.Event(), threading.Event()
+    thread = hold(controller, Estimate(80 * MB, 60.0), entered, release)
+    assert entered.wait(5)
+    with pytest.raises(AdmissionRejected) as e:
+        controller.check(Estimate(40 * MB, 1.0))
+    assert e.value.retry_after > 5
+    controller.check(Estimate(10 * MB, 1.0))   # fits alongside
+    release.set()
+    thread.join(5)
+
+
+def test_rejects_when_the_queue_is_full():
+    controller = AdmissionController(budget_mb=100, max_queue=0, max_wait_s=60)
+    entered, release = threading.Event(), threading.Event()
+    thread = hold(controller, Estimate(80 * MB, 1.0), entered, release)
+    assert entered.wait(5)
+    with pytest.raises(AdmissionRejected):
+        with controller.admit(Estimate(40 * MB, 1.0)):
+            pass
+    release.set()
+    thread.join(5)
+
+
+def test_oversized_request_runs_alone():
+    controller = AdmissionController(budget_mb=100, max_queue=4, max_wait_s=60)
+    with controller.admit(Estimate(500 * MB, 1.0)):
+        assert controller.stats()["memory_in_use_mb"] == 100
+
+
+def test_cancelled_waiter_gives_up_its_place():
+    controller = AdmissionController(budget_mb=100, max_queue=4, max_wait_s=60)
+    entered, release = threading.Event(), threading.Event()
+    thread = hold(controller, Estimate(80 * MB, 1.0), entered, release)
+    assert entered.wait(5)
+    with pytest.raises(AdmissionRejected, match="Cancelled"):
+        with controller.admit(Estimate(40 * MB, 1.0), cancelled=lambda: True):
+            pass
+    assert controller.stats()["queued"] == 0
+    release.set()
+    thread.join(5)
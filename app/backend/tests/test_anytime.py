@@ -0,0 +1,69 @@
+"""Integer truck counts, solver time limits and the incumbents they leave behind."""
+
+from types import SimpleNamespace
+
+import highspy
+import numpy as np
+import pandas as pd
+import pytest
+
+from app.backend.core.highs_direct import incumbent
+from app.backend.core.optimizer import (
+    get_compiled_problem, run_planning, run_simulation, summarize_simulation,
+)
+
+BACKENDS = ["cvxpy", "highs_direct"]
+
+
+def kwargs(region):
+    return dict(Gamma=2.0, shortage_penalty=50.0, procurement_cost=region["proc_cost"])
+
+
+@pytest.mark.parametrize("backend", BACKENDS)
+def test_integer_trucks(region, backend):
+    lp = run_planning(region, "static_robust", backend=backend, use_cache=False,
+                      **kwargs(region))
+    mip = run_planning(region, "static_robust", backend=backend, integer=True,
+                       **kwargs(region))
+    assert mip["status"] == "optimal" and mip["gap"] == pytest.approx(0.0, abs=1e-4)
+    assert mip["incumbent"] == pytest.approx(mip["summary"]["total_cost"], abs=0.01)
+    assert mip["summary"]["total_cost"] >= lp["summary"]["total_cost"]
+
+    lam = get_compiled_problem(region, "static_robust", region["classes"], backend=backend,
+                               integer=True).values()["lam"]
+    np.testing.assert_allclose(lam, np.round(lam), atol=1e-6)
+
+
+@pytest.mark.parametrize("backend", BACKENDS)
+def test_time_limit_without_incumbent(region, backend):
+    plan = run_planning(region, "adr", backend=backend, integer=True, time_limit_s=0.0,
+                        use_cache=False, **kwargs(region))
+    assert plan["status"] == "time_limit" and plan["shipments"] == []
+
+    # Without a deadline a period at its time limit is reported and the run goes on
+    df = run_simulation(region, "nominal", T=2, backend=backend, integer=True,
+                        time_limit_s=0.0, use_cache=False, **kwargs(region))
+    assert df["status"].tolist() == ["time_limit", "time_limit"]
+    assert df["objective"].isna().all()
+
+
+def test_incumbent():
+    feasible = int(highspy.SolutionStatus.kSolutionStatusFeasible)
+    info = SimpleNamespace(primal_solution_status=feasible, objective_function_value=90.0,
+                           mip_dual_bound=80.0, mip_gap=0.125)
+    assert incumbent(info, True, offset=10.0) == (
+        "feasible", {"incumbent": 100.0, "bound": 90.0, "gap": 0.125})
+    assert incumbent(info, False) == ("feasible", {"incumbent": 90.0, "bound": None, "gap": None})
+    info.primal_solution_status = int(highspy.SolutionStatus.kSolutionStatusNone)
+    assert incumbent(info, True) == ("time_limit", None)
+
+
+def test_feasible_periods_count_as_solved():
+    rows = [{"t": t, "status": s, "objective": 10.0, "transport_cost": 1.0,
+             "shortage_cost": 1.0, "holding_cost": 1.0, "procurement_cost": 1.0,
+             "unmet_pct": 5.0}
+            for t, s in enumerate(["optimal", "feasible", "time_limit"])]
+    rows[2].update(objective=None, unmet_pct=None)
+    summary = summarize_simulation(pd.DataFrame(rows))
+    assert summary["periods_solved"] == 2 and summary["periods_at_limit"] == 1
+    assert summary["periods_failed"] == 1 and summary["total_cost"] == 20.0
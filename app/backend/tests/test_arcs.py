@@ -0,0 +1,74 @@
+"""build_arcs must return the arc table of the per-node loop it replaced, row for row."""
+
+import numpy as np
+import pandas as pd
+import pytest
+
+from app.backend.core.optimizer import build_arcs
+
+ALLOWED = {
+    "with_hospitals": {"warehouse": ["hospital"], "hospital": ["clinic", "health_post"],
+                       "clinic": ["hospital"], "health_post": ["hospital"]},
+    "without_hospitals": {"warehouse": ["clinic", "health_post"],
+                          "hospital": ["clinic", "health_post"],
+                          "clinic": [], "health_post": []},
+}
+
+
+def legacy_arcs(nodes_region, tier_map, D_region, T_region, allowed) -> pd.DataFrame:
+    """The arc loop build_region_instance used before build_arcs."""
+    rows = []
+    for u in nodes_region:
+        u_tier = tier_map.get(u)
+        if u_tier is None:
+            continue
+        for v_tier in allowed.get(u_tier, []):
+            cand = [v for v in nodes_region if v != u and tier_map.get(v) == v_tier]
+            if not cand:
+                continue
+            dists = D_region.loc[u, cand].astype(float).replace(
+                [np.inf, -np.inf], np.nan
+            ).dropna()
+            for v, dist_val in dists.items():
+                dv = float(dist_val.iloc[0]) if isinstance(dist_val, pd.Series) else float(dist_val)
+                tv = T_region.loc[u, v]
+                time_val = float(tv.iloc[0]) if isinstance(tv, pd.Series) else float(tv)
+                if pd.isna(time_val) or np.isinf(time_val):
+                    continue
+                rows.append({
+                    "u": u, "v": v, "u_tier": u_tier, "v_tier": v_tier,
+                    "dist_km": dv / 1000.0,
+                    "time_min": time_val / 60.0,
+                })
+    return pd.DataFrame(rows).drop_duplicates(subset=["u", "v"]).reset_index(drop=True)
+
+
+@pytest.mark.parametrize("allowed", ALLOWED.values(), ids=ALLOWED.keys())
+@pytest.mark.parametrize("seed", [0, 1, 2])
+def test_matches_legacy_loop(allowed, seed):
+    rng = np.random.default_rng(seed)
+    n = 30
+    # Shuffled names so row order is not alphabetical; one node has no tier
+    nodes = [f"F{i:02d}" for i in rng.permutation(n)]
+    tiers = rng.choice(["warehouse", "hospital", "clinic", "health_post"], size=n,
+                       p=[0.1, 0.2, 0.4, 0.3])
+    tier_map = {v: t for v, t in zip(nodes[1:], tiers[1:])}
+    D = rng.uniform(1e3, 2e5, size=(n, n)).astype(np.float32)
+    T = (D / 15.0).astype(np.float32)
+    D[rng.random((n, n)) < 0.1] = np.inf       # unreachable by road
+    T[rng.random((n, n)) < 0.1] = np.nan       # no OSRM duration
+    np.fill_diagonal(D, 0.0)
+
+    ref = legacy_arcs(nodes, tier_map, pd.DataFrame(D, index=nodes, columns=nodes),
+                      pd.DataFrame(T, index=nodes, columns=nodes), allowed)
+    got = build_arcs(nodes, tier_map, D, T, allowed)
+    assert len(ref) > 0
+    pd.testing.assert_frame_equal(got, ref, check_dtype=False)
+
+
+def test_no_arcs():
+    D = np.full((2, 2), 5e3)
+    got = build_arcs(["A", "B"], {"A": "clinic", "B": "clinic"}, D, D,
+                     ALLOWED["without_hospitals"])
+    assert got.empty
+    assert list(got.columns) == ["u", "v", "u_tier", "v_tier", "dist_km", "time_min"]
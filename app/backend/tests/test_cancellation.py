@@ -0,0 +1,70 @@
+"""Deadlines and cancellation stop a run between periods and keep what finished."""
+
+import time
+from types import SimpleNamespace
+
+from app.backend.core import optimizer
+from app.backend.core.jobs import JobCancelled, JobManager
+
+
+def drain(gen):
+    """(items, return value) of a generator."""
+    items = []
+    while True:
+        try:
+            items.append(next(gen))
+        except StopIteration as stop:
+            return items, stop.value
+
+
+def test_deadline_stops_between_periods(region, monkeypatch):
+    ticks = iter(range(1000))
+    monkeypatch.setattr(optimizer, "time", SimpleNamespace(
+        time=lambda: float(next(ticks)), perf_counter=time.perf_counter))
+    rows, status = drain(optimizer.iter_simulation(region, "nominal", T=6, use_cache=False,
+                                                   deadline=1.5))
+    assert status == "time_limit"
+    assert [r["t"] for r in rows] == [0, 1]
+
+    rows, status = drain(optimizer.iter_simulation(region, "nominal", T=3, use_cache=False))
+    assert status == "completed" and len(rows) == 3
+
+
+def test_closing_the_run_releases_the_model(region):
+    model = optimizer.get_compiled_problem(region, "nominal", region["classes"], use_cache=False)
+    gen = optimizer.iter_simulation(region, "nominal", T=4, model=model)
+    next(gen)
+    gen.close()
+    assert model.lock.acquire(blocking=False)
+    model.lock.release()
+
+
+def slow_periods(n):
+    done = []
+    try:
+        for t in range(n):
+            time.sleep(0.2)
+            done.append(t)
+            yield t
+    except JobCancelled:
+        return {"status": "cancelled", "periods": done}
+    return {"status": "completed", "periods": done}
+
+
+def test_cancelled_job_keeps_its_partial_result():
+    jobs = JobManager(workers=1, name="test")
+    try:
+        job_id = jobs.submit(slow_periods, 50)
+        deadline = time.monotonic() + 30
+        while len(jobs.get(job_id)["progress"]) < 2:
+            assert time.monotonic() < deadline
+            time.sleep(0.05)
+        jobs.cancel(job_id)
+        while jobs.get(job_id)["status"] != "cancelled":
+            assert time.monotonic() < deadline
+            time.sleep(0.05)
+        result = jobs.get(job_id)["result"]
+        assert result["status"] == "cancelled"
+        assert 2 <= len(result["periods"]) < 50
+    finally:
+        jobs.shutdown()
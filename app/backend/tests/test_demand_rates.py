@@ -0,0 +1,91 @@
+"""The precomputed demand-rate tensor must reproduce the per-request merge chain it replaced."""
+
+import numpy as np
+import pandas as pd
+
+from app.backend.core.data_loader import build_demand_rate_tensor
+from app.backend.core.optimizer import expected_class_counts_by_facility
+
+AGE_MAP = {"0-4 years": "0-4", "5-14 years": "5-14"}
+
+
+def artifacts(rng):
+    """GLM artifact tables with the raw labels and stray whitespace of the real files."""
+    ages_raw = ["0-4 years", "5-14 years", "15+"]
+    statuses = ["Infected ", "not infected"]
+    pi = pd.DataFrame([(a, s, p) for a in ages_raw for s, p in zip(statuses, [0.3, 0.7])],
+                      columns=["agegroup", "infectionstatus", "pi_inf_given_a"])
+    m_ak = pd.DataFrame([(a, s, rng.uniform(0.1, 2.0)) for a in ages_raw for s in statuses],
+                        columns=["agegroup", "infectionstatus", "m_ak"])
+    m_ak.loc[5, "m_ak"] = np.nan                        # missing multiplier
+    m_ak["extra"] = "ignored"
+    rows = []
+    for a in ["0-4", "5-14", "15+"]:
+        for s in ["infected", "not infected"]:
+            for h in ["Clinic", "District Hospital "]:
+                for c in ["Penicillins", "Macrolides", " Tetracyclines"]:
+                    if (a, c) == ("15+", "Macrolides"):
+                        continue                        # combination absent from the GLM
+                    rows.append((a, s, h, c, rng.uniform(0, 0.5)))
+    p_class = pd.DataFrame(rows, columns=["agegroup", "infectionstatus", "hospital_type",
+                                          "Class", "p_class"])
+    return p_class, m_ak, pi
+
+
+def legacy_counts(pop_fac_age_df, p_class, m_ak, pi_inf_given_a, age_map):
+    """expected_class_counts_by_facility before the tensor, with the tables passed in."""
+    df = pop_fac_age_df.copy()
+    df["patient_days"] = pd.to_numeric(df["patient_days"], errors="coerce").fillna(0.0)
+
+    pi_tmp = pi_inf_given_a.copy()
+    pi_tmp["agegroup"] = pi_tmp["agegroup"].replace(age_map)
+    pi_tmp["infectionstatus"] = pi_tmp["infectionstatus"].astype(str).str.strip().str.lower()
+    df["agegroup"] = df["agegroup"].astype(str).str.strip()
+    df = df.merge(pi_tmp, on="agegroup", how="left")
+    df["infectionstatus"] = df["infectionstatus"].astype(str).str.strip().str.lower()
+    df["patients_ak"] = df["patient_days"] * df["pi_inf_given_a"]
+
+    m_tmp = m_ak.copy()
+    m_tmp["agegroup"] = m_tmp["agegroup"].replace(age_map)
+    m_tmp["infectionstatus"] = m_tmp["infectionstatus"].astype(str).str.strip().str.lower()
+    df = df.merge(
+        m_tmp[["agegroup", "infectionstatus", "m_ak"]],
+        on=["agegroup", "infectionstatus"], how="left",
+    )
+    df["n_akh"] = df["patients_ak"] * df["m_ak"]
+
+    p_tmp = p_class.copy()
+    for col in ["agegroup", "infectionstatus", "hospital_type", "Class"]:
+        if col in p_tmp.columns:
+            p_tmp[col] = p_tmp[col].astype(str).str.strip()
+    df["hospital_type"] = df["hospital_type"].astype(str).str.strip()
+    df = df.merge(p_tmp, on=["agegroup", "infectionstatus", "hospital_type"], how="left")
+    df["expected_count"] = df["n_akh"] * df["p_class"]
+
+    return df.groupby(
+        ["facility_name", "facility_type", "Class"], as_index=False
+    )["expected_count"].sum()
+
+
+def test_tensor_matches_merge_chain():
+    rng = np.random.default_rng(3)
+    p_class, m_ak, pi = artifacts(rng)
+    facilities = [("Clinic A", "clinic", "Clinic"), ("Hospital B", "hospital", "District Hospital"),
+                  ("Post C", "health_post", " Clinic")]
+    rows = [(f, t, age, h, days)
+            for f, t, h in facilities
+            for age, days in zip(["0-4", "5-14 ", "15+"], rng.uniform(10, 500, size=3))]
+    rows.append(("Post C", "health_post", "0-4", "Mobile", 50.0))     # unknown hospital type
+    rows.append(("Post D", "health_post", "15+", "Clinic", "n/a"))    # unparseable days
+    pop = pd.DataFrame(rows, columns=["facility_name", "facility_type", "agegroup",
+                                      "hospital_type", "patient_days"])
+
+    rates = build_demand_rate_tensor(p_class, m_ak, pi, AGE_MAP)
+    got = expected_class_counts_by_facility(pop, rates)
+    ref = legacy_counts(pop, p_class, m_ak, pi, AGE_MAP)
+
+    key = ["facility_name", "facility_type", "Class"]
+    got = got.sort_values(key).reset_index(drop=True)
+    ref = ref.sort_values(key).reset_index(drop=True)
+    pd.testing.assert_frame_equal(got, ref, check_dtype=False)
+    assert ("Post D", "Macrolides") not in set(zip(got["facility_name"], got["Class"]))
@@ -0,0 +1,31 @@
+"""CompiledProblem's sparse incidence and selector matrices, against the dense loops they replaced."""
+
+import numpy as np
+import scipy.sparse as sp
+
+from app.backend.core.optimizer import get_compiled_problem
+
+
+def test_matrices_match_dense_loops(region):
+    model = get_compiled_problem(region, "adr", region["classes"], use_cache=False)
+    N, m = model.N, model.m
+    node_idx = model.node_idx
+
+    A_in, A_out = np.zeros((N, m)), np.zeros((N, m))
+    for a, (i, j) in enumerate(region["arcs"]):
+        A_out[node_idx[i], a] = 1.0
+        A_in[node_idx[j], a] = 1.0
+    cms_mask = np.zeros((N, 1))
+    cms_mask[node_idx[region["CMS"]]] = 1.0
+    A_in_adapt = np.zeros((N, m))
+    S_out = np.zeros((N, len(model.A_adapt)))
+    for p, a in enumerate(model.A_adapt):
+        A_in_adapt[model.arc_dest_idx[a], a] = 1.0
+        S_out[model.arc_src_idx[a], p] = 1.0
+
+    for got, ref in ((model.A_in, A_in), (model.A_out, A_out), (model.cms_mask, cms_mask),
+                     (model.A_in_adapt, A_in_adapt), (model.S_out, S_out)):
+        assert sp.issparse(got)
+        np.testing.assert_array_equal(got.toarray(), ref)
+    # The clinic -> hospital return arcs are not adaptive
+    assert 0 < len(model.A_adapt) < m
@@ -0,0 +1,67 @@
+"""AppData.cached_instance: memoized region instances, invalidated by data edits."""
+
+import threading
+
+from app.backend.core import data_loader
+from app.backend.core.data_loader import AppData
+
+
+def counting_build(result=None):
+    calls = []
+
+    def build():
+        calls.append(1)
+        return {"nodes": ["A", "B"], "arc_cap": 10.0} if result is None else result
+    return build, calls
+
+
+def test_hit_returns_a_copy():
+    data = AppData()
+    build, calls = counting_build()
+    first = data.cached_instance(("Gaborone",), build)
+    first["arc_cap"] = 99.0
+    second = data.cached_instance(("Gaborone",), build)
+    assert len(calls) == 1
+    assert second["arc_cap"] == 10.0
+
+
+def test_bump_version_invalidates():
+    data = AppData()
+    build, calls = counting_build()
+    data.cached_instance(("Gaborone",), build)
+    data.bump_version()
+    data.cached_instance(("Gaborone",), build)
+    assert len(calls) == 2
+
+
+def test_build_racing_an_edit_is_not_cached():
+    data = AppData()
+    building, edited = threading.Event(), threading.Event()
+
+    def slow_build():
+        building.set()
+        edited.wait(5)
+        return {"nodes": ["stale"]}
+
+    thread = threading.Thread(target=data.cached_instance, args=(("Gaborone",), slow_build))
+    thread.start()
+    assert building.wait(5)
+    data.bump_version()
+    edited.set()
+    thread.join(5)
+
+    build, calls = counting_build({"nodes": ["fresh"]})
+    assert data.cached_instance(("Gaborone",), build) == {"nodes": ["fresh"]}
+    assert len(calls) == 1
+
+
+def test_lru_bound(monkeypatch):
+    monkeypatch.setattr(data_loader, "INSTANCE_CACHE_SIZE", 2)
+    data = AppData()
+    build, calls = counting_build()
+    for key in ("A", "B", "A", "C"):      # C evicts B, the least recently used
+        data.cached_instance((key,), build)
+    data.cached_instance(("A",), build)
+    assert len(calls) == 3
+    data.cached_instance(("B",), build)
+    assert len(calls) == 4
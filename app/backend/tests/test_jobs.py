@@ -0,0 +1,81 @@
+"""JobManager: background jobs in worker processes, with progress and bounded queueing."""
+
+import os
+import signal
+import time
+
+import pytest
+
+from app.backend.core.jobs import JobFailed, JobManager, JobQueueFull
+
+
+def periods(n, fail_at=None):
+    for t in range(n):
+        if t == fail_at:
+            raise ValueError(f"period {t} infeasible")
+        yield {"t": t}
+    return {"periods": n}
+
+
+def add(a, b):
+    return a + b
+
+
+def die():
+    os.kill(os.getpid(), signal.SIGKILL)
+
+
+def pid():
+    return os.getpid()
+
+
+@pytest.fixture
+def jobs():
+    manager = JobManager(workers=1, max_queued=2, name="test")
+    yield manager
+    manager.shutdown()
+
+
+def wait_until(check, timeout=30):
+    deadline = time.monotonic() + timeout
+    while not check():
+        assert time.monotonic() < deadline
+        time.sleep(0.05)
+
+
+def test_progress_and_result(jobs):
+    assert jobs.run(add, 2, 3) == 5
+    job_id = jobs.submit(periods, 3, kind="optimize", meta={"region": "Synth"})
+    assert list(jobs.follow(job_id)) == [{"t": 0}, {"t": 1}, {"t": 2}]
+    assert jobs.get(job_id) is None      # follow() drops the record
+
+    job_id = jobs.submit(periods, 2)
+    wait_until(lambda: jobs.get(job_id)["status"] == "completed")
+    job = jobs.get(job_id)
+    assert job["result"] == {"periods": 2} and len(job["progress"]) == 2
+
+
+def test_failure_is_reported(jobs):
+    job_id = jobs.submit(periods, 5, fail_at=2)
+    with pytest.raises(JobFailed, match="period 2 infeasible"):
+        list(jobs.follow(job_id))
+
+
+def test_queue_is_bounded(jobs):
+    running = jobs.submit(time.sleep, 2)
+    wait_until(lambda: jobs.get(running)["status"] == "running")
+    queued = [jobs.submit(add, i, 1) for i in range(2)]
+    with pytest.raises(JobQueueFull):
+        jobs.submit(add, 0, 0)
+    assert jobs.cancel(queued[0])["status"] == "cancelled"
+    jobs.submit(add, 0, 0)
+    assert jobs.stats() == {"workers": 1, "busy": 1, "queued": 2}
+
+
+def test_dead_worker_fails_its_job_and_is_replaced(jobs):
+    first = jobs.run(pid)
+    job_id = jobs.submit(die)
+    with pytest.raises(JobFailed, match="worker exited"):
+        list(jobs.follow(job_id))
+    assert jobs.run(add, 1, 1) == 2
+    assert jobs.run(pid) != first
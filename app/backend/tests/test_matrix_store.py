@@ -0,0 +1,58 @@
+"""AppData's distance/time store: deduplicated float32 arrays indexed by node name."""
+
+import numpy as np
+import pandas as pd
+import pytest
+
+from app.backend.core import data_loader
+from app.backend.core.data_loader import AppData
+
+
+@pytest.fixture
+def data(tmp_path, monkeypatch):
+    """AppData with only the matrices loaded, from CSVs with a duplicated, padded label."""
+    names = ["\ufeffWH", "H1", "C1  Clinic", "H1", "C2"]
+    dist = np.arange(25, dtype=float).reshape(5, 5) * 100.0
+    processed = tmp_path / "data" / "processed"
+    processed.mkdir(parents=True)
+    pd.DataFrame(dist, index=names, columns=names).to_csv(
+        processed / "distance_matrix_named.csv")
+    pd.DataFrame(dist / 10.0, index=names, columns=names).to_csv(
+        processed / "duration_matrix_named.csv")
+    monkeypatch.setattr(data_loader, "BASE_DIR", tmp_path)
+    data = AppData()
+    data._load_matrices()
+    return data
+
+
+def test_load_dedupes_and_cleans(data):
+    assert data.matrix_nodes == ["WH", "H1", "C1 Clinic", "C2"]
+    assert data.dist_matrix.dtype == np.float32 and data.dist_matrix.shape == (4, 4)
+    # The first H1 row and column are kept
+    assert data.dist_matrix[1, 0] == 500.0 and data.dist_matrix[0, 1] == 100.0
+    assert data.dist_matrix[3, 3] == 2400.0
+
+
+def test_slice_follows_the_requested_order(data):
+    D, T = data.matrix_slice(["C2", "WH"])
+    np.testing.assert_array_equal(D, [[2400.0, 2000.0], [400.0, 0.0]])
+    np.testing.assert_array_equal(T, D / 10.0)
+
+
+def test_update_and_remove(data):
+    data.update_matrix_node("C3", {"WH": 7.0, "H1": 8.0}, {"WH": 0.7, "H1": 0.8})
+    assert data.has_matrix_node("C3")
+    D, _ = data.matrix_slice(["C3", "WH", "C2"])
+    assert D[0, 0] == 0.0 and D[0, 1] == D[1, 0] == 7.0
+    assert np.isinf(D[0, 2]) and np.isinf(D[2, 0])       # not given: unreachable
+
+    data.update_matrix_node("WH", {"C2": 1.0}, {"C2": 0.1})
+    assert data.matrix_slice(["WH", "C2"])[0][0, 1] == 1.0
+    assert data.matrix_slice(["WH", "H1"])[0][0, 1] == 100.0   # untouched
+
+    data.remove_matrix_node("H1")
+    assert data.matrix_nodes == ["WH", "C1 Clinic", "C2", "C3"]
+    assert data.dist_matrix.shape == (4, 4)
+    assert data.matrix_slice(["C3", "WH"])[0][0, 1] == 7.0
+    D_df, _ = data.matrix_frames()
+    assert list(D_df.index) == data.matrix_nodes
@@ -0,0 +1,62 @@
+"""/optimize/national: every region solved through the pool, then national totals."""
+
+import json
+
+import pytest
+from fastapi import FastAPI, HTTPException
+from fastapi.testclient import TestClient
+
+from app.backend.api import routes
+from app.backend.core.optimizer import combine_simulations
+from app.backend.core.result_cache import ResultCache
+
+
+def row(t, status="optimal", cost=1.0):
+    return {"t": t, "status": status, "objective": cost, "transport_cost": cost,
+            "shortage_cost": 0.0, "holding_cost": 0.0, "procurement_cost": 0.0,
+            "total_unmet": cost, "total_demand": 10.0}
+
+
+def test_combine_simulations():
+    periods = combine_simulations([[row(0), row(1)], [row(0, cost=2.0), row(1, "infeasible")]])
+    assert [p["status"] for p in periods] == ["optimal", "incomplete"]
+    assert [p["regions_solved"] for p in periods] == [2, 1]
+    assert periods[0]["objective"] == 3.0 and periods[0]["unmet_pct"] == 15.0
+    assert periods[1]["objective"] == 1.0 and periods[1]["total_demand"] == 10.0
+    assert combine_simulations([[], []]) == []
+
+
+@pytest.fixture
+def client(region, tmp_path, monkeypatch):
+    def instance(req):
+        if req.region == "Nowhere":
+            raise HTTPException(400, "Unknown region 'Nowhere'")
+        return region
+
+    monkeypatch.setattr(routes, "_optimization_instance", instance)
+    monkeypatch.setattr(routes, "result_cache", ResultCache(tmp_path / "r.db", max_entries=0))
+    app = FastAPI()
+    app.include_router(routes.router)
+    with TestClient(app) as client:
+        yield client
+
+
+def test_regions_then_national_totals(client):
+    body = {"regions": ["Alpha", "Beta", "Nowhere"], "strategy": "nominal", "periods": 2}
+    with client.stream("POST", "/api/optimize/national", json=body) as response:
+        lines = [json.loads(line) for line in response.iter_lines() if line]
+
+    assert lines[0] == {"type": "region", "region": "Nowhere", "status": "failed",
+                        "detail": "Unknown region 'Nowhere'"}
+    solved = {line["region"]: line for line in lines[1:-1]}
+    assert sorted(solved) == ["Alpha", "Beta"]
+    assert all(line["status"] == "completed" for line in solved.values())
+
+    national = lines[-1]
+    assert national["type"] == "national" and national["status"] == "incomplete"
+    assert national["regions"] == {"Alpha": "completed", "Beta": "completed",
+                                   "Nowhere": "failed"}
+    assert [p["regions_solved"] for p in national["periods"]] == [2, 2]
+    for p, a, b in zip(national["periods"], solved["Alpha"]["periods"],
+                       solved["Beta"]["periods"]):
+        assert p["objective"] == pytest.approx(a["objective"] + b["objective"])
@@ -0,0 +1,46 @@
+"""Compiled problems are cached by instance structure and reused across runs."""
+
+import pytest
+
+from app.backend.core import optimizer
+from app.backend.core.optimizer import clear_problem_cache, get_compiled_problem, run_simulation
+
+
+@pytest.fixture(autouse=True)
+def empty_cache():
+    clear_problem_cache()
+    yield
+    clear_problem_cache()
+
+
+def test_same_structure_shares_one_model(region):
+    model = get_compiled_problem(region, "nominal", region["classes"])
+    # Data (demand, costs, capacities) is not part of the structure
+    other_data = {**region, "arc_cap": 50.0, "mu_mat": region["mu_mat"] * 3}
+    assert get_compiled_problem(other_data, "nominal", region["classes"]) is model
+
+    for changed in (dict(strategy="static_robust"), dict(horizon=2),
+                    dict(backend="highs_direct")):
+        kwargs = {"strategy": "nominal", **changed}
+        assert get_compiled_problem(region, classes=region["classes"], **kwargs) is not model
+    assert get_compiled_problem(region, "nominal", region["classes"][:2]) is not model
+    assert get_compiled_problem(region, "nominal", region["classes"], use_cache=False) is not model
+
+
+def test_cache_is_bounded(region, monkeypatch):
+    monkeypatch.setattr(optimizer, "PROBLEM_CACHE_SIZE", 2)
+    first = get_compiled_problem(region, "nominal", region["classes"])
+    get_compiled_problem(region, "static_robust", region["classes"])
+    get_compiled_problem(region, "adr", region["classes"])
+    assert len(optimizer._problem_cache) == 2
+    assert get_compiled_problem(region, "nominal", region["classes"]) is not first
+
+
+@pytest.mark.parametrize("strategy", ["nominal", "static_robust", "adr"])
+def test_reused_model_gives_the_same_run(region, strategy):
+    kwargs = dict(T=3, Gamma=2.0, shortage_penalty=50.0, procurement_cost=region["proc_cost"])
+    fresh = run_simulation(region, strategy, use_cache=False, **kwargs)
+    run_simulation(region, strategy, seed=5, **kwargs)          # leaves its state in the cache
+    cached = run_simulation(region, strategy, **kwargs)
+    assert optimizer._problem_cache
+    assert cached.equals(fresh)
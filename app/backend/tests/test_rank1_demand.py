@@ -0,0 +1,65 @@
+"""CMS demand stored as rank-1 factors behaves exactly like the dense mu/sigma it stands for."""
+
+import numpy as np
+import pandas as pd
+import pytest
+
+from app.backend.core.optimizer import (
+    demand_arrays, demand_frames, make_nb_draws, pack_instance, run_planning, run_simulation,
+    unpack_instance,
+)
+
+KAPPA = 10.0
+
+
+@pytest.fixture
+def factored(region):
+    """region with its rank-1 mu_mat replaced by the factors, as build_cms_region_instance stores it."""
+    mu = region["mu_mat"].to_numpy()
+    national = mu[1]
+    shares = mu[:, 0] / national[0]
+    inst = {k: v for k, v in region.items() if k not in ("mu_mat", "sigma_mat")}
+    inst["demand_factors"] = {"shares": shares, "national": national / 2.0, "scale": 2.0,
+                              "kappa": KAPPA}
+    return inst
+
+
+def test_arrays_and_frames_match_dense(region, factored):
+    mu, sigma = demand_arrays(factored)
+    np.testing.assert_allclose(mu, region["mu_mat"].to_numpy(), rtol=1e-12)
+    np.testing.assert_allclose(sigma, region["sigma_mat"].to_numpy(), rtol=1e-12)
+    mu_mat, sigma_mat = demand_frames(factored)
+    pd.testing.assert_frame_equal(mu_mat, region["mu_mat"], rtol=1e-12)
+    pd.testing.assert_frame_equal(sigma_mat, region["sigma_mat"], rtol=1e-12)
+
+
+def test_draws_match_one_block_draw(region, factored):
+    mu = region["mu_mat"].to_numpy()
+    block = np.random.default_rng(4).negative_binomial(n=KAPPA, p=KAPPA / (KAPPA + mu),
+                                                       size=(5, *mu.shape))
+    for draws in (make_nb_draws(region["mu_mat"], KAPPA, 5, seed=4),
+                  make_nb_draws(factored["demand_factors"], KAPPA, 5, seed=4)):
+        np.testing.assert_array_equal(np.stack(list(draws)), block)
+
+
+@pytest.mark.parametrize("strategy", ["nominal", "static_robust", "adr"])
+def test_simulation_matches_dense(region, factored, strategy):
+    kwargs = dict(T=3, kappa=KAPPA, Gamma=2.0, shortage_penalty=50.0, use_cache=False,
+                  procurement_cost=region["proc_cost"])
+    ref = run_simulation(region, strategy, **kwargs)
+    pd.testing.assert_frame_equal(run_simulation(factored, strategy, **kwargs), ref, rtol=1e-9)
+    packed = unpack_instance(pack_instance(factored))
+    assert "mu_mat" not in packed and "demand_arrays" not in packed
+    pd.testing.assert_frame_equal(run_simulation(packed, strategy, **kwargs), ref, rtol=1e-9)
+
+
+def test_planning_aggregates_tied_classes(factored):
+    # D0 and D2 tie on both costs, so nominal planning solves them as one class
+    factored["proc_cost"] = pd.Series([3.0, 5.0, 3.0], index=factored["classes"])
+    kwargs = dict(shortage_penalty=50.0, procurement_cost=factored["proc_cost"], use_cache=False)
+    full = run_planning(factored, "nominal", aggregate=False, **kwargs)
+    merged = run_planning(factored, "nominal", **kwargs)
+    assert merged["status"] == full["status"] == "optimal"
+    for key in ("total_cost", "total_transport_cost", "total_procurement_cost",
+                "total_units_procured"):
+        assert merged["summary"][key] == pytest.approx(full["summary"][key], abs=0.1), key
@@ -0,0 +1,60 @@
+"""ResultCache: keyed by request and data, LRU-evicted, stale entries purged on write."""
+
+import itertools
+
+import pytest
+
+from app.backend.core import result_cache as rc
+from app.backend.core.data_loader import app_data
+
+
+@pytest.fixture
+def cache(tmp_path, monkeypatch):
+    clock = itertools.count(1000.0)
+    monkeypatch.setattr(rc.time, "time", lambda: next(clock))
+    monkeypatch.setattr(app_data, "data_version", 0)
+    return rc.ResultCache(tmp_path / "results.db", max_entries=2, max_mb=1)
+
+
+def test_key_depends_on_request_kind_and_data(monkeypatch):
+    monkeypatch.setattr(app_data, "data_version", 0)
+    req = {"dhmt": "Gaborone", "strategy": "adr", "periods": 12}
+    key = rc.request_key("optimize", req)
+    assert key == rc.request_key("optimize", dict(reversed(list(req.items()))))
+    assert key != rc.request_key("plan", req)
+    assert key != rc.request_key("optimize", {**req, "periods": 6})
+    monkeypatch.setattr(app_data, "data_version", 1)
+    assert key != rc.request_key("optimize", req)
+
+
+def test_round_trip_and_lru(cache):
+    assert cache.get("a") is None
+    cache.put("a", "optimize", {"summary": {"total_cost": 1.5}})
+    cache.put("b", "optimize", {"summary": {"total_cost": 2.5}})
+    assert cache.get("a") == {"summary": {"total_cost": 1.5}}   # now newer than b
+    cache.put("c", "plan", {"shipments": []})
+    assert cache.get("b") is None
+    assert cache.get("a") is not None and cache.get("c") is not None
+
+
+def test_size_limit(cache):
+    cache.max_bytes = 200
+    cache.put("small", "optimize", {"x": 1})
+    cache.put("big", "optimize", {"x": "incompressible" + "".join(map(str, range(400)))})
+    assert cache.get("big") is None
+    assert cache.get("small") == {"x": 1}
+
+
+def test_edit_purges_stale_entries(cache, monkeypatch):
+    cache.put("a", "optimize", {"x": 1})
+    monkeypatch.setattr(app_data, "data_version", 1)
+    cache.put("b", "optimize", {"x": 2})
+    assert cache.get("a") is None
+    assert cache.get("b") == {"x": 2}
+
+
+def test_disabled(tmp_path):
+    cache = rc.ResultCache(tmp_path / "results.db", max_entries=0)
+    cache.put("a", "optimize", {"x": 1})
+    assert cache.get("a") is None
+    assert not (tmp_path / "results.db").exists()
@@ -0,0 +1,130 @@
+"""SingleFlight: concurrent callers with the same key share one call."""
+
+import threading
+import time
+
+from app.backend.core.singleflight import FlightAbandoned, SingleFlight
+
+
+def start_leader(flights, key, fn):
+    """Run flights.do(key, fn) on a thread; returns (thread, out) once fn has started."""
+    started, out = threading.Event(), {}
+
+    def run():
+        def body():
+            started.set()
+            return fn()
+        try:
+            out["value"] = flights.do(key, body)
+        except Exception as e:
+            out["error"] = e
+
+    thread = threading.Thread(target=run)
+    thread.start()
+    assert started.wait(5)
+    return thread, out
+
+
+def wait_for_waiters(flights, key, n):
+    deadline = time.monotonic() + 5
+    while flights.waiters(key) != n:
+        assert time.monotonic() < deadline
+        time.sleep(0.01)
+
+
+def test_followers_share_the_leaders_result():
+    flights, release, calls = SingleFlight(), threading.Event(), []
+
+    def work():
+        calls.append(1)
+        release.wait(5)
+        return {"total_cost": 3.0}
+
+    leader, out = start_leader(flights, "k", work)
+    results = []
+    followers = [threading.Thread(target=lambda: results.append(flights.do("k", work)))
+                 for _ in range(3)]
+    for f in followers:
+        f.start()
+    wait_for_waiters(flights, "k", 3)
+    release.set()
+    for t in (leader, *followers):
+        t.join(5)
+
+    assert len(calls) == 1
+    assert out["value"] == ({"total_cost": 3.0}, False)
+    assert results == [({"total_cost": 3.0}, True)] * 3
+    assert flights.in_flight() == 0
+
+
+def test_followers_get_the_leaders_error():
+    flights, release = SingleFlight(), threading.Event()
+
+    def work():
+        release.wait(5)
+        raise ValueError("infeasible")
+
+    leader, out = start_leader(flights, "k", work)
+    errors = []
+
+    def follow():
+        try:
+            flights.do("k", lambda: "unused")
+        except ValueError as e:
+            errors.append(e)
+
+    follower = threading.Thread(target=follow)
+    follower.start()
+    wait_for_waiters(flights, "k", 1)
+    release.set()
+    leader.join(5)
+    follower.join(5)
+    assert errors == [out["error"]]
+
+
+def test_nothing_is_remembered():
+    flights = SingleFlight()
+    assert flights.do("k", lambda: 1) == (1, False)
+    assert flights.do("k", lambda: 2) == (2, False)
+
+
+def test_follower_that_gives_up_stops_waiting():
+    flights, release, gone = SingleFlight(), threading.Event(), threading.Event()
+    leader, out = start_leader(flights, "k", lambda: release.wait(5) and "done")
+    errors = []
+
+    def follow():
+        try:
+            flights.do("k", lambda: "unused", gave_up=gone.is_set, poll_s=0.01)
+        except FlightAbandoned as e:
+            errors.append(e)
+
+    follower = threading.Thread(target=follow)
+    follower.start()
+    wait_for_waiters(flights, "k", 1)
+    gone.set()
+    follower.join(5)
+    assert len(errors) == 1
+    assert flights.waiters("k") == 0   # the leader may now abandon its run
+    release.set()
+    leader.join(5)
+    assert out["value"] == ("done", False)
+
+
+def test_unshareable_result_is_run_again():
+    flights, release = SingleFlight(), threading.Event()
+    leader, out = start_leader(flights, "k", lambda: release.wait(5) and {"status": "cancelled"})
+    results = []
+
+    def follow():
+        results.append(flights.do("k", lambda: {"status": "completed"},
+                                  shareable=lambda r: r["status"] != "cancelled"))
+
+    follower = threading.Thread(target=follow)
+    follower.start()
+    wait_for_waiters(flights, "k", 1)
+    release.set()
+    leader.join(5)
+    follower.join(5)
+    assert out["value"] == ({"status": "cancelled"}, False)
+    assert results == [({"status": "completed"}, False)]
@@ -0,0 +1,37 @@
+"""Packed instances and the solver process pool give the same answers as in-process solves."""
+
+import numpy as np
+import pandas as pd
+import pytest
+
+from app.backend.core.optimizer import (
+    arc_lengths, pack_instance, run_planning, run_simulation, unpack_instance,
+)
+from app.backend.core.solver_pool import plan, solver_pool
+
+KWARGS = dict(Gamma=2.0, shortage_penalty=50.0, use_cache=False)
+
+
+def test_arc_lengths(region):
+    ref = [region["dist_km"].loc[i, j] for i, j in region["arcs"]]
+    np.testing.assert_array_equal(arc_lengths(region), ref)
+    np.testing.assert_array_equal(arc_lengths(unpack_instance(pack_instance(region))), ref)
+
+
+@pytest.mark.parametrize("strategy", ["nominal", "static_robust", "adr"])
+def test_unpacked_instance_solves_the_same(region, strategy):
+    packed = unpack_instance(pack_instance(region))
+    kwargs = dict(T=3, procurement_cost=region["proc_cost"], **KWARGS)
+    pd.testing.assert_frame_equal(run_simulation(packed, strategy, **kwargs),
+                                  run_simulation(region, strategy, **kwargs))
+    ref = run_planning(region, strategy, **KWARGS)
+    got = run_planning(packed, strategy, **KWARGS)
+    assert got["summary"] == pytest.approx(ref["summary"])
+    assert got["shipments"] == ref["shipments"]
+
+
+def test_pool_plan_matches_in_process(region):
+    ref = run_planning(region, "static_robust", **KWARGS)
+    got = solver_pool.run(plan, pack_instance(region), "static_robust", KWARGS)
+    assert got["summary"] == pytest.approx(ref["summary"])
+    assert got["shipments"] == ref["shipments"]
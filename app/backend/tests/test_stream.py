@@ -0,0 +1,54 @@
+"""/optimize/stream: period lines from the solver pool as they are solved, then a summary line."""
+
+import json
+
+import pytest
+from fastapi import FastAPI
+from fastapi.testclient import TestClient
+
+from app.backend.api import routes
+from app.backend.api.schemas import OptimizationRequest
+from app.backend.core.optimizer import pack_instance
+from app.backend.core.solver_pool import simulate
+
+BODY = {"region": "Synth", "strategy": "static_robust", "periods": 3, "gamma": 2.0, "seed": 1}
+
+
+@pytest.fixture
+def client(region, monkeypatch):
+    monkeypatch.setattr(routes, "_optimization_instance", lambda req: region)
+    app = FastAPI()
+    app.include_router(routes.router)
+    with TestClient(app) as client:
+        yield client
+
+
+def stream(client) -> list[dict]:
+    with client.stream("POST", "/api/optimize/stream", json=BODY) as response:
+        assert response.status_code == 200
+        assert response.headers["content-type"] == "application/x-ndjson"
+        return [json.loads(line) for line in response.iter_lines() if line]
+
+
+def test_streams_the_pooled_run(client, region):
+    lines = stream(client)
+    assert [line["type"] for line in lines] == ["period"] * 3 + ["summary"]
+    assert lines[-1]["status"] == "completed" and lines[-1]["summary"]
+
+    req = OptimizationRequest(**BODY)
+    local = list(simulate(pack_instance(region), req.strategy,
+                          routes._simulation_args(req, region)))
+    for line, row in zip(lines, local):
+        assert line["objective"] is not None
+        assert {k: v for k, v in line.items() if k != "type"} == pytest.approx(row)
+
+
+def test_failure_ends_the_stream_with_an_error_line(client, monkeypatch):
+    def failing(req, instance):
+        yield {"period": 0}
+        raise ValueError("period 1 infeasible")
+
+    monkeypatch.setattr(routes, "_simulate_in_pool", failing)
+    lines = stream(client)
+    assert [line["type"] for line in lines] == ["period", "error"]
+    assert "period 1 infeasible" in lines[-1]["detail"]
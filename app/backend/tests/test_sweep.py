@@ -0,0 +1,40 @@
+"""sweep_parameters reuses one compiled model; every point must match a fresh run."""
+
+import pytest
+
+from app.backend.core.optimizer import run_simulation, summarize_simulation, sweep_parameters
+
+
+def test_points_match_independent_runs(region):
+    gammas, mults = (0.0, 2.0), (1.0, 4.0)
+    kwargs = dict(T=3, procurement_cost=region["proc_cost"])
+    points = sweep_parameters(region, "static_robust", gammas=gammas, penalty_multipliers=mults,
+                              shortage_penalty=20.0, use_cache=False, **kwargs)
+
+    assert [(p["gamma"], p["penalty_multiplier"]) for p in points] == [
+        (g, m) for g in gammas for m in mults]
+    for p in points:
+        ref = summarize_simulation(run_simulation(
+            region, "static_robust", Gamma=p["gamma"],
+            shortage_penalty=20.0 * p["penalty_multiplier"], use_cache=False, **kwargs))
+        assert {k: p[k] for k in ref} == ref
+        assert p["operating_cost"] == pytest.approx(
+            ref["total_cost"] - ref["total_shortage_cost"], abs=0.01)
+
+
+def test_pareto_flags(region):
+    points = sweep_parameters(region, "nominal", gammas=(0.0,),
+                              penalty_multipliers=(0.1, 1.0, 10.0), T=2, use_cache=False)
+    for p in points:
+        dominated = any(
+            o["operating_cost"] <= p["operating_cost"] and o["avg_unmet_pct"] <= p["avg_unmet_pct"]
+            and (o["operating_cost"], o["avg_unmet_pct"]) != (p["operating_cost"], p["avg_unmet_pct"])
+            for o in points
+        )
+        assert p["pareto"] is not dominated
+    assert any(p["pareto"] for p in points)
+
+
+def test_deadline_drops_unfinished_points(region):
+    assert sweep_parameters(region, "nominal", gammas=(0.0, 1.0), T=2,
+                            use_cache=False, deadline=0.0) == []
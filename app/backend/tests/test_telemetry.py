@@ -0,0 +1,68 @@
+"""Solver telemetry rows in SQLite, and the Prometheus text the /metrics route renders."""
+
+import pytest
+
+from app.backend.core import metrics
+from app.backend.core import telemetry as tm
+from app.backend.core.optimizer import run_planning
+
+
+@pytest.fixture
+def store(tmp_path, monkeypatch):
+    store = tm.TelemetryStore(tmp_path / "telemetry.db", max_rows=3)
+    monkeypatch.setattr(tm, "telemetry", store)
+    return store
+
+
+@pytest.mark.parametrize("backend", ["cvxpy", "highs_direct"])
+def test_solves_are_recorded(region, store, backend):
+    run_planning(region, "static_robust", backend=backend, Gamma=2.0, use_cache=False)
+    (row,) = store.query()
+    assert row["kind"] == "plan" and row["status"] == "optimal"
+    assert (row["region"], row["strategy"], row["backend"]) == ("Synth", "static_robust", backend)
+    assert (row["N"], row["m"], row["K"]) == tuple(
+        len(region[k]) for k in ("nodes", "arcs", "classes"))
+    assert row["n_vars"] > 0 and row["nnz"] > 0 and row["solver_s"] >= 0.0
+    assert row["build_s"] > 0.0
+
+
+def test_query_groups_and_prunes(store, monkeypatch):
+    monkeypatch.setattr(tm, "_PRUNE_EVERY", 2)
+    for i, status in enumerate(["optimal", "infeasible", "optimal", "optimal"]):
+        store.record({"ts": 1.7e9 + i, "strategy": "adr" if i else "nominal",
+                      "status": status, "solver_s": float(i), "build_s": 0.0})
+    rows = store.query()
+    assert [r["solver_s"] for r in rows] == [3.0, 2.0, 1.0]     # newest first, oldest pruned
+    assert len(store.query(strategy="adr", limit=1)) == 1
+
+    (adr,) = store.query(group_by=["strategy"])
+    assert adr["strategy"] == "adr" and adr["solves"] == 3 and adr["failed"] == 1
+    assert adr["solver_s_p50"] == 2.0 and adr["solver_s_max"] == 3.0
+    assert adr["build_s_mean"] is None
+
+
+def test_disabled_store_writes_nothing(tmp_path):
+    store = tm.TelemetryStore(tmp_path / "telemetry.db", max_rows=0)
+    store.record({"ts": 0.0, "status": "optimal"})
+    assert not store.path.exists()
+
+
+def test_histogram_and_gauge_render(monkeypatch):
+    monkeypatch.setattr(metrics, "_registry", [])
+    hist = metrics.Histogram("solve_seconds", "Solve time", labels=("route",),
+                             buckets=(0.1, 1.0))
+    metrics.Gauge("queued", "Jobs queued", lambda: 2)
+    for value in (0.05, 0.5, 5.0):
+        hist.observe(value, 'a"b')
+    assert metrics.render_metrics().splitlines() == [
+        "# HELP solve_seconds Solve time",
+        "# TYPE solve_seconds histogram",
+        'solve_seconds_bucket{route="a\\"b",le="0.1"} 1',
+        'solve_seconds_bucket{route="a\\"b",le="1"} 2',
+        'solve_seconds_bucket{route="a\\"b",le="+Inf"} 3',
+        'solve_seconds_sum{route="a\\"b"} 5.55',
+        'solve_seconds_count{route="a\\"b"} 3',
+        "# HELP queued Jobs queued",
+        "# TYPE queued gauge",
+        "queued 2",
+    ]
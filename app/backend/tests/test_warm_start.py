@@ -0,0 +1,33 @@
+"""Warm starts (highs_direct basis reuse) change solve times, never results."""
+
+import pandas as pd
+import pytest
+
+from app.backend.core.optimizer import run_simulation
+
+
+def run(region, strategy, **kwargs):
+    return run_simulation(region, strategy, T=5, Gamma=2.0, shortage_penalty=50.0,
+                          procurement_cost=region["proc_cost"], use_cache=False, **kwargs)
+
+
+@pytest.mark.parametrize("strategy", ["nominal", "static_robust"])
+@pytest.mark.parametrize("lookahead", [1, 2])
+def test_warm_matches_cold_on_highs_direct(region, strategy, lookahead):
+    cold = run(region, strategy, backend="highs_direct", lookahead=lookahead, warm_start=False)
+    warm = run(region, strategy, backend="highs_direct", lookahead=lookahead)
+    cols = ["status", "objective", "total_unmet"]
+    pd.testing.assert_frame_equal(warm[cols], cold[cols], rtol=1e-6)
+
+
+def test_cvxpy_always_solves_cold(region):
+    assert run(region, "adr", warm_start=True).equals(run(region, "adr", warm_start=False))
+
+
+@pytest.mark.parametrize("strategy", ["nominal", "static_robust"])
+def test_lookahead_window_matches_across_backends(region, strategy):
+    ref = run(region, strategy, lookahead=3)
+    got = run(region, strategy, backend="highs_direct", lookahead=3)
+    assert (got["status"] == "optimal").all()
+    cols = ["objective", "total_unmet"]
+    pd.testing.assert_frame_equal(got[cols], ref[cols], rtol=1e-6)
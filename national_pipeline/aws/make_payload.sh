@@ -12,6 +12,10 @@ tar -czf "$OUT" \
   national_pipeline/run_missing_regions.py \
   national_pipeline/antimicrobials.csv \
   national_pipeline/cms_results.parquet \
+  app/backend/__init__.py \
+  app/backend/core/__init__.py \
+  app/backend/core/admission.py \
+  app/backend/core/data_loader.py \
   antimicrobialglm/antimicrobialglm_utils.py \
   antimicrobialglm/artifacts \
   data/processed/facilities_with_warehouses.csv \
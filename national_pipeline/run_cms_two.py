@@ -1,8 +1,8 @@
 """
 run_cms_two.py  -  CMS simulation pipeline for Princeton Research Computing
 Runs the 2025-26 / 2026-27 CMS simulation across all Botswana DHMTs.
-Uses ProcessPoolExecutor to run regions in parallel (one worker per region,
-capped by MAX_WORKERS to stay within 32 GB memory).
+The run is split into (region, policy, year) tasks, each in its own process,
+packed largest first under a memory budget (see run_tasks).
 
 Usage:
     python run_cms.py
@@ -18,11 +18,13 @@ import re
 import sys
 import importlib.util
 from pathlib import Path
-from concurrent.futures import ProcessPoolExecutor, as_completed
+import multiprocessing as mp
+from multiprocessing.connection import wait
 
 import numpy as np
 import pandas as pd
 import cvxpy as cp
+import scipy.sparse as sp
 from scipy.spatial import cKDTree
 
 # Paths - adjust if project layout differs
@@ -32,9 +34,21 @@ OUT_DIR    = BASE_DIR / "results"
 OUT_DIR.mkdir(exist_ok=True)
 
 # Parallelism
-# Keep peak memory ≤ 32 GB.  Each ARO-ADR solve can spike several GB.
-# Start at 4; tune up after checking `seff <jobid>`.
-MAX_WORKERS = 3
+# Tasks start while their estimated peak memory fits in the budget. CMS_MEMORY_GB
+# defaults to 90% of the SLURM allocation, else 80% of physical memory;
+# CMS_MAX_WORKERS caps concurrent tasks (default one per allocated CPU).
+def _default_memory_gb():
+    slurm_mb = os.environ.get("SLURM_MEM_PER_NODE")
+    if slurm_mb:
+        return 0.9 * float(slurm_mb) / 1024
+    try:
+        return 0.8 * os.sysconf("SC_PAGE_SIZE") * os.sysconf("SC_PHYS_PAGES") / 2**30
+    except (ValueError, OSError, AttributeError):
+        return 32.0
+
+MEMORY_BUDGET_GB = float(os.environ.get("CMS_MEMORY_GB", "0")) or _default_memory_gb()
+MAX_WORKERS = (int(os.environ.get("CMS_MAX_WORKERS", "0"))
+               or int(os.environ.get("SLURM_CPUS_PER_TASK", "0")) or os.cpu_count() or 1)
 SOLVER = cp.HIGHS   # HiGHS (open-source LP solver); MOSEK breaks on this problem
 
 # Solver settings
@@ -48,6 +62,11 @@ antimicrobialglm_utils = importlib.util.module_from_spec(spec)
 spec.loader.exec_module(antimicrobialglm_utils)
 estimate_antimicrobial_demand = antimicrobialglm_utils.estimate_antimicrobial_demand
 
+# Shared with the app backend (app/backend/core), so the two stay in step
+sys.path.insert(0, str(DATA_DIR.resolve()))
+from app.backend.core.admission import BYTES_PER_VAR, lp_variables
+from app.backend.core.data_loader import build_demand_rate_tensor
+
 
 # Data loading (runs once in the main process; workers inherit via fork)
 
@@ -57,7 +76,7 @@ def load_data():
     global dist_matrix_df, time_matrix_df
     global age_df, district_adm
     global results_with_dhmt
-    global m_ak, p_class, pi_inf_given_a, age_map
+    global m_ak, p_class, pi_inf_given_a, age_map, demand_rates
     global cms_active, cms_proc_cost, pop_fac_share
 
     # Population
@@ -151,6 +170,7 @@ def load_data():
     pi_inf_given_a["agegroup"] = pi_inf_given_a["agegroup"].replace(age_map)
 
     p_class = _p_class_raw.copy()
+    demand_rates = build_demand_rate_tensor(p_class, m_ak, pi_inf_given_a, age_map)
 
     # CMS data
     cms_raw = pd.read_csv(BASE_DIR / "antimicrobials.csv")
@@ -278,36 +298,42 @@ def build_node_demand_matrix(demand_fac_long):
         .sort_index()
     )
 
-def expected_class_counts_by_facility(pop_fac_age_df):
-    df = pop_fac_age_df.copy()
-    df["patient_days"] = pd.to_numeric(df["patient_days"], errors="coerce").fillna(0.0)
-
-    pi_tmp = pi_inf_given_a.copy()
-    pi_tmp["agegroup"]       = pi_tmp["agegroup"].replace(age_map)
-    pi_tmp["infectionstatus"] = pi_tmp["infectionstatus"].astype(str).str.strip().str.lower()
-    df["agegroup"] = df["agegroup"].astype(str).str.strip()
-    df = df.merge(pi_tmp, on="agegroup", how="left")
-    df["infectionstatus"] = df["infectionstatus"].astype(str).str.strip().str.lower()
-    df["patients_ak"] = df["patient_days"] * df["pi_inf_given_a"]
-
-    m_tmp = m_ak.copy()
-    m_tmp["agegroup"]       = m_tmp["agegroup"].replace(age_map)
-    m_tmp["infectionstatus"] = m_tmp["infectionstatus"].astype(str).str.strip().str.lower()
-    df = df.merge(m_tmp[["agegroup", "infectionstatus", "m_ak"]], on=["agegroup", "infectionstatus"], how="left")
-    df["n_akh"] = df["patients_ak"] * df["m_ak"]
-
-    p_tmp = p_class.copy()
-    for col in ["agegroup", "infectionstatus", "hospital_type", "Class"]:
-        if col in p_tmp.columns:
-            p_tmp[col] = p_tmp[col].astype(str).str.strip()
-    df["hospital_type"] = df["hospital_type"].astype(str).str.strip()
-    df = df.merge(p_tmp, on=["agegroup", "infectionstatus", "hospital_type"], how="left")
-    df["expected_count"] = df["n_akh"] * df["p_class"]
-
-    out = (
-        df.groupby(["facility_name", "facility_type", "Class"], as_index=False)["expected_count"].sum()
-    )
-    return out
+def expected_class_counts_by_facility(pop_fac_age_df, rates=None):
+    """Facility x age x hospital-type patient-days contracted with the rate tensor."""
+    rates = demand_rates if rates is None else rates
+    df = pop_fac_age_df
+    a = df["agegroup"].astype(str).str.strip().map(
+        {v: i for i, v in enumerate(rates["agegroups"])})
+    h = df["hospital_type"].astype(str).str.strip().map(
+        {v: i for i, v in enumerate(rates["hospital_types"])})
+    keep = (a.notna() & h.notna() & df["facility_name"].notna()
+            & df["facility_type"].notna()).to_numpy()
+    cols = ["facility_name", "facility_type", "Class", "expected_count"]
+    if not keep.any():
+        return pd.DataFrame(columns=cols)
+
+    fac_keys = pd.MultiIndex.from_frame(df.loc[keep, ["facility_name", "facility_type"]])
+    f_idx, facilities = fac_keys.factorize(sort=True)
+    a_idx = a.to_numpy()[keep].astype(int)
+    h_idx = h.to_numpy()[keep].astype(int)
+    pdays = pd.to_numeric(df["patient_days"], errors="coerce").fillna(0.0).to_numpy()[keep]
+
+    A, H, C = rates["rate"].shape
+    W = np.zeros((len(facilities), A, H))
+    np.add.at(W, (f_idx, a_idx, h_idx), pdays)
+    seen = np.zeros((len(facilities), A, H), dtype=bool)
+    seen[f_idx, a_idx, h_idx] = True
+
+    counts  = np.einsum("fah,ahc->fc", W, rates["rate"])
+    present = np.einsum("fah,ahc->fc", seen.astype(float), rates["present"].astype(float)) > 0
+
+    fi, ci = np.nonzero(present)
+    return pd.DataFrame({
+        "facility_name":  facilities.get_level_values(0)[fi],
+        "facility_type":  facilities.get_level_values(1)[fi],
+        "Class":          np.asarray(rates["classes"], dtype=object)[ci],
+        "expected_count": counts[fi, ci],
+    })
 
 
 # Region instance builder
@@ -592,18 +618,44 @@ def _resolve_c_penalty(shortage_penalty_per_unit, classes):
         return np.full(len(classes), float(shortage_penalty_per_unit))
     return pd.Series(shortage_penalty_per_unit).reindex(classes).fillna(0.0).astype(float).to_numpy()
 
+def _selector(row_idx, n_rows):
+    """Sparse (n_rows, len(row_idx)) 0/1 matrix whose column c has its one in row row_idx[c]."""
+    row_idx = np.asarray(row_idx, dtype=int)
+    return sp.csr_matrix((np.ones(len(row_idx)), (row_idx, np.arange(len(row_idx)))),
+                         shape=(n_rows, len(row_idx)))
+
+def _flow_matrices(nodes, arcs, CMS):
+    """
+    Incidence matrices for the matrix-form constraints, as in the app optimizer:
+    A_in / A_out (N, m) sum arc flows into / out of each node, and cms_sel (N, 1)
+    places the CMS procurement q on the CMS row.
+    """
+    node_idx = {n: i for i, n in enumerate(nodes)}
+    A_in    = _selector([node_idx[j] for (_, j) in arcs], len(nodes))
+    A_out   = _selector([node_idx[i] for (i, _) in arcs], len(nodes))
+    cms_sel = _selector([node_idx[CMS]], len(nodes))
+    return A_in, A_out, cms_sel
+
+def _adaptive_arc_mask(arc_df):
+    """1.0 for arcs whose shipments adapt to demand (CMS/warehouse/hospital -> downstream)."""
+    return np.array([
+        1.0 if (row.u_tier in ["cms","warehouse","hospital"]
+                and row.v_tier in ["clinic","warehouse","hospital","health_post"]) else 0.0
+        for row in arc_df.itertuples(index=False)
+    ], dtype=float)
+
 def simulate_policy_under_draws_cms(
     T, CMS, nodes, arcs, classes, dist_km, mu_mat, demand_draws,
     transport_cost_per_km=0.5, shortage_penalty_per_unit=10.0,
     holding_cost_per_unit=0.1, procurement_cost_per_unit=0.0,
     supply_multiplier=0.0, arc_cap=None, storage_cap_per_node=None,
     solver=None, verbose=False, relax_integrality=False, I0_start=None,
+    warm_start=False,
 ):
     nodes   = list(nodes)
     arcs    = list(arcs)
     classes = list(classes)
 
-    node_idx = {n: i for i, n in enumerate(nodes)}
     N, m, K  = len(nodes), len(arcs), len(classes)
 
     if arc_cap is None:
@@ -620,11 +672,7 @@ def simulate_policy_under_draws_cms(
     mu_mat = mu_mat.reindex(index=nodes, columns=classes).fillna(0.0).astype(float)
     mu_np  = mu_mat.to_numpy()
 
-    in_arcs  = [[] for _ in range(N)]
-    out_arcs = [[] for _ in range(N)]
-    for a, (i, j) in enumerate(arcs):
-        out_arcs[node_idx[i]].append(a)
-        in_arcs[node_idx[j]].append(a)
+    A_in, A_out, cms_sel = _flow_matrices(nodes, arcs, CMS)
 
     if storage_cap_per_node is None:
         cap_vec = None
@@ -632,93 +680,82 @@ def simulate_policy_under_draws_cms(
         cap_vec = (np.full(N, float(storage_cap_per_node)) if np.isscalar(storage_cap_per_node)
                    else pd.Series(storage_cap_per_node).reindex(nodes).astype(float).to_numpy())
 
+    # Inventory is an (N, K) array until it is returned
+    cms_idx = nodes.index(CMS)
     if I0_start is not None:
-        I = I0_start.reindex(index=nodes, columns=classes).fillna(0.0)
+        I = I0_start.reindex(index=nodes, columns=classes).fillna(0.0).to_numpy(dtype=float)
     else:
-        I = pd.DataFrame(0.0, index=nodes, columns=classes)
-        I.loc[CMS, :] = supply_multiplier * mu_mat.sum(axis=0)
+        I = np.zeros((N, K))
+        I[cms_idx, :] = supply_multiplier * mu_np.sum(axis=0)
     metrics = []
     nominal_mu = mu_mat.copy()
 
-    for t in range(T):
-        I0 = I.to_numpy().copy()
-        F  = cp.Variable((m, K), nonneg=True)
-        u  = cp.Variable((N, K), nonneg=True)
-        I1 = cp.Variable((N, K), nonneg=True)
-        q  = cp.Variable(K, nonneg=True)
-        constraints = []
-
-        if relax_integrality:
-            lam = cp.Variable(m, nonneg=True)
-            y   = cp.Variable(m, nonneg=True)
-            constraints += [y <= 1.0]
-        else:
-            lam = cp.Variable(m, integer=True)
-            y   = cp.Variable(m, boolean=True)
-
-        big_m = 1e5
-        for a in range(m):
-            constraints.append(cp.sum(F[a, :]) <= arc_cap_vec[a] * lam[a])
-            constraints.append(lam[a] >= 0)
-            constraints.append(lam[a] <= big_m * y[a])
-
-        for n in range(N):
-            for k in range(K):
-                inflow  = cp.sum(F[in_arcs[n],  k]) if in_arcs[n]  else 0
-                outflow = cp.sum(F[out_arcs[n], k]) if out_arcs[n] else 0
-                supply  = q[k] if nodes[n] == CMS else 0.0
-                demand  = float(mu_np[n, k])
-                constraints.append(
-                    I1[n, k] == I0[n, k] + inflow - outflow + supply - demand + u[n, k]
-                )
-                constraints.append(outflow <= I0[n, k] + inflow + supply)
-
-        if cap_vec is not None:
-            for n in range(N):
-                constraints.append(cp.sum(I1[n, :]) <= cap_vec[n])
+    # The model is built once; each period only sets the opening inventory I0
+    # and re-solves, so CVXPY reuses its canonicalization. warm_start hands
+    # HiGHS the previous period's primal point; it is off by default because
+    # on the ADR LPs that start makes re-solves several times slower.
+    I0 = cp.Parameter((N, K))
+    F  = cp.Variable((m, K), nonneg=True)
+    u  = cp.Variable((N, K), nonneg=True)
+    I1 = cp.Variable((N, K), nonneg=True)
+    q  = cp.Variable(K, nonneg=True)
+
+    if relax_integrality:
+        lam = cp.Variable(m, nonneg=True)
+        y   = cp.Variable(m, nonneg=True)
+        constraints = [y <= 1.0]
+    else:
+        lam = cp.Variable(m, integer=True)
+        y   = cp.Variable(m, boolean=True)
+        constraints = [lam >= 0]
+
+    big_m   = 1e5
+    inflow  = A_in  @ F                                        # (N, K)
+    outflow = A_out @ F
+    supply  = cms_sel @ cp.reshape(q, (1, K), order='C')       # only the CMS row
+    constraints += [
+        cp.sum(F, axis=1) <= cp.multiply(arc_cap_vec, lam),
+        lam <= big_m * y,
+        I1 == I0 + inflow - outflow + supply - mu_np + u,
+        outflow <= I0 + inflow + supply,
+    ]
+    if cap_vec is not None:
+        constraints.append(cp.sum(I1, axis=1) <= cap_vec)
+
+    obj = cp.Minimize(
+        transport_cost_per_km    * cp.sum(cp.multiply(c_arc,  lam))
+        + cp.sum(cp.multiply(c_pen.reshape(1, K), u))
+        + holding_cost_per_unit     * cp.sum(I1)
+        + cp.sum(cp.multiply(c_proc, q))    # ← per-drug cost
+    )
+    prob = cp.Problem(obj, constraints)
 
-        obj = cp.Minimize(
-            transport_cost_per_km    * cp.sum(cp.multiply(c_arc,  lam))
-            + cp.sum(cp.multiply(c_pen.reshape(1, K), u))
-            + holding_cost_per_unit     * cp.sum(I1)
-            + cp.sum(cp.multiply(c_proc, q))    # ← per-drug cost
-        )
-        prob = cp.Problem(obj, constraints)
-        prob.solve(solver=solver, verbose=verbose)
+    for t in range(T):
+        I0.value = I
+        prob.solve(solver=solver, verbose=verbose, warm_start=warm_start)
         if prob.status not in ("optimal", "optimal_inaccurate"):
             raise RuntimeError(f"Failed at t={t}: {prob.status}")
 
-        F_val = np.maximum(np.asarray(F.value, dtype=float), 0.0)
-        realized = pd.DataFrame(demand_draws[t], index=nodes, columns=classes)
-        ship_by_arc = {(i, j): pd.Series(F_val[a, :], index=classes)
-                       for a, (i, j) in enumerate(arcs)}
-        q_ser   = pd.Series(np.maximum(np.asarray(q.value, dtype=float), 0.0), index=classes)
+        F_val   = np.maximum(np.asarray(F.value, dtype=float), 0.0)
+        q_val   = np.maximum(np.asarray(q.value, dtype=float), 0.0)
         lam_val = np.maximum(np.round(np.asarray(lam.value, dtype=float)).astype(int), 0)
 
-        I_next = pd.DataFrame(0.0, index=nodes, columns=classes)
-        unmet  = pd.DataFrame(0.0, index=nodes, columns=classes)
-        for n_name in nodes:
-            inflow  = pd.Series(0.0, index=classes)
-            outflow = pd.Series(0.0, index=classes)
-            for (i, j), ship_ser in ship_by_arc.items():
-                if j == n_name: inflow  = inflow.add(ship_ser,  fill_value=0.0)
-                if i == n_name: outflow = outflow.add(ship_ser, fill_value=0.0)
-            add_supply  = q_ser if n_name == CMS else pd.Series(0.0, index=classes)
-            demand_vec  = realized.loc[n_name, :]
-            avail       = I.loc[n_name, :] + add_supply + inflow - outflow
-            served      = np.minimum(avail, demand_vec)
-            unmet.loc[n_name, :]  = demand_vec - served
-            I_next.loc[n_name, :] = avail - served
-        I = I_next.copy()
-
-        transport_cost = sum(transport_cost_per_km * float(dist_km.loc[i, j]) * float(lam_val[a])
-                             for a, (i, j) in enumerate(arcs))
-        shortage_cost  = float((unmet.to_numpy() * c_pen).sum())
-        holding_cost   = holding_cost_per_unit     * float(I.to_numpy().sum())
-        proc_cost      = float((q_ser * pd.Series(c_proc, index=classes)).sum())
-
-        total_demand = float(realized.to_numpy().sum())
-        total_unmet  = float(unmet.to_numpy().sum())
+        # Vectorized post-solve simulation using the incidence matrices
+        realized = np.asarray(demand_draws[t], dtype=float)     # (N, K)
+        supply_np = np.zeros((N, K))
+        supply_np[cms_idx, :] = q_val
+        avail    = I + supply_np + A_in @ F_val - A_out @ F_val
+        served   = np.minimum(avail, realized)
+        unmet    = realized - served
+        I        = avail - served
+
+        transport_cost = transport_cost_per_km * float(c_arc @ lam_val)
+        shortage_cost  = float((unmet * c_pen).sum())
+        holding_cost   = holding_cost_per_unit     * float(I.sum())
+        proc_cost      = float((q_val * c_proc).sum())
+
+        total_demand = float(realized.sum())
+        total_unmet  = float(unmet.sum())
         metrics.append({
             "t": t,
             "objective_realized":      transport_cost + shortage_cost + holding_cost + proc_cost,
@@ -729,9 +766,9 @@ def simulate_policy_under_draws_cms(
             "unmet_pct_realized":      (total_unmet / total_demand * 100.0) if total_demand > 0 else 0.0,
             "total_unmet_units":       total_unmet,
             "total_demand_units":      total_demand,
-            "total_procured_units":    float(q_ser.sum()),
+            "total_procured_units":    float(q_val.sum()),
         })
-    return pd.DataFrame(metrics), nominal_mu, I
+    return pd.DataFrame(metrics), nominal_mu, pd.DataFrame(I, index=nodes, columns=classes)
 
 
 def simulate_static_robust_under_draws_cms(
@@ -740,12 +777,12 @@ def simulate_static_robust_under_draws_cms(
     holding_cost_per_unit=0.1, procurement_cost_per_unit=0.0,
     supply_multiplier=0.0, arc_cap=None, storage_cap_per_node=None,
     solver=None, verbose=False, relax_integrality=False, I0_start=None,
+    warm_start=False,
 ):
     nodes   = list(nodes)
     arcs    = list(arcs)
     classes = list(classes)
 
-    node_idx = {n: i for i, n in enumerate(nodes)}
     N, m, K  = len(nodes), len(arcs), len(classes)
 
     if arc_cap is None:
@@ -764,11 +801,7 @@ def simulate_static_robust_under_draws_cms(
     mu_np     = mu_mat.to_numpy()
     sigma_np  = sigma_mat.to_numpy()
 
-    in_arcs  = [[] for _ in range(N)]
-    out_arcs = [[] for _ in range(N)]
-    for a, (i, j) in enumerate(arcs):
-        out_arcs[node_idx[i]].append(a)
-        in_arcs[node_idx[j]].append(a)
+    A_in, A_out, cms_sel = _flow_matrices(nodes, arcs, CMS)
 
     if storage_cap_per_node is None:
         cap_vec = None
@@ -776,101 +809,89 @@ def simulate_static_robust_under_draws_cms(
         cap_vec = (np.full(N, float(storage_cap_per_node)) if np.isscalar(storage_cap_per_node)
                    else pd.Series(storage_cap_per_node).reindex(nodes).astype(float).to_numpy())
 
+    # Inventory is an (N, K) array until it is returned
+    cms_idx = nodes.index(CMS)
     if I0_start is not None:
-        I = I0_start.reindex(index=nodes, columns=classes).fillna(0.0)
+        I = I0_start.reindex(index=nodes, columns=classes).fillna(0.0).to_numpy(dtype=float)
     else:
-        I = pd.DataFrame(0.0, index=nodes, columns=classes)
-        I.loc[CMS, :] = supply_multiplier * mu_mat.sum(axis=0)
+        I = np.zeros((N, K))
+        I[cms_idx, :] = supply_multiplier * mu_np.sum(axis=0)
     metrics = []
 
-    def nk_index(n, k): return n * K + k
+    # The model is built once; each period only sets the opening inventory I0
+    # and re-solves, so CVXPY reuses its canonicalization. See
+    # simulate_policy_under_draws_cms for warm_start.
+    I0 = cp.Parameter((N, K))
+    Fbar = cp.Variable((m, K), nonneg=True)
+    u    = cp.Variable((N, K), nonneg=True)
+    I1   = cp.Variable((N, K), nonneg=True)
+    q    = cp.Variable(K, nonneg=True)
+    if relax_integrality:
+        lam = cp.Variable(m, nonneg=True)
+        y   = cp.Variable(m, nonneg=True)
+        constraints = [y <= 1.0]
+    else:
+        lam = cp.Variable(m, integer=True)
+        y   = cp.Variable(m, boolean=True)
+        constraints = [lam >= 0]
+    # Without adaptive shipments each balance row only sees its own node's
+    # demand, so the duals are (N, K): the off-diagonal entries of the old
+    # (N*K, N) multipliers were unconstrained and always zero at optimality.
+    theta         = cp.Variable((N, K), nonneg=True)
+    pi_plus       = cp.Variable((N, K), nonneg=True)
+    pi_minus      = cp.Variable((N, K), nonneg=True)
+    theta_ship    = cp.Variable((N, K), nonneg=True)
+    pi_ship_plus  = cp.Variable((N, K), nonneg=True)
+    pi_ship_minus = cp.Variable((N, K), nonneg=True)
+    big_m    = 1e5
+    inflow   = A_in  @ Fbar
+    outflow  = A_out @ Fbar
+    supply   = cms_sel @ cp.reshape(q, (1, K), order='C')
+    rhs      = I0 + inflow - outflow + supply - mu_np + u - I1
+    rhs_ship = I0 + inflow + supply - outflow
+    constraints += [
+        cp.sum(Fbar, axis=1) <= cp.multiply(arc_cap_vec, lam),
+        lam <= big_m * y,
+        Gamma * theta + pi_plus + pi_minus <= rhs,
+        theta + pi_plus  >= -sigma_np,
+        theta + pi_minus >=  sigma_np,
+        Gamma * theta_ship + pi_ship_plus + pi_ship_minus <= rhs_ship,
+        theta_ship + pi_ship_plus  >= -sigma_np,
+        theta_ship + pi_ship_minus >=  sigma_np,
+    ]
+    if cap_vec is not None:
+        constraints.append(cp.sum(I1, axis=1) <= cap_vec)
+    obj = cp.Minimize(
+        transport_cost_per_km    * cp.sum(cp.multiply(c_arc,  lam))
+        + cp.sum(cp.multiply(c_pen.reshape(1, K), u))
+        + holding_cost_per_unit     * cp.sum(I1)
+        + cp.sum(cp.multiply(c_proc, q))    # ← per-drug cost
+    )
+    prob = cp.Problem(obj, constraints)
 
     for t in range(T):
-        I0 = I.to_numpy().copy()
-        constraints = []
-        Fbar = cp.Variable((m, K), nonneg=True)
-        u    = cp.Variable((N, K), nonneg=True)
-        I1   = cp.Variable((N, K), nonneg=True)
-        q    = cp.Variable(K, nonneg=True)
-        if relax_integrality:
-            lam = cp.Variable(m, nonneg=True)
-            y   = cp.Variable(m, nonneg=True)
-            constraints += [y <= 1.0]
-        else:
-            lam = cp.Variable(m, integer=True)
-            y   = cp.Variable(m, boolean=True)
-        theta        = cp.Variable((N, K), nonneg=True)
-        pi_plus      = cp.Variable((N * K, N), nonneg=True)
-        pi_minus     = cp.Variable((N * K, N), nonneg=True)
-        theta_ship   = cp.Variable((N, K), nonneg=True)
-        pi_ship_plus  = cp.Variable((N * K, N), nonneg=True)
-        pi_ship_minus = cp.Variable((N * K, N), nonneg=True)
-        big_m = 1e5
-        for a in range(m):
-            constraints.append(cp.sum(Fbar[a, :]) <= arc_cap_vec[a] * lam[a])
-            constraints.append(lam[a] >= 0)
-            constraints.append(lam[a] <= big_m * y[a])
-        for n in range(N):
-            for k in range(K):
-                nk      = nk_index(n, k)
-                inflow  = cp.sum(Fbar[in_arcs[n],  k]) if in_arcs[n]  else 0
-                outflow = cp.sum(Fbar[out_arcs[n], k]) if out_arcs[n] else 0
-                supply  = q[k] if nodes[n] == CMS else 0.0
-                demand  = float(mu_np[n, k])
-                rhs = I0[n,k] + inflow - outflow + supply - demand + u[n,k] - I1[n,k]
-                constraints.append(
-                    Gamma * theta[n,k] + cp.sum(pi_plus[nk,:]) + cp.sum(pi_minus[nk,:]) <= rhs
-                )
-                constraints.append(theta[n,k] + pi_plus[nk,n]  >= -sigma_np[n,k])
-                constraints.append(theta[n,k] + pi_minus[nk,n] >=  sigma_np[n,k])
-                rhs_ship = I0[n,k] + inflow + supply - outflow
-                constraints.append(
-                    Gamma * theta_ship[n,k] + cp.sum(pi_ship_plus[nk,:]) + cp.sum(pi_ship_minus[nk,:]) <= rhs_ship
-                )
-                constraints.append(theta_ship[n,k] + pi_ship_plus[nk,n]  >= -sigma_np[n,k])
-                constraints.append(theta_ship[n,k] + pi_ship_minus[nk,n] >=  sigma_np[n,k])
-        if cap_vec is not None:
-            for n in range(N):
-                constraints.append(cp.sum(I1[n, :]) <= cap_vec[n])
-        obj = cp.Minimize(
-            transport_cost_per_km    * cp.sum(cp.multiply(c_arc,  lam))
-            + cp.sum(cp.multiply(c_pen.reshape(1, K), u))
-            + holding_cost_per_unit     * cp.sum(I1)
-            + cp.sum(cp.multiply(c_proc, q))    # ← per-drug cost
-        )
-        prob = cp.Problem(obj, constraints)
-        prob.solve(solver=solver, verbose=verbose)
+        I0.value = I
+        prob.solve(solver=solver, verbose=verbose, warm_start=warm_start)
         if prob.status not in ("optimal", "optimal_inaccurate"):
             raise RuntimeError(f"Failed at t={t}: {prob.status}")
         Fbar_val = np.maximum(np.asarray(Fbar.value, dtype=float), 0.0)
-        realized = pd.DataFrame(demand_draws[t], index=nodes, columns=classes)
-        ship_by_arc = {(i, j): pd.Series(Fbar_val[a, :], index=classes)
-                       for a, (i, j) in enumerate(arcs)}
-        q_ser   = pd.Series(np.maximum(np.asarray(q.value, dtype=float), 0.0), index=classes)
-        lam_val = np.maximum(np.round(np.asarray(lam.value, dtype=float)).astype(int), 0)
-        I_next = pd.DataFrame(0.0, index=nodes, columns=classes)
-        unmet  = pd.DataFrame(0.0, index=nodes, columns=classes)
-        for n_name in nodes:
-            inflow  = pd.Series(0.0, index=classes)
-            outflow = pd.Series(0.0, index=classes)
-            for (i, j), ship_ser in ship_by_arc.items():
-                if j == n_name: inflow  = inflow.add(ship_ser,  fill_value=0.0)
-                if i == n_name: outflow = outflow.add(ship_ser, fill_value=0.0)
-            add_supply = q_ser if n_name == CMS else pd.Series(0.0, index=classes)
-            demand_vec = realized.loc[n_name, :]
-            avail      = I.loc[n_name, :] + add_supply + inflow - outflow
-            served     = np.minimum(np.maximum(avail, 0.0), demand_vec)
-            unmet.loc[n_name, :]  = demand_vec - served
-            I_next.loc[n_name, :] = avail - served
-        I = I_next.copy()
-        transport_cost = sum(transport_cost_per_km * float(dist_km.loc[i, j]) * lam_val[a]
-                             for a, (i, j) in enumerate(arcs))
-        shortage_cost  = float((unmet.to_numpy() * c_pen).sum())
-        holding_cost   = holding_cost_per_unit     * float(I.to_numpy().sum())
-        proc_cost      = float((q_ser * pd.Series(c_proc, index=classes)).sum())
-
-        total_demand = float(realized.to_numpy().sum())
-        total_unmet  = float(unmet.to_numpy().sum())
+        q_val    = np.maximum(np.asarray(q.value, dtype=float), 0.0)
+        lam_val  = np.maximum(np.round(np.asarray(lam.value, dtype=float)).astype(int), 0)
+        # Vectorized post-solve simulation using the incidence matrices
+        realized = np.asarray(demand_draws[t], dtype=float)     # (N, K)
+        supply_np = np.zeros((N, K))
+        supply_np[cms_idx, :] = q_val
+        avail    = I + supply_np + A_in @ Fbar_val - A_out @ Fbar_val
+        served   = np.minimum(np.maximum(avail, 0.0), realized)
+        unmet    = realized - served
+        I        = avail - served
+        transport_cost = transport_cost_per_km * float(c_arc @ lam_val)
+        shortage_cost  = float((unmet * c_pen).sum())
+        holding_cost   = holding_cost_per_unit     * float(I.sum())
+        proc_cost      = float((q_val * c_proc).sum())
+
+        total_demand = float(realized.sum())
+        total_unmet  = float(unmet.sum())
         metrics.append({
             "t": t,
             "objective_realized":      transport_cost + shortage_cost + holding_cost + proc_cost,
@@ -881,9 +902,9 @@ def simulate_static_robust_under_draws_cms(
             "unmet_pct_realized":      (total_unmet / total_demand * 100.0) if total_demand > 0 else 0.0,
             "total_unmet_units":       total_unmet,
             "total_demand_units":      total_demand,
-            "total_procured_units":    float(q_ser.sum()),
+            "total_procured_units":    float(q_val.sum()),
         })
-    return pd.DataFrame(metrics), mu_mat.copy(), I
+    return pd.DataFrame(metrics), mu_mat.copy(), pd.DataFrame(I, index=nodes, columns=classes)
 
 
 def simulate_aro_adr_under_draws_cms(
@@ -893,6 +914,7 @@ def simulate_aro_adr_under_draws_cms(
     holding_cost_per_unit=0.1, procurement_cost_per_unit=0.1,
     supply_multiplier=0.0, arc_cap=None, storage_cap_per_node=None,
     solver=None, verbose=False, freeze_alpha_after_first=False, relax_integrality=False, I0_start=None,
+    warm_start=False,
 ):
     nodes   = list(nodes)
     arcs    = list(arcs)
@@ -914,181 +936,183 @@ def simulate_aro_adr_under_draws_cms(
     mu_np     = mu_mat.to_numpy()
     sigma_mat = sigma_mat.reindex(index=nodes, columns=classes).fillna(0.0).astype(float)
     sigma_np  = sigma_mat.to_numpy()
-    adaptive_arc_mask = np.array([
-        1.0 if (row.u_tier in ["cms","warehouse","hospital"]
-                and row.v_tier in ["clinic","warehouse","hospital","health_post"]) else 0.0
-        for row in arc_df.itertuples(index=False)
-    ], dtype=float)
+    adaptive_arc_mask = _adaptive_arc_mask(arc_df)
     arc_dest_idx = np.array([node_idx[j] for (i, j) in arcs], dtype=int)
-    in_arcs  = [[] for _ in range(N)]
-    out_arcs = [[] for _ in range(N)]
-    for a, (i, j) in enumerate(arcs):
-        out_arcs[node_idx[i]].append(a)
-        in_arcs[node_idx[j]].append(a)
-    arcs_from_to = [[[] for _ in range(N)] for _ in range(N)]
-    for a, (i, j) in enumerate(arcs):
-        arcs_from_to[node_idx[i]][node_idx[j]].append(a)
-
-    # Adjacency over adaptive arcs only, built once per call in O(|A|). The dual
-    # constraint loops below used to rescan all N destinations for every
-    # (node, class) pair in every period. Sorting the targets keeps the generated
-    # constraints, and their order, identical to the old loop. Mirrors the same
-    # change in national_pipeline.ipynb; keep the two in step.
+    A_in, A_out, cms_sel = _flow_matrices(nodes, arcs, CMS)
+    A_adapt    = np.where(adaptive_arc_mask == 1.0)[0]
+    A_in_adapt = sp.csr_matrix((np.ones(len(A_adapt)), (arc_dest_idx[A_adapt], A_adapt)),
+                               shape=(N, m))                   # incoming adaptive arcs
+    sigma_dest = sigma_np[arc_dest_idx, :]                      # (m, K)
+
+    # Adjacency over adaptive arcs only, built once per call in O(|A|). The robust
+    # duals only have entries for a node itself and its adaptive neighbours: pair
+    # p = (pair_src[p], pair_dst[p]) for every distinct adaptive (source,
+    # destination), and G[p, a] = 1 for the arcs of pair p. This is the
+    # S_out / pi_cross_* layout of app/backend/core/optimizer.py, except that
+    # parallel adaptive arcs to the same neighbour share one pair. Mirrors the
+    # same change in national_pipeline.ipynb; keep the two in step.
     _adaptive_out = [{} for _ in range(N)]
     for a, (i, j) in enumerate(arcs):
         if adaptive_arc_mask[a] == 1.0:
             _adaptive_out[node_idx[i]].setdefault(node_idx[j], []).append(a)
-    adaptive_out = [sorted(d.items()) for d in _adaptive_out]
+    pairs = [(n, r, nr_arcs) for n, d in enumerate(_adaptive_out) for r, nr_arcs in sorted(d.items())]
+    P = len(pairs)
+    pair_src = np.array([n for n, _, _ in pairs], dtype=int)
+    pair_dst = np.array([r for _, r, _ in pairs], dtype=int)
+    G = sp.csr_matrix(
+        (np.ones(sum(len(a) for _, _, a in pairs)),
+         ([p for p, (_, _, nr_arcs) in enumerate(pairs) for _ in nr_arcs],
+          [a for _, _, nr_arcs in pairs for a in nr_arcs])),
+        shape=(P, m),
+    )
+    S_out      = _selector(pair_src, N)                         # (N, P)
+    sigma_pair = sigma_np[pair_dst, :]                          # (P, K)
     if storage_cap_per_node is None:
         cap_vec = None
     else:
         cap_vec = (np.full(N, float(storage_cap_per_node)) if np.isscalar(storage_cap_per_node)
                    else pd.Series(storage_cap_per_node).reindex(nodes).astype(float).to_numpy())
+    # Inventory is an (N, K) array until it is returned
+    cms_idx = nodes.index(CMS)
     if I0_start is not None:
-        I = I0_start.reindex(index=nodes, columns=classes).fillna(0.0)
+        I = I0_start.reindex(index=nodes, columns=classes).fillna(0.0).to_numpy(dtype=float)
     else:
-        I = pd.DataFrame(0.0, index=nodes, columns=classes)
-        I.loc[CMS, :] = supply_multiplier * mu_mat.sum(axis=0)
-    learned_alpha = None
-    metrics = []
-    def nk_index(n, k): return n * K + k
-    for t in range(T):
-        I0 = I.to_numpy().copy()
-        Fbar = cp.Variable((m, K), nonneg=True)
-        if freeze_alpha_after_first and learned_alpha is not None:
-            alpha     = None
-            alpha_val = np.asarray(learned_alpha, dtype=float)
-        else:
-            alpha     = cp.Variable((m, K))
-            alpha_val = None
+        I = np.zeros((N, K))
+        I[cms_idx, :] = supply_multiplier * mu_np.sum(axis=0)
+    # Models are built once; each period only sets the opening inventory I0
+    # (and the frozen alpha) and re-solves, so CVXPY reuses its
+    # canonicalization. See simulate_policy_under_draws_cms for warm_start.
+    I0 = cp.Parameter((N, K))
+
+    def build_model(frozen):
+        """Period model with alpha a decision variable or, when frozen, a
+        Parameter holding the alpha learned in the first period."""
+        Fbar  = cp.Variable((m, K), nonneg=True)
+        alpha = cp.Parameter((m, K)) if frozen else cp.Variable((m, K))
         u  = cp.Variable((N, K), nonneg=True)
         I1 = cp.Variable((N, K), nonneg=True)
         q  = cp.Variable(K, nonneg=True)
-        constraints = []
         if relax_integrality:
             lam = cp.Variable(m, nonneg=True)
             y   = cp.Variable(m, nonneg=True)
-            constraints += [y <= 1.0]
+            constraints = [y <= 1.0]
         else:
             lam = cp.Variable(m, integer=True)
             y   = cp.Variable(m, boolean=True)
-        theta         = cp.Variable((N, K), nonneg=True)
-        pi_plus       = cp.Variable((N * K, N), nonneg=True)
-        pi_minus      = cp.Variable((N * K, N), nonneg=True)
-        theta_ship    = cp.Variable((N, K), nonneg=True)
-        pi_ship_plus  = cp.Variable((N * K, N), nonneg=True)
-        pi_ship_minus = cp.Variable((N * K, N), nonneg=True)
+            constraints = [lam >= 0]
+        # Demand and ship balance duals: self-node (N, K) + one row per adaptive pair
+        theta           = cp.Variable((N, K), nonneg=True)
+        pi_self_plus    = cp.Variable((N, K), nonneg=True)
+        pi_self_minus   = cp.Variable((N, K), nonneg=True)
+        theta_ship      = cp.Variable((N, K), nonneg=True)
+        pis_self_plus   = cp.Variable((N, K), nonneg=True)
+        pis_self_minus  = cp.Variable((N, K), nonneg=True)
+        if P:
+            pi_cross_plus   = cp.Variable((P, K), nonneg=True)
+            pi_cross_minus  = cp.Variable((P, K), nonneg=True)
+            pis_cross_plus  = cp.Variable((P, K), nonneg=True)
+            pis_cross_minus = cp.Variable((P, K), nonneg=True)
         eta           = cp.Variable(m, nonneg=True)
         rho_plus      = cp.Variable((m, K), nonneg=True)
         rho_minus     = cp.Variable((m, K), nonneg=True)
-        if alpha is not None:
+        if not frozen:
             if np.isfinite(alpha_lb):
                 constraints.append(alpha >= alpha_lb)
             if np.isfinite(alpha_ub):
                 constraints.append(alpha <= alpha_ub)
-        big_m = 1e5
-        for a in range(m):
-            j = arc_dest_idx[a]
-            rhs_cap = arc_cap_vec[a] * lam[a] - cp.sum(Fbar[a, :])
-            constraints.append(
-                Gamma * eta[a] + cp.sum(rho_plus[a, :] + rho_minus[a, :]) <= rhs_cap
-            )
-            for k in range(K):
-                coeff = alpha[a, k] if alpha is not None else alpha_val[a, k]
-                constraints.append(eta[a] + rho_plus[a, k]  >= coeff * sigma_np[j, k])
-                constraints.append(eta[a] + rho_minus[a, k] >= -coeff * sigma_np[j, k])
-            constraints.append(lam[a] >= 0)
-            constraints.append(lam[a] <= big_m * y[a])
-        for n in range(N):
-            for k in range(K):
-                nk      = nk_index(n, k)
-                inflow  = cp.sum(Fbar[in_arcs[n],  k]) if in_arcs[n]  else 0
-                outflow = cp.sum(Fbar[out_arcs[n], k]) if out_arcs[n] else 0
-                supply  = q[k] if nodes[n] == CMS else 0.0
-                demand  = float(mu_np[n, k])
-                rhs = I0[n,k] + inflow - outflow + supply - demand + u[n,k] - I1[n,k]
-                constraints.append(
-                    Gamma * theta[n,k] + cp.sum(pi_plus[nk,:]) + cp.sum(pi_minus[nk,:]) <= rhs
-                )
-                incoming_adaptive = [a for a in in_arcs[n] if adaptive_arc_mask[a] == 1.0]
-                coeff_self = ((cp.sum(alpha[incoming_adaptive, k]) if incoming_adaptive else 0) - 1.0
-                              if alpha is not None else
-                              (float(np.sum(alpha_val[incoming_adaptive, k])) if incoming_adaptive else 0.0) - 1.0)
-                constraints.append(theta[n,k] + pi_plus[nk,n]  >= coeff_self * sigma_np[n,k])
-                constraints.append(theta[n,k] + pi_minus[nk,n] >= -coeff_self * sigma_np[n,k])
-                for r, nr_arcs in adaptive_out[n]:
-                    coeff_out = (-cp.sum(alpha[nr_arcs, k]) if alpha is not None
-                                 else -float(np.sum(alpha_val[nr_arcs, k])))
-                    constraints.append(theta[n,k] + pi_plus[nk,r]  >= coeff_out * sigma_np[r,k])
-                    constraints.append(theta[n,k] + pi_minus[nk,r] >= -coeff_out * sigma_np[r,k])
-
-                rhs_ship = I0[n,k] + inflow + supply - outflow
-                constraints.append(
-                    Gamma * theta_ship[n,k] + cp.sum(pi_ship_plus[nk,:]) + cp.sum(pi_ship_minus[nk,:]) <= rhs_ship
-                )
-                coeff_self_ship = ((-cp.sum(alpha[incoming_adaptive, k]) if incoming_adaptive else 0)
-                                   if alpha is not None else
-                                   (-float(np.sum(alpha_val[incoming_adaptive, k])) if incoming_adaptive else 0.0))
-                constraints.append(theta_ship[n,k] + pi_ship_plus[nk,n]  >= coeff_self_ship * sigma_np[n,k])
-                constraints.append(theta_ship[n,k] + pi_ship_minus[nk,n] >= -coeff_self_ship * sigma_np[n,k])
-                for r, nr_arcs in adaptive_out[n]:
-                    coeff_out_ship = (cp.sum(alpha[nr_arcs, k]) if alpha is not None
-                                      else float(np.sum(alpha_val[nr_arcs, k])))
-                    constraints.append(theta_ship[n,k] + pi_ship_plus[nk,r]  >= coeff_out_ship * sigma_np[r,k])
-                    constraints.append(theta_ship[n,k] + pi_ship_minus[nk,r] >= -coeff_out_ship * sigma_np[r,k])
+        big_m   = 1e5
+        eta_col = cp.reshape(eta, (m, 1), order='C')
+        constraints += [
+            Gamma * eta + cp.sum(rho_plus + rho_minus, axis=1)
+                <= cp.multiply(arc_cap_vec, lam) - cp.sum(Fbar, axis=1),
+            eta_col + rho_plus  >=  cp.multiply(alpha, sigma_dest),
+            eta_col + rho_minus >= -cp.multiply(alpha, sigma_dest),
+            lam <= big_m * y,
+        ]
+
+        inflow   = A_in  @ Fbar
+        outflow  = A_out @ Fbar
+        supply   = cms_sel @ cp.reshape(q, (1, K), order='C')
+        alpha_in = A_in_adapt @ alpha                         # (N, K) over incoming adaptive arcs
+
+        # Demand balance
+        rhs        = I0 + inflow - outflow + supply - mu_np + u - I1
+        coeff_self = alpha_in - 1.0
+        cross      = S_out @ pi_cross_plus + S_out @ pi_cross_minus if P else 0
+        constraints += [
+            Gamma * theta + pi_self_plus + pi_self_minus + cross <= rhs,
+            theta + pi_self_plus  >=  cp.multiply(coeff_self, sigma_np),
+            theta + pi_self_minus >= -cp.multiply(coeff_self, sigma_np),
+        ]
+
+        # Ship balance
+        rhs_ship        = I0 + inflow + supply - outflow
+        coeff_self_ship = -alpha_in
+        cross_ship      = S_out @ pis_cross_plus + S_out @ pis_cross_minus if P else 0
+        constraints += [
+            Gamma * theta_ship + pis_self_plus + pis_self_minus + cross_ship <= rhs_ship,
+            theta_ship + pis_self_plus  >=  cp.multiply(coeff_self_ship, sigma_np),
+            theta_ship + pis_self_minus >= -cp.multiply(coeff_self_ship, sigma_np),
+        ]
+
+        if P:
+            # alpha summed over each pair's arcs, scaled by the neighbour's sigma
+            cross_coeff = cp.multiply(G @ alpha, sigma_pair)  # (P, K)
+            constraints += [
+                theta[pair_src, :] + pi_cross_plus       >= -cross_coeff,
+                theta[pair_src, :] + pi_cross_minus      >=  cross_coeff,
+                theta_ship[pair_src, :] + pis_cross_plus  >=  cross_coeff,
+                theta_ship[pair_src, :] + pis_cross_minus >= -cross_coeff,
+            ]
         if cap_vec is not None:
-            for n in range(N):
-                constraints.append(cp.sum(I1[n, :]) <= cap_vec[n])
+            constraints.append(cp.sum(I1, axis=1) <= cap_vec)
         obj = cp.Minimize(
             transport_cost_per_km    * cp.sum(cp.multiply(c_arc,  lam))
             + cp.sum(cp.multiply(c_pen.reshape(1, K), u))
             + holding_cost_per_unit     * cp.sum(I1)
             + cp.sum(cp.multiply(c_proc, q))    # ← per-drug cost
         )
-        prob = cp.Problem(obj, constraints)
-        prob.solve(solver=solver, verbose=verbose)
+        return cp.Problem(obj, constraints), Fbar, alpha, q, lam
+
+    models = {}
+    learned_alpha = None
+    metrics = []
+    for t in range(T):
+        frozen = freeze_alpha_after_first and learned_alpha is not None
+        if frozen not in models:
+            models[frozen] = build_model(frozen)
+        prob, Fbar, alpha, q, lam = models[frozen]
+        I0.value = I
+        if frozen:
+            alpha.value = learned_alpha
+        prob.solve(solver=solver, verbose=verbose, warm_start=warm_start)
         if prob.status not in ("optimal", "optimal_inaccurate"):
             raise RuntimeError(f"Failed at t={t}: {prob.status}")
-        if alpha is not None:
+        if not frozen:
             learned_alpha = np.asarray(alpha.value, dtype=float)
         Fbar_val  = np.maximum(np.asarray(Fbar.value, dtype=float), 0.0)
-        alpha_use = (np.asarray(learned_alpha, dtype=float) if learned_alpha is not None
-                     else np.asarray(alpha_val, dtype=float))
-        realized    = pd.DataFrame(demand_draws[t], index=nodes, columns=classes)
-        realized_np = realized.to_numpy()
-        xi_real     = realized_np - mu_np
-        ship_np = np.zeros((m, K), dtype=float)
-        for a in range(m):
-            dest = arc_dest_idx[a]
-            ship_np[a, :] = (Fbar_val[a, :] + alpha_use[a, :] * xi_real[dest, :]
-                             if adaptive_arc_mask[a] == 1.0 else Fbar_val[a, :])
-        ship_np = np.maximum(ship_np, 0.0)
-        ship_by_arc = {(i, j): pd.Series(ship_np[a, :], index=classes)
-                       for a, (i, j) in enumerate(arcs)}
-        q_ser   = pd.Series(np.maximum(np.asarray(q.value, dtype=float), 0.0), index=classes)
-        lam_val = np.maximum(np.round(np.asarray(lam.value, dtype=float)).astype(int), 0)
-        I_next = pd.DataFrame(0.0, index=nodes, columns=classes)
-        unmet  = pd.DataFrame(0.0, index=nodes, columns=classes)
-        for n_name in nodes:
-            inflow  = pd.Series(0.0, index=classes)
-            outflow = pd.Series(0.0, index=classes)
-            for (i, j), ship_ser in ship_by_arc.items():
-                if j == n_name: inflow  = inflow.add(ship_ser,  fill_value=0.0)
-                if i == n_name: outflow = outflow.add(ship_ser, fill_value=0.0)
-            add_supply = q_ser if n_name == CMS else pd.Series(0.0, index=classes)
-            demand_vec = realized.loc[n_name, :]
-            avail      = I.loc[n_name, :] + add_supply + inflow - outflow
-            served     = np.minimum(avail, demand_vec)
-            unmet.loc[n_name, :]  = demand_vec - served
-            I_next.loc[n_name, :] = avail - served
-        I = I_next.copy()
-        transport_cost = sum(transport_cost_per_km * float(dist_km.loc[i, j]) * float(lam_val[a])
-                             for a, (i, j) in enumerate(arcs))
-        shortage_cost  = float((unmet.to_numpy() * c_pen).sum())
-        holding_cost   = holding_cost_per_unit     * float(I.to_numpy().sum())
-        proc_cost      = float((q_ser * pd.Series(c_proc, index=classes)).sum())
-        total_demand = float(realized.to_numpy().sum())
-        total_unmet  = float(unmet.to_numpy().sum())
+        alpha_use = learned_alpha
+        q_val     = np.maximum(np.asarray(q.value, dtype=float), 0.0)
+        lam_val   = np.maximum(np.round(np.asarray(lam.value, dtype=float)).astype(int), 0)
+        realized  = np.asarray(demand_draws[t], dtype=float)    # (N, K)
+        # Adaptive arcs react to the realized demand deviation at their destination
+        xi_real   = realized - mu_np
+        ship_np   = Fbar_val.copy()
+        ship_np[A_adapt, :] += alpha_use[A_adapt, :] * xi_real[arc_dest_idx[A_adapt], :]
+        ship_np   = np.maximum(ship_np, 0.0)
+        # Vectorized post-solve simulation using the incidence matrices
+        supply_np = np.zeros((N, K))
+        supply_np[cms_idx, :] = q_val
+        avail    = I + supply_np + A_in @ ship_np - A_out @ ship_np
+        served   = np.minimum(avail, realized)
+        unmet    = realized - served
+        I        = avail - served
+        transport_cost = transport_cost_per_km * float(c_arc @ lam_val)
+        shortage_cost  = float((unmet * c_pen).sum())
+        holding_cost   = holding_cost_per_unit     * float(I.sum())
+        proc_cost      = float((q_val * c_proc).sum())
+        total_demand = float(realized.sum())
+        total_unmet  = float(unmet.sum())
         alpha_mean   = float(np.mean(learned_alpha)) if learned_alpha is not None else np.nan
         metrics.append({
             "t": t,
@@ -1101,65 +1125,56 @@ def simulate_aro_adr_under_draws_cms(
             "unmet_pct_realized":      (total_unmet / total_demand * 100.0) if total_demand > 0 else 0.0,
             "total_unmet_units":       total_unmet,
             "total_demand_units":      total_demand,
-            "total_procured_units":    float(q_ser.sum()),
+            "total_procured_units":    float(q_val.sum()),
         })
     learned_alpha_out = pd.DataFrame(
         learned_alpha, index=[f"{i}->{j}" for (i, j) in arcs], columns=classes,
     )
-    return pd.DataFrame(metrics), learned_alpha_out, I
-
+    return pd.DataFrame(metrics), learned_alpha_out, pd.DataFrame(I, index=nodes, columns=classes)
+
+
+# Region worker
+
+POLICIES  = ("deterministic", "static_robust", "aro_adr")
+SCENARIOS = ("2526", "2627")   # 2627 opens with the same policy's final 2526 inventory
+
+
+def _simulate_policy(inst, policy, T, I0_start=None, kappa=10.0, seed=42, Gamma=10.0):
+    """Run one policy over one year of a CMS region instance. Returns (metrics, final_I)."""
+    draws  = make_nb_draws_from_mean(inst["mu_mat"], kappa=kappa, T=T, seed=seed)
+    shared = dict(T=T, CMS=inst["CMS"], nodes=inst["nodes"], arcs=inst["arcs"],
+                  classes=inst["mu_mat"].columns.tolist(), dist_km=inst["dist_km"],
+                  mu_mat=inst["mu_mat"], demand_draws=draws,
+                  transport_cost_per_km=0.5, shortage_penalty_per_unit=5.0*inst["proc_cost"],
+                  holding_cost_per_unit=0.1, procurement_cost_per_unit=inst["proc_cost"],
+                  supply_multiplier=0.0, arc_cap=inst["arc_cap"],
+                  storage_cap_per_node=inst["storage_cap_per_node"],
+                  solver=SOLVER, verbose=False, relax_integrality=True, I0_start=I0_start)
+    if policy == "deterministic":
+        m, _, final_I = simulate_policy_under_draws_cms(**shared)
+    elif policy == "static_robust":
+        m, _, final_I = simulate_static_robust_under_draws_cms(**shared, sigma_mat=inst["sigma_mat"],
+                                                                Gamma=Gamma)
+    elif policy == "aro_adr":
+        m, _, final_I = simulate_aro_adr_under_draws_cms(**shared, arc_df=inst["arc_df"],
+                                                          sigma_mat=inst["sigma_mat"], Gamma=Gamma)
+    else:
+        raise ValueError(f"unknown policy: {policy}")
+    return m, final_I
 
-# Region worker (runs in a subprocess)
 
 def run_region(region, T=26):
     """Run both years for one region. Returns (list_of_metric_dicts, error_str_or_None).
     T is the number of biweekly periods (26 = full year; use a small T for a smoke test)."""
-    kappa = 10.0; seed = 42; Gamma = 10.0
     results = []
     try:
-        # Year 1: 2025-26
-        inst_y1    = build_cms_region_instance(region, scenario="2526")
-        classes_y1 = inst_y1["mu_mat"].columns.tolist()
-        draws_y1   = make_nb_draws_from_mean(inst_y1["mu_mat"], kappa=kappa, T=T, seed=seed)
-        shared_y1  = dict(T=T, CMS=inst_y1["CMS"], nodes=inst_y1["nodes"], arcs=inst_y1["arcs"],
-                           classes=classes_y1, dist_km=inst_y1["dist_km"], mu_mat=inst_y1["mu_mat"],
-                           demand_draws=draws_y1,
-                           transport_cost_per_km=0.5, shortage_penalty_per_unit=5.0*inst_y1["proc_cost"],
-                           holding_cost_per_unit=0.1, procurement_cost_per_unit=inst_y1["proc_cost"],
-                           supply_multiplier=0.0, arc_cap=inst_y1["arc_cap"],
-                           storage_cap_per_node=inst_y1["storage_cap_per_node"],
-                           solver=SOLVER, verbose=False, relax_integrality=True, I0_start=None)
-
-        m_det_y1, _, final_I_det = simulate_policy_under_draws_cms(**shared_y1)
-        m_rob_y1, _, final_I_rob = simulate_static_robust_under_draws_cms(**shared_y1, sigma_mat=inst_y1["sigma_mat"], Gamma=Gamma)
-        m_aro_y1, _, final_I_aro = simulate_aro_adr_under_draws_cms(**shared_y1, arc_df=inst_y1["arc_df"],
-                                                                     sigma_mat=inst_y1["sigma_mat"], Gamma=Gamma)
-        for m, name in [(m_det_y1,"deterministic"), (m_rob_y1,"static_robust"), (m_aro_y1,"aro_adr")]:
-            m["region"] = region; m["model"] = name; m["scenario"] = "2526"
-            results.append(m)
-
-        # Year 2: 2026-27 (carry forward final inventory)
-        inst_y2    = build_cms_region_instance(region, scenario="2627")
-        classes_y2 = inst_y2["mu_mat"].columns.tolist()
-        draws_y2   = make_nb_draws_from_mean(inst_y2["mu_mat"], kappa=kappa, T=T, seed=seed)
-        shared_y2  = dict(T=T, CMS=inst_y2["CMS"], nodes=inst_y2["nodes"], arcs=inst_y2["arcs"],
-                           classes=classes_y2, dist_km=inst_y2["dist_km"], mu_mat=inst_y2["mu_mat"],
-                           demand_draws=draws_y2,
-                           transport_cost_per_km=0.5, shortage_penalty_per_unit=5.0*inst_y2["proc_cost"],
-                           holding_cost_per_unit=0.1, procurement_cost_per_unit=inst_y2["proc_cost"],
-                           supply_multiplier=0.0, arc_cap=inst_y2["arc_cap"],
-                           storage_cap_per_node=inst_y2["storage_cap_per_node"],
-                           solver=SOLVER, verbose=False, relax_integrality=True)
-
-        m_det_y2, _, _ = simulate_policy_under_draws_cms(**shared_y2,         I0_start=final_I_det)
-        m_rob_y2, _, _ = simulate_static_robust_under_draws_cms(**shared_y2,  sigma_mat=inst_y2["sigma_mat"],
-                                                                               Gamma=Gamma, I0_start=final_I_rob)
-        m_aro_y2, _, _ = simulate_aro_adr_under_draws_cms(**shared_y2,        arc_df=inst_y2["arc_df"],
-                                                                               sigma_mat=inst_y2["sigma_mat"],
-                                                                               Gamma=Gamma, I0_start=final_I_aro)
-        for m, name in [(m_det_y2,"deterministic"), (m_rob_y2,"static_robust"), (m_aro_y2,"aro_adr")]:
-            m["region"] = region; m["model"] = name; m["scenario"] = "2627"
-            results.append(m)
+        final_I = {}
+        for scenario in SCENARIOS:
+            inst = build_cms_region_instance(region, scenario=scenario)
+            for policy in POLICIES:
+                m, final_I[policy] = _simulate_policy(inst, policy, T, I0_start=final_I.get(policy))
+                m["region"] = region; m["model"] = policy; m["scenario"] = scenario
+                results.append(m)
 
         print(f"  done: {region}", flush=True)
         return results, None
@@ -1169,6 +1184,135 @@ def run_region(region, T=26):
         return [], str(e)
 
 
+def run_task(region, policy, scenario, T=26, I0_start=None):
+    """Run one (region, policy, year) task. Returns (metrics, final_I, error_str_or_None)."""
+    try:
+        inst = build_cms_region_instance(region, scenario=scenario)
+        m, final_I = _simulate_policy(inst, policy, T, I0_start=I0_start)
+        m["region"] = region; m["model"] = policy; m["scenario"] = scenario
+        return m, final_I, None
+    except Exception as e:
+        return None, None, str(e)
+
+
+# Task scheduler
+
+# Memory per LP variable is the backend's admission estimate (the period LPs are
+# the same); on top of it each task has a floor for the forked interpreter,
+# instance and draws.
+TASK_BASE_BYTES = 256 * 2**20
+_BACKEND_STRATEGY = {"deterministic": "nominal", "static_robust": "static_robust",
+                     "aro_adr": "adr"}
+
+
+def adaptive_pair_count(arcs, arc_df):
+    """Distinct adaptive (source, destination) pairs: the rows of the ARO-ADR cross duals."""
+    mask = _adaptive_arc_mask(arc_df)
+    return len({arc for arc, adaptive in zip(arcs, mask) if adaptive == 1.0})
+
+
+def estimate_task_mb(N, m, K, policy, pairs=None):
+    strategy = _BACKEND_STRATEGY[policy]
+    n_vars = lp_variables(N, m, K, strategy, cross_rows=pairs)
+    return (TASK_BASE_BYTES + BYTES_PER_VAR[strategy] * n_vars) / 2**20
+
+
+def _task_process(conn, initializer, args):
+    if initializer is not None:
+        initializer()
+    conn.send(run_task(*args))
+    conn.close()
+
+
+def run_tasks(regions, T=26, budget_gb=None, max_workers=None, initializer=None, on_result=None):
+    """
+    Run every (region, policy, year) task and return (list_of_metric_frames, failures).
+
+    A policy's 2627 task starts from the final inventory of its 2526 task, so it
+    is queued only once that finishes; all other tasks are independent. Ready
+    tasks start largest estimate first whenever the estimate fits in what is
+    left of the budget, and a task larger than the whole budget runs alone.
+    Each task gets a fresh process, so its memory goes back to the OS when it
+    exits and a task killed for running out of memory fails on its own.
+
+    initializer runs in each task process when it does not inherit the loaded
+    data by fork (macOS spawn). on_result(task, metrics, error) is called in
+    this process as each task finishes, e.g. to checkpoint.
+    """
+    budget_mb   = (budget_gb or MEMORY_BUDGET_GB) * 1024
+    max_workers = max_workers or MAX_WORKERS
+    ctx = mp.get_context()
+    if ctx.get_start_method() == "fork":
+        initializer = None
+
+    # Sizes come from the 2526 instance; 2627 has the same nodes, arcs and classes
+    results, failures, ready = [], [], []
+    for region in regions:
+        try:
+            inst = build_cms_region_instance(region, scenario=SCENARIOS[0])
+        except Exception as e:
+            print(f"  failed: {region} - {e}", flush=True)
+            failures.append({"region": region, "model": None, "scenario": None, "error": str(e)})
+            continue
+        N, m, K = len(inst["nodes"]), len(inst["arcs"]), inst["mu_mat"].shape[1]
+        pairs = adaptive_pair_count(inst["arcs"], inst["arc_df"])
+        for policy in POLICIES:
+            ready.append({"region": region, "policy": policy, "scenario": SCENARIOS[0],
+                          "mem_mb": estimate_task_mb(N, m, K, policy, pairs), "I0_start": None})
+    print(f"{len(ready) * len(SCENARIOS)} tasks | budget {budget_mb / 1024:.1f} GB"
+          f" | max_workers={max_workers}", flush=True)
+
+    running, in_use = {}, 0.0
+    while ready or running:
+        ready.sort(key=lambda task: task["mem_mb"], reverse=True)
+        for task in list(ready):
+            if len(running) >= max_workers:
+                break
+            if running and in_use + task["mem_mb"] > budget_mb:
+                continue
+            args = (task["region"], task["policy"], task["scenario"], T, task.pop("I0_start"))
+            recv_conn, send_conn = ctx.Pipe(duplex=False)
+            proc = ctx.Process(target=_task_process, args=(send_conn, initializer, args))
+            proc.start()
+            send_conn.close()
+            ready.remove(task)
+            running[recv_conn] = (task, proc)
+            in_use += task["mem_mb"]
+            print(f"  start: {task['region']} / {task['policy']} / {task['scenario']}"
+                  f" (~{task['mem_mb']:.0f} MB, {in_use:.0f}/{budget_mb:.0f} MB in use)", flush=True)
+
+        for conn in wait(list(running)):
+            task, proc = running.pop(conn)
+            try:
+                metrics, final_I, error = conn.recv()
+            except EOFError:
+                metrics, final_I, error = None, None, None
+            conn.close()
+            proc.join()
+            if error is None and metrics is None:
+                error = f"task process exited with code {proc.exitcode}"   # -9: killed, likely OOM
+            in_use -= task["mem_mb"]
+
+            label = f"{task['region']} / {task['policy']} / {task['scenario']}"
+            if error:
+                print(f"  failed: {label} - {error}", flush=True)
+                failures.append({"region": task["region"], "model": task["policy"],
+                                 "scenario": task["scenario"], "error": error})
+            else:
+                print(f"  done: {label}", flush=True)
+                results.append(metrics)
+            if task["scenario"] == SCENARIOS[0]:
+                if error:
+                    failures.append({"region": task["region"], "model": task["policy"],
+                                     "scenario": SCENARIOS[1], "error": f"{SCENARIOS[0]} failed"})
+                else:
+                    ready.append(dict(task, scenario=SCENARIOS[1], I0_start=final_I))
+            if on_result is not None:
+                on_result(task, metrics, error)
+
+    return results, failures
+
+
 # Main
 
 if __name__ == "__main__":
@@ -1182,10 +1326,9 @@ if __name__ == "__main__":
     all_regions = sorted(fac["DHMT"].dropna().astype(str).unique().tolist())
     all_regions = [r for r in all_regions if r != "--" and r not in completed]
     all_regions = ["North East", "Southern", "Tutume"]
-    print(f"Running {len(all_regions)} regions with max_workers={MAX_WORKERS}")
+    print(f"Running {len(all_regions)} regions within {MEMORY_BUDGET_GB:.0f} GB")
 
     cms_results  = []
-    cms_failures = []
 
     existing_partial = OUT_DIR / "cms_results_partial_two.parquet"
     if existing_partial.exists():
@@ -1194,19 +1337,14 @@ if __name__ == "__main__":
     else:
         cms_results = []
 
-    with ProcessPoolExecutor(max_workers=MAX_WORKERS) as executor:
-        futures = {executor.submit(run_region, r): r for r in all_regions}
-        for future in as_completed(futures):
-            region = futures[future]
-            results, error = future.result()
-            if error:
-                cms_failures.append({"region": region, "error": error})
-            else:
-                cms_results.extend(results)
-            # incremental checkpoint after every completed region
-            if cms_results:
-                pd.concat(cms_results, ignore_index=True).to_parquet(
-                    OUT_DIR / "cms_results_partial_two.parquet", index=False)
+    def checkpoint(task, metrics, error):
+        # incremental checkpoint after every completed task
+        if metrics is not None:
+            cms_results.append(metrics)
+            pd.concat(cms_results, ignore_index=True).to_parquet(
+                OUT_DIR / "cms_results_partial_two.parquet", index=False)
+
+    _, cms_failures = run_tasks(all_regions, on_result=checkpoint)
 
     # Final save
     results_df  = pd.concat(cms_results,  ignore_index=True) if cms_results  else pd.DataFrame()
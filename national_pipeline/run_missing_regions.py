@@ -9,13 +9,14 @@ to results/cms_results_missing.parquet WITHOUT touching the existing parquet.
 
 Notes:
 - Solver is run_cms_two.SOLVER (HiGHS). MOSEK breaks on this problem.
-- macOS uses 'spawn' for multiprocessing, so each worker re-runs load_data() via the
-  ProcessPoolExecutor initializer (the cluster used 'fork' and inherited it).
+- Work is scheduled as (region, policy, year) tasks under R.MEMORY_BUDGET_GB
+  (CMS_MEMORY_GB), see R.run_tasks.
+- macOS uses 'spawn' for multiprocessing, so each task process re-runs load_data()
+  via the run_tasks initializer (the cluster uses 'fork' and inherits it).
 """
 import warnings; warnings.filterwarnings("ignore")
-import os, sys
+import sys
 import pandas as pd
-from concurrent.futures import ProcessPoolExecutor, as_completed
 
 import run_cms_two as R
 
@@ -40,7 +41,7 @@ def main(serial=False):
     R.OUT_DIR.mkdir(exist_ok=True)
 
     def checkpoint():
-        # write after each region so a crash/kill never loses completed regions.
+        # write after each task so a crash/kill never loses completed work.
         # run_region returns a LIST OF DATAFRAMES (one per model x scenario), so
         # rows is a list of DataFrames -> concat, not pd.DataFrame(rows).
         if rows:
@@ -61,18 +62,21 @@ def main(serial=False):
                 print(f"done {r} ({len(results)} rows) in {(time.time() - t0) / 60:.1f} min", flush=True)
                 checkpoint()
     else:
-        workers = min(len(missing), max(1, (os.cpu_count() or 2) - 1))
-        print(f"running {len(missing)} regions | workers={workers} | solver={R.SOLVER}", flush=True)
-        with ProcessPoolExecutor(max_workers=workers, initializer=R.load_data) as ex:
-            futs = {ex.submit(R.run_region, r): r for r in missing}
-            for fut in as_completed(futs):
-                r = futs[fut]
-                results, error = fut.result()
-                if error:
-                    failures.append((r, error)); print(f"FAILED {r}: {error}", flush=True)
-                else:
-                    rows.extend(results); done.append(r); print(f"done {r} ({len(results)} rows)", flush=True)
-                    checkpoint()
+        print(f"running {len(missing)} regions | solver={R.SOLVER}", flush=True)
+        tasks_left = {r: len(R.POLICIES) * len(R.SCENARIOS) for r in missing}
+
+        def on_result(task, metrics, error):
+            if error:
+                return
+            r = task["region"]
+            rows.append(metrics); tasks_left[r] -= 1
+            if tasks_left[r] == 0:
+                done.append(r); print(f"done {r}", flush=True)
+            checkpoint()
+
+        _, task_failures = R.run_tasks(missing, initializer=R.load_data, on_result=on_result)
+        failures.extend((f["region"], f"{f['model']} {f['scenario']}: {f['error']}")
+                        for f in task_failures)
 
     print(f"\nDONE. regions completed: {sorted(done)}  -> {MISSING_OUT}", flush=True)
     if failures:
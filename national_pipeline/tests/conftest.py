@@ -0,0 +1,52 @@
+"""Shared fixtures for the national pipeline tests: run_cms_two and a tiny CMS region."""
+
+import sys
+from pathlib import Path
+
+import numpy as np
+import pandas as pd
+import pytest
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+
+pytest.importorskip("statsmodels")   # run_cms_two loads antimicrobialglm_utils at import
+
+
+@pytest.fixture(scope="session")
+def rc():
+    import run_cms_two
+    return run_cms_two
+
+
+@pytest.fixture
+def tiny_instance(rc):
+    """
+    CMS -> warehouse -> two hospitals -> three clinics, plus a hospital to
+    hospital arc and a non-adaptive clinic to hospital return arc, in the
+    layout of build_cms_region_instance.
+    """
+    rng = np.random.default_rng(7)
+    tiers = {"CMS": "cms", "WH": "warehouse", "H1": "hospital", "H2": "hospital",
+             "C1": "clinic", "C2": "clinic", "C3": "clinic"}
+    nodes = list(tiers)
+    arcs = [("CMS", "WH"), ("WH", "H1"), ("WH", "H2"), ("H1", "H2"),
+            ("H1", "C1"), ("H1", "C2"), ("H2", "C2"), ("H2", "C3"), ("C1", "H1")]
+    xy = rng.uniform(0, 100, size=(len(nodes), 2))
+    dist_km = pd.DataFrame(np.hypot(*(xy[:, None, :] - xy[None, :, :]).transpose(2, 0, 1)),
+                           index=nodes, columns=nodes)
+    arc_df = pd.DataFrame({
+        "u": [i for i, _ in arcs], "v": [j for _, j in arcs],
+        "u_tier": [tiers[i] for i, _ in arcs], "v_tier": [tiers[j] for _, j in arcs],
+        "dist_km": [dist_km.loc[i, j] for i, j in arcs],
+    })
+    classes = ["amoxicillin", "ceftriaxone", "doxycycline"]
+    mu_mat = pd.DataFrame(rng.uniform(5, 40, size=(len(nodes), len(classes))),
+                          index=nodes, columns=classes)
+    mu_mat.loc[["CMS", "WH"], :] = 0.0
+    return {
+        "region": "Tiny", "CMS": "CMS", "nodes": nodes, "arcs": arcs, "arc_df": arc_df,
+        "dist_km": dist_km, "mu_mat": mu_mat,
+        "sigma_mat": rc.nb_sigma_from_mean(mu_mat, kappa=10.0),
+        "arc_cap": 150.0, "storage_cap_per_node": 400.0,
+        "proc_cost": pd.Series([2.0, 6.5, 3.0], index=classes),
+    }
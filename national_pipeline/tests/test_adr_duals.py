@@ -0,0 +1,154 @@
+"""
+The ARO-ADR model's sparse robust duals (self-node plus one row per adaptive
+pair) against the dense (N*K, N) formulation they replaced.
+
+simulate_aro_adr_under_draws_cms is run on the LP relaxation and every period's
+optimal value is recorded; the dense model is then solved from the same
+opening inventory (and, once alpha is frozen, the same alpha) and must reach
+the same optimum.
+"""
+
+import cvxpy as cp
+import numpy as np
+import pytest
+
+GAMMA = 2.0
+COSTS = dict(transport_cost_per_km=0.5, holding_cost_per_unit=0.1)
+
+
+def dense_aro_period(rc, inst, I0, alpha_val=None, Gamma=GAMMA):
+    """Optimal value of one ARO-ADR period with the dense (N*K, N) pi duals."""
+    nodes, arcs, CMS = inst["nodes"], inst["arcs"], inst["CMS"]
+    classes = inst["mu_mat"].columns.tolist()
+    node_idx = {n: i for i, n in enumerate(nodes)}
+    N, m, K = len(nodes), len(arcs), len(classes)
+    arc_cap_vec = np.full(m, inst["arc_cap"])
+    c_arc  = np.array([inst["dist_km"].loc[i, j] for (i, j) in arcs])
+    c_proc = rc._resolve_c_proc(inst["proc_cost"], classes)
+    c_pen  = rc._resolve_c_penalty(5.0 * inst["proc_cost"], classes)
+    mu_np    = inst["mu_mat"].to_numpy()
+    sigma_np = inst["sigma_mat"].to_numpy()
+    adaptive_arc_mask = np.array([
+        1.0 if (row.u_tier in ["cms", "warehouse", "hospital"]
+                and row.v_tier in ["clinic", "warehouse", "hospital", "health_post"]) else 0.0
+        for row in inst["arc_df"].itertuples(index=False)
+    ])
+    arc_dest_idx = np.array([node_idx[j] for (i, j) in arcs])
+    in_arcs  = [[] for _ in range(N)]
+    out_arcs = [[] for _ in range(N)]
+    adaptive_out = [{} for _ in range(N)]
+    for a, (i, j) in enumerate(arcs):
+        out_arcs[node_idx[i]].append(a)
+        in_arcs[node_idx[j]].append(a)
+        if adaptive_arc_mask[a] == 1.0:
+            adaptive_out[node_idx[i]].setdefault(node_idx[j], []).append(a)
+
+    alpha = cp.Variable((m, K)) if alpha_val is None else alpha_val
+    Fbar = cp.Variable((m, K), nonneg=True)
+    u    = cp.Variable((N, K), nonneg=True)
+    I1   = cp.Variable((N, K), nonneg=True)
+    q    = cp.Variable(K, nonneg=True)
+    lam  = cp.Variable(m, nonneg=True)
+    y    = cp.Variable(m, nonneg=True)
+    theta         = cp.Variable((N, K), nonneg=True)
+    pi_plus       = cp.Variable((N * K, N), nonneg=True)
+    pi_minus      = cp.Variable((N * K, N), nonneg=True)
+    theta_ship    = cp.Variable((N, K), nonneg=True)
+    pi_ship_plus  = cp.Variable((N * K, N), nonneg=True)
+    pi_ship_minus = cp.Variable((N * K, N), nonneg=True)
+    eta           = cp.Variable(m, nonneg=True)
+    rho_plus      = cp.Variable((m, K), nonneg=True)
+    rho_minus     = cp.Variable((m, K), nonneg=True)
+
+    constraints = [y <= 1.0]
+    for a in range(m):
+        j = arc_dest_idx[a]
+        constraints.append(Gamma * eta[a] + cp.sum(rho_plus[a, :] + rho_minus[a, :])
+                           <= arc_cap_vec[a] * lam[a] - cp.sum(Fbar[a, :]))
+        for k in range(K):
+            constraints.append(eta[a] + rho_plus[a, k]  >=  alpha[a, k] * sigma_np[j, k])
+            constraints.append(eta[a] + rho_minus[a, k] >= -alpha[a, k] * sigma_np[j, k])
+        constraints.append(lam[a] <= 1e5 * y[a])
+    for n in range(N):
+        incoming_adaptive = [a for a in in_arcs[n] if adaptive_arc_mask[a] == 1.0]
+        for k in range(K):
+            nk = n * K + k
+            inflow  = cp.sum(Fbar[in_arcs[n], k]) if in_arcs[n] else 0
+            outflow = cp.sum(Fbar[out_arcs[n], k]) if out_arcs[n] else 0
+            supply  = q[k] if nodes[n] == CMS else 0.0
+            alpha_in = cp.sum(alpha[incoming_adaptive, k]) if incoming_adaptive else 0
+
+            rhs = I0[n, k] + inflow - outflow + supply - mu_np[n, k] + u[n, k] - I1[n, k]
+            constraints.append(Gamma * theta[n, k] + cp.sum(pi_plus[nk, :])
+                               + cp.sum(pi_minus[nk, :]) <= rhs)
+            constraints.append(theta[n, k] + pi_plus[nk, n]  >=  (alpha_in - 1.0) * sigma_np[n, k])
+            constraints.append(theta[n, k] + pi_minus[nk, n] >= -(alpha_in - 1.0) * sigma_np[n, k])
+
+            rhs_ship = I0[n, k] + inflow + supply - outflow
+            constraints.append(Gamma * theta_ship[n, k] + cp.sum(pi_ship_plus[nk, :])
+                               + cp.sum(pi_ship_minus[nk, :]) <= rhs_ship)
+            constraints.append(theta_ship[n, k] + pi_ship_plus[nk, n]  >= -alpha_in * sigma_np[n, k])
+            constraints.append(theta_ship[n, k] + pi_ship_minus[nk, n] >=  alpha_in * sigma_np[n, k])
+
+            for r, nr_arcs in sorted(adaptive_out[n].items()):
+                alpha_out = cp.sum(alpha[nr_arcs, k])
+                constraints.append(theta[n, k] + pi_plus[nk, r]  >= -alpha_out * sigma_np[r, k])
+                constraints.append(theta[n, k] + pi_minus[nk, r] >=  alpha_out * sigma_np[r, k])
+                constraints.append(theta_ship[n, k] + pi_ship_plus[nk, r]  >=  alpha_out * sigma_np[r, k])
+                constraints.append(theta_ship[n, k] + pi_ship_minus[nk, r] >= -alpha_out * sigma_np[r, k])
+    for n in range(N):
+        constraints.append(cp.sum(I1[n, :]) <= inst["storage_cap_per_node"])
+
+    obj = cp.Minimize(
+        COSTS["transport_cost_per_km"] * cp.sum(cp.multiply(c_arc, lam))
+        + cp.sum(cp.multiply(c_pen.reshape(1, K), u))
+        + COSTS["holding_cost_per_unit"] * cp.sum(I1)
+        + cp.sum(cp.multiply(c_proc, q))
+    )
+    prob = cp.Problem(obj, constraints)
+    prob.solve(solver=rc.SOLVER)
+    assert prob.status == "optimal"
+    return prob.value
+
+
+def run_aro_adr(rc, inst, T, freeze_alpha):
+    """simulate_aro_adr_under_draws_cms on the LP relaxation; returns (learned alpha, final I)."""
+    _, learned_alpha, final_I = rc.simulate_aro_adr_under_draws_cms(
+        T=T, CMS=inst["CMS"], nodes=inst["nodes"], arcs=inst["arcs"], arc_df=inst["arc_df"],
+        classes=inst["mu_mat"].columns.tolist(), dist_km=inst["dist_km"],
+        mu_mat=inst["mu_mat"], sigma_mat=inst["sigma_mat"], Gamma=GAMMA,
+        demand_draws=rc.make_nb_draws_from_mean(inst["mu_mat"], kappa=10.0, T=T, seed=3),
+        shortage_penalty_per_unit=5.0 * inst["proc_cost"],
+        procurement_cost_per_unit=inst["proc_cost"], arc_cap=inst["arc_cap"],
+        storage_cap_per_node=inst["storage_cap_per_node"], solver=rc.SOLVER,
+        freeze_alpha_after_first=freeze_alpha, relax_integrality=True, **COSTS,
+    )
+    return learned_alpha.to_numpy(), final_I.to_numpy()
+
+
+@pytest.mark.parametrize("freeze_alpha", [False, True])
+def test_period_objectives_match_dense_duals(rc, tiny_instance, monkeypatch, freeze_alpha):
+    inst = tiny_instance
+    T = 4
+
+    values = []
+    solve = cp.Problem.solve
+
+    def recording_solve(prob, *args, **kwargs):
+        values.append(solve(prob, *args, **kwargs))
+        return values[-1]
+
+    monkeypatch.setattr(cp.Problem, "solve", recording_solve)
+    learned_alpha, _ = run_aro_adr(rc, inst, T, freeze_alpha)
+    monkeypatch.undo()
+    assert len(values) == T
+
+    # Period t opens with the closing inventory of the first t periods (the
+    # draws come from one seeded generator, so a shorter run is a prefix)
+    openings = [np.zeros(inst["mu_mat"].shape)]
+    openings += [run_aro_adr(rc, inst, t, freeze_alpha)[1] for t in range(1, T)]
+    assert any(I0.sum() > 0 for I0 in openings)
+    for t, (I0, value) in enumerate(zip(openings, values)):
+        alpha_val = learned_alpha if freeze_alpha and t > 0 else None
+        expected = dense_aro_period(rc, inst, I0, alpha_val)
+        assert value == pytest.approx(expected, rel=1e-6, abs=1e-6), f"period {t}"
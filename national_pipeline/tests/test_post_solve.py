@@ -0,0 +1,121 @@
+"""
+Per-period metrics and final inventory of the three batch simulators on the
+tiny CMS region, for four periods of a fixed demand draw.
+
+EXPECTED was produced by the pandas post-solve bookkeeping that the incidence
+matrix version replaced (ship_by_arc Series and a per-node scan of every arc),
+on the same LP relaxation and draws. If a HiGHS upgrade picks a different one
+of several tied optima the decisions, and so these values, can move.
+"""
+
+import numpy as np
+import pytest
+
+T = 4
+
+EXPECTED = {
+    "deterministic": {
+        "metrics": {
+            "objective_realized": [1902.210064, 2066.512787, 2332.72773, 1832.332652],
+            "transport_cost_realized": [189.8436697, 141.1407726, 109.0690134, 141.1407726],
+            "shortage_cost_realized": [640.2335053, 986.2666636, 1309.56769, 712.0215073],
+            "holding_cost_end": [3.904555654, 4.652051858, 2.34435918, 5.58390959],
+            "procurement_cost": [1068.228333, 934.4532989, 911.7466673, 973.586462],
+            "unmet_pct_realized": [11.16061942, 13.96023068, 20.7513759, 12.53666398],
+            "total_unmet_units": [29.79885386, 37.27381591, 66.19688912, 31.59239322],
+            "total_demand_units": [267.0, 267.0, 319.0, 252.0],
+            "total_procured_units": [276.2467027, 237.2011461, 229.7261841, 252.8031109],
+        },
+        "final_inventory": [
+            [0.0, 0.0, 0.0],
+            [0.0, 0.0, 0.0],
+            [4.535804438, 6.607421185, 3.43888615],
+            [3.537970279, 0.2488097571, 3.021108709],
+            [1.317210886, 3.100872062, 0.0],
+            [0.0, 0.0, 5.663022271],
+            [1.412790894, 4.734075039, 18.22112423],
+        ],
+    },
+    "static_robust": {
+        "metrics": {
+            "objective_realized": [1861.6193, 1582.886358, 1701.534154, 1647.809416],
+            "transport_cost_realized": [294.2357772, 189.8436697, 157.7719105, 211.0992373],
+            "shortage_cost_realized": [70.43019626, 331.7986516, 492.3487639, 285.1536728],
+            "holding_cost_end": [11.98864809, 12.83007563, 8.773209696, 14.52625878],
+            "procurement_cost": [1484.964679, 1048.413961, 1042.64027, 1137.030247],
+            "unmet_pct_realized": [1.008219283, 4.159633292, 7.065066323, 5.185735102],
+            "total_unmet_units": [2.691945487, 11.10622089, 22.53756157, 13.06805246],
+            "total_demand_units": [267.0, 267.0, 319.0, 252.0],
+            "total_procured_units": [384.1945354, 264.3080545, 255.8937791, 296.4624384],
+        },
+        "final_inventory": [
+            [0.0, 0.0, 0.0],
+            [0.0, 0.0, 0.0],
+            [9.850919087, 11.2827992, 13.25419848],
+            [6.826203211, 3.435276781, 11.73995343],
+            [9.487863179, 16.32011345, 0.0],
+            [8.704287675, 0.0, 11.34904373],
+            [4.301150536, 9.784117291, 28.92666179],
+        ],
+    },
+    "aro_adr": {
+        "metrics": {
+            "alpha_opt_mean": [0.3567678425, 0.3567678425, 0.3567678425, 0.3567678425],
+            "objective_realized": [1643.764659, 1368.087432, 1481.632655, 1493.337228],
+            "transport_cost_realized": [259.8021344, 189.8436697, 219.6004065, 211.0992373],
+            "shortage_cost_realized": [1.876176696, 107.1268322, 170.1297387, 70.3598972],
+            "holding_cost_end": [8.644955503, 8.992165333, 4.327876499, 10.40404111],
+            "procurement_cost": [1373.441392, 1062.124765, 1087.574634, 1201.474052],
+            "unmet_pct_realized": [0.04684586008, 1.34725721, 2.806986961, 1.077751776],
+            "total_unmet_units": [0.1250784464, 3.59717675, 8.954288406, 2.715934476],
+            "total_demand_units": [267.0, 267.0, 319.0, 252.0],
+            "total_procured_units": [353.3244766, 266.8749216, 263.4028233, 310.0457116],
+        },
+        "final_inventory": [
+            [0.0, 0.0, 0.0],
+            [0.0, 0.0, 0.0],
+            [19.70584905, 13.29399873, 11.96578882],
+            [7.940817995, 5.844812346, 10.82553722],
+            [0.0, 6.232849856, 0.0],
+            [2.920409061, 0.0, 0.0],
+            [0.0, 4.188114702, 21.12223328],
+        ],
+    },
+}
+
+
+def simulate(rc, inst, policy, T, seed=11, Gamma=2.0):
+    """One policy over T periods with the cost settings run_region uses."""
+    shared = dict(T=T, CMS=inst["CMS"], nodes=inst["nodes"], arcs=inst["arcs"],
+                  classes=inst["mu_mat"].columns.tolist(), dist_km=inst["dist_km"],
+                  mu_mat=inst["mu_mat"],
+                  demand_draws=rc.make_nb_draws_from_mean(inst["mu_mat"], kappa=10.0, T=T, seed=seed),
+                  transport_cost_per_km=0.5, shortage_penalty_per_unit=5.0*inst["proc_cost"],
+                  holding_cost_per_unit=0.1, procurement_cost_per_unit=inst["proc_cost"],
+                  supply_multiplier=0.0, arc_cap=inst["arc_cap"],
+                  storage_cap_per_node=inst["storage_cap_per_node"],
+                  solver=rc.SOLVER, relax_integrality=True)
+    if policy == "deterministic":
+        metrics, _, final_I = rc.simulate_policy_under_draws_cms(**shared)
+    elif policy == "static_robust":
+        metrics, _, final_I = rc.simulate_static_robust_under_draws_cms(
+            **shared, sigma_mat=inst["sigma_mat"], Gamma=Gamma)
+    else:
+        metrics, _, final_I = rc.simulate_aro_adr_under_draws_cms(
+            **shared, arc_df=inst["arc_df"], sigma_mat=inst["sigma_mat"], Gamma=Gamma)
+    return metrics, final_I
+
+
+@pytest.mark.parametrize("policy", list(EXPECTED))
+def test_post_solve_matches_pandas_bookkeeping(rc, tiny_instance, policy):
+    metrics, final_I = simulate(rc, tiny_instance, policy, T)
+    expected = EXPECTED[policy]
+
+    assert list(metrics["t"]) == list(range(T))
+    assert set(metrics.columns) == {"t", *expected["metrics"]}
+    for col, values in expected["metrics"].items():
+        assert metrics[col].to_numpy() == pytest.approx(values, rel=1e-6, abs=1e-6), col
+
+    assert list(final_I.index) == tiny_instance["nodes"]
+    assert list(final_I.columns) == tiny_instance["mu_mat"].columns.tolist()
+    np.testing.assert_allclose(final_I.to_numpy(), expected["final_inventory"], rtol=1e-6, atol=1e-6)